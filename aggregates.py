@@ -0,0 +1,218 @@
+import os
+import json
+import heapq
+import threading
+
+from constants import AGGREGATE_STATS
+from utils import gen_derived_var, gen_possessions
+
+
+def country_key(country):
+    """
+    turns the country written in a match ('United States') back into its path name
+    """
+    return country.lower().replace(' ', '_')
+
+
+def _add_stats(totals, stats, sign):
+    for stat, value in stats.items():
+        totals[stat] = totals.get(stat, 0.0) + sign * value
+
+
+def _per(totals, factor):
+    return {stat: totals[stat] * factor for stat in AGGREGATE_STATS if stat in totals}
+
+
+def player_key(name, birth_date=None):
+    """
+    key of a player in the aggregates. players with the same name are told apart by
+    their birth date once it's known
+    """
+    return '{0}|{1}'.format(name, birth_date or '')
+
+
+class SeasonAggregates:
+    """
+    players and teams season totals kept up to date as matches are written.
+    the contribution of every match is kept, so applying a re-crawled match again
+    replaces its previous numbers instead of adding them twice. players are keyed
+    by name and birth date, as player_key
+    """
+    # saved aggregates of an older version are rebuilt from the matches when loaded
+    version = 2
+
+    def __init__(self, country, league, season):
+        self.country = country
+        self.league = league
+        self.season = season
+        self.path = './aggregates/{0}/{1}/{2}.json'.format(country, league, season)
+        self.players = {}
+        self.teams = {}
+        self.matches = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, country, league, season):
+        aggregates = cls(country, league, season)
+        if os.path.exists(aggregates.path):
+            with open(aggregates.path, 'r') as f:
+                data = json.load(f)
+            if data.get('version') != cls.version:
+                return cls.rebuild(country, league, season)
+            aggregates.players = data['players']
+            aggregates.teams = data['teams']
+            aggregates.matches = data['matches']
+        return aggregates
+
+    @classmethod
+    def rebuild(cls, country, league, season):
+        """
+        builds aggregates from scratch reading every crawled match of the season
+        """
+        aggregates = cls(country, league, season)
+        path = './matches/{0}/{1}/{2}'.format(country, league, season)
+        for filename in sorted(os.listdir(path) if os.path.exists(path) else []):
+            if filename.endswith('.json'):
+                with open(os.path.join(path, filename), 'r') as f:
+                    aggregates.apply(json.load(f))
+        return aggregates
+
+    def save(self):
+        with self._lock:
+            data = json.dumps({'version': self.version, 'players': self.players, 'teams': self.teams,
+                               'matches': self.matches})
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path + '.tmp', 'w') as f:
+            f.write(data)
+        os.replace(self.path + '.tmp', self.path)
+
+    def apply(self, match):
+        """
+        adds match to the aggregates, replacing it if it was already applied
+        """
+        contribution = self._contribution(match)
+        with self._lock:
+            previous = self.matches.pop(match['code'], None)
+            if previous:
+                self._add(previous, -1)
+            self._add(contribution, 1)
+            self.matches[match['code']] = contribution
+
+    def _contribution(self, match):
+        contribution = {'date': match.get('date') or '', 'players': {}, 'teams': {}}
+        for team, opp in [('home', 'away'), ('away', 'home')]:
+            own, other = match[team], match[opp]
+            contribution['teams'][own['name']] = {
+                'own': self._counting(own['totals']),
+                'opp': self._counting(other['totals']),
+                'W': 1 if own['totals']['PTS'] > other['totals']['PTS'] else 0,
+            }
+            for name, stats in own['players'].items():
+                if stats.get('MP'):
+                    contribution['players'][player_key(name, stats.get('birth_date'))] = {
+                        'name': name, 'birth_date': stats.get('birth_date'), 'team': own['name'],
+                        'stats': self._counting(stats)}
+        return contribution
+
+    @staticmethod
+    def _counting(stats):
+        return {stat: stats[stat] for stat in AGGREGATE_STATS if stats.get(stat) is not None}
+
+    def _add(self, contribution, sign):
+        for key, player in contribution['players'].items():
+            totals = self.players.setdefault(key, {'name': player['name'], 'birth_date': player['birth_date'],
+                                                   'G': 0, 'teams': {}, 'stats': {}})
+            # games and date of the last game with every team, so traded players
+            # show the team they play for now
+            team = totals['teams'].setdefault(player['team'], {'G': 0, 'last': ''})
+            team['G'] += sign
+            team['last'] = max(team['last'], contribution['date'])
+            if not team['G']:
+                del totals['teams'][player['team']]
+            totals['G'] += sign
+            _add_stats(totals['stats'], player['stats'], sign)
+            if not totals['G']:
+                del self.players[key]
+        for name, team in contribution['teams'].items():
+            totals = self.teams.setdefault(name, {'G': 0, 'W': 0, 'own': {}, 'opp': {}})
+            totals['G'] += sign
+            totals['W'] += sign * team['W']
+            _add_stats(totals['own'], team['own'], sign)
+            _add_stats(totals['opp'], team['opp'], sign)
+            if not totals['G']:
+                del self.teams[name]
+
+    def player(self, name, birth_date=None):
+        """
+        season totals, per game and per 36 minutes numbers of a player, with the team
+        of their last game and their games with every team
+        """
+        totals = self.players[player_key(name, birth_date)]
+        stats = totals['stats']
+        teams = totals['teams']
+        return {
+            'team': max(teams, key=lambda team: (teams[team]['last'], teams[team]['G'])),
+            'teams': {team: games['G'] for team, games in teams.items()},
+            'G': totals['G'],
+            'totals': dict(stats),
+            'per_game': _per(stats, 1.0 / totals['G']),
+            'per_36': _per(stats, gen_derived_var(36.0, stats.get('MP', 0.0)) or 0.0),
+        }
+
+    def team(self, name):
+        """
+        season totals, per game numbers and ratings of a team
+        """
+        totals = self.teams[name]
+        own, opp = totals['own'], totals['opp']
+        possessions = gen_possessions(own, opp)
+        ortg = gen_derived_var(100 * own['PTS'], possessions)
+        drtg = gen_derived_var(100 * opp['PTS'], possessions)
+        return {
+            'G': totals['G'],
+            'W': totals['W'],
+            'L': totals['G'] - totals['W'],
+            'totals': dict(own),
+            'per_game': _per(own, 1.0 / totals['G']),
+            'possessions': possessions,
+            'ORtg': ortg,
+            'DRtg': drtg,
+            'NRtg': ortg - drtg if ortg is not None and drtg is not None else None,
+        }
+
+    def leaders(self, stat, n=10, per_game=True, min_games=1):
+        """
+        (name, value) of the n players leading the season in stat
+        """
+        with self._lock:
+            leaders = heapq.nlargest(n, ((totals['stats'].get(stat, 0.0) / (totals['G'] if per_game else 1),
+                                          totals['name']) for totals in self.players.values()
+                                         if totals['G'] >= min_games))
+        return [(name, value) for value, name in leaders]
+
+
+class AggregateStore:
+    """
+    routes every written match to the aggregates of its season. meant to be registered
+    in base.MATCH_LISTENERS
+    """
+    def __init__(self):
+        self.seasons = {}
+        self._lock = threading.Lock()
+
+    def get(self, country, league, season):
+        key = (country, league, season)
+        with self._lock:
+            if key not in self.seasons:
+                self.seasons[key] = SeasonAggregates.load(country, league, season)
+            return self.seasons[key]
+
+    def apply(self, match, event='crawled'):
+        """
+        base.MATCH_LISTENERS entry. revised matches replace their previous numbers
+        """
+        self.get(country_key(match['country']), match['league'], match['season']).apply(match)
+
+    def save(self):
+        for aggregates in self.seasons.values():
+            aggregates.save()
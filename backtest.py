@@ -0,0 +1,170 @@
+import os
+import csv
+import json
+import logging, logging.config
+from argparse import ArgumentParser
+
+import numpy as np
+
+from constants import BUCKET_EDGES, BUCKET_LABELS, LEAGUES_TO_COUNTRIES
+from utils import get_seasons
+
+with open('logging.json', 'r') as f:
+    logging.config.dictConfig(json.load(f))
+logger = logging.getLogger('stringer-bell')
+
+
+def get_buckets(probs):
+    """
+    vectorized utils.get_bucket. returns the index in BUCKET_LABELS of every
+    probability, -1 for probabilities under the first bucket or missing
+    """
+    probs = np.asarray(probs, dtype=float)
+    return np.where(np.isnan(probs), -1, np.digitize(probs, BUCKET_EDGES) - 1)
+
+
+def convert_odds(odds):
+    """
+    vectorized utils.convert_odds: american odds to decimal odds
+    """
+    odds = np.asarray(odds, dtype=float)
+    return np.where(odds < 0, 100 / np.abs(odds), odds / 100) + 1
+
+
+def _keys(dates, teams):
+    return np.char.add(np.char.add(np.asarray(dates, dtype=str), '|'), np.asarray(teams, dtype=str))
+
+
+def load_odds(paths):
+    """
+    reads money lines from csv files with columns date, home, away, home_odds, away_odds
+    and optionally home_close, away_close (american odds) and home_prob, the model's
+    """
+    rows = []
+    for path in paths:
+        with open(path, 'r') as f:
+            rows.extend(csv.DictReader(f))
+    odds = {
+        'date': np.array([row['date'] for row in rows], dtype='datetime64[D]'),
+        'home': np.array([row['home'] for row in rows]),
+        'away': np.array([row['away'] for row in rows]),
+    }
+    for col in ['home_odds', 'away_odds', 'home_close', 'away_close', 'home_prob']:
+        odds[col] = np.array([float(row[col]) if row.get(col) else np.nan for row in rows])
+    return odds
+
+
+def load_outcomes(country, league, seasons):
+    """
+    date, teams and points of every crawled match of given seasons as arrays
+    """
+    rows = []
+    for season in seasons:
+        path = './matches/{0}/{1}/{2}'.format(country, league, season)
+        for filename in sorted(os.listdir(path)):
+            if filename.endswith('.json'):
+                with open(os.path.join(path, filename), 'r') as f:
+                    match = json.load(f)
+                rows.append((match['date'], match['home']['name'], match['away']['name'],
+                             match['home']['totals']['PTS'], match['away']['totals']['PTS']))
+    date, home, away, home_pts, away_pts = zip(*rows) if rows else ([], [], [], [], [])
+    return {
+        'date': np.array(date, dtype='datetime64[D]'),
+        'home': np.array(home),
+        'away': np.array(away),
+        'home_pts': np.array(home_pts, dtype=float),
+        'away_pts': np.array(away_pts, dtype=float),
+    }
+
+
+def join(odds, outcomes):
+    """
+    index in outcomes of the match of every odds row (by date and home team), -1 if
+    the match isn't in the archive
+    """
+    keys = _keys(outcomes['date'], outcomes['home'])
+    order = np.argsort(keys)
+    sorted_keys = keys[order]
+    wanted = _keys(odds['date'], odds['home'])
+    pos = np.clip(np.searchsorted(sorted_keys, wanted), 0, max(len(keys) - 1, 0))
+    found = sorted_keys[pos] == wanted if len(keys) else np.zeros(len(wanted), dtype=bool)
+    return np.where(found, order[pos], -1)
+
+
+def backtest(probs, odds, outcomes, min_edge=None):
+    """
+    bets one unit on the side the model favours for every odds row. probs are the
+    model probabilities of the home team winning, aligned with odds rows. rows
+    without a probability are left out. when min_edge is given, only bets with
+    expected value over it are made. returns overall and per bucket calibration and
+    ROI, plus closing line stats
+    """
+    probs = np.asarray(probs, dtype=float)
+    idx = join(odds, outcomes)
+    matched = idx >= 0
+    scored = matched & ~np.isnan(probs)
+    home_won = np.zeros(len(probs), dtype=bool)
+    home_won[matched] = outcomes['home_pts'][idx[matched]] > outcomes['away_pts'][idx[matched]]
+
+    bet_home = probs >= 0.5
+    prob = np.where(bet_home, probs, 1 - probs)
+    price = convert_odds(np.where(bet_home, odds['home_odds'], odds['away_odds']))
+    won = home_won == bet_home
+    bets = scored & ~np.isnan(price)
+    if min_edge is not None:
+        bets &= prob * price - 1 >= min_edge
+    profit = np.where(won, price - 1, -1.0)
+
+    buckets = get_buckets(prob)
+    in_bucket = bets & (buckets >= 0)
+    n = len(BUCKET_LABELS)
+    count = np.bincount(buckets[in_bucket], minlength=n)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        calibration = {
+            'bucket': BUCKET_LABELS,
+            'bets': count,
+            'predicted': np.bincount(buckets[in_bucket], prob[in_bucket], n) / count,
+            'observed': np.bincount(buckets[in_bucket], won[in_bucket], n) / count,
+            'roi': np.bincount(buckets[in_bucket], profit[in_bucket], n) / count,
+        }
+
+    report = {
+        'matched': int(matched.sum()),
+        'bets': int(bets.sum()),
+        'wins': int((won & bets).sum()),
+        'profit': float(profit[bets].sum()),
+        'roi': float(profit[bets].mean()) if bets.any() else None,
+        'brier': float(np.mean((probs[scored] - home_won[scored]) ** 2)) if scored.any() else None,
+        'buckets': calibration,
+    }
+
+    close = convert_odds(np.where(bet_home, odds['home_close'], odds['away_close']))
+    with_close = bets & ~np.isnan(close)
+    if with_close.any():
+        clv = price[with_close] / close[with_close] - 1
+        report['closing_line'] = {
+            'bets': int(with_close.sum()),
+            'clv': float(clv.mean()),
+            'beat_close': float((clv > 0).mean()),
+        }
+    return report
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('--league', default='nba')
+    parser.add_argument('--seasons', nargs='+', default=['2014-2015'])
+    parser.add_argument('--odds', nargs='+', required=True,
+                        help='csv files of money lines with the model probabilities in home_prob')
+    parser.add_argument('--min-edge', type=float)
+    parser.add_argument('--output', help='json file where the report is written')
+    args = parser.parse_args()
+    odds = load_odds(args.odds)
+    outcomes = load_outcomes(LEAGUES_TO_COUNTRIES[args.league], args.league, get_seasons(args.seasons))
+    report = backtest(odds['home_prob'], odds, outcomes, args.min_edge)
+    logger.info('{0} matched, {1} bets, {2} won, profit {3:.2f}, ROI {4}, Brier {5}'.format(
+                report['matched'], report['bets'], report['wins'], report['profit'], report['roi'], report['brier']))
+    if args.output:
+        report['buckets'] = {key: np.asarray(value).tolist() for key, value in report['buckets'].items()}
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
@@ -6,13 +6,23 @@ import requests
 import json
 import logging, logging.config
 import signal
-from multiprocessing.dummy import Pool as ThreadPool
+import time
+from contextlib import contextmanager
 from bs4 import BeautifulSoup
 from Levenshtein import ratio
 
-from constants import PLS_HEADERS, USER_AGENTS, POSITIONS
+from constants import PLS_HEADERS, USER_AGENTS, POSITIONS, BREF_HOST
 from utils import (WikipediaPlayer, timeout_handler, gen_date, feets_to_meters, timeout,
-                   gen_derived_var, gen_date_with_mins)
+                   gen_date_with_mins, check_response, ParseException,
+                   EnrichmentException)
+from retry import CrawlJob, DeadLetterQueue
+from scheduler import CrawlScheduler
+from records import CrawlRecords, PendingPlayers, page_hash
+from memory import reserve_page, release_tree, low_memory, phase
+from singleflight import SingleFlight
+from derived import derive_match
+import wikidump
+import wikibatch
 
 with open('logging.json', 'r') as f:
     logging.config.dictConfig(json.load(f))
@@ -22,6 +32,30 @@ signal.signal(signal.SIGALRM, timeout_handler)
 
 CACHE_PLAYERS_BASIC_INFO = {}
 CACHE_PLAYERS_RATIO = {}
+# rosters by page, shared by every match of the season
+CACHE_TEAMS = {}
+# concurrent lookups of the same roster page or wikipedia player share one download
+TEAM_FLIGHTS = SingleFlight()
+WIKIPEDIA_FLIGHTS = SingleFlight()
+
+# callables notified with every match written, like aggregates.AggregateStore.apply.
+# they get the match and 'crawled', 'revised' when a crawled match changed, 'enriched'
+# when players' basic info was backfilled into it, or 'rederived' by rederive.py
+MATCH_LISTENERS = []
+
+# errors raised by bs4 lookups and conversions when a page is not laid out as expected
+PARSE_ERRORS = (AttributeError, IndexError, KeyError, ValueError, TypeError)
+
+
+@contextmanager
+def layout_errors(code):
+    """
+    turns errors raised while reading a page into ParseException
+    """
+    try:
+        yield
+    except PARSE_ERRORS as e:
+        raise ParseException('Unexpected layout in {0}: {1!r}'.format(code, e)) from e
 
 
 class PlayerBasicInfo():
@@ -29,14 +63,26 @@ class PlayerBasicInfo():
     In charge of making sure every player has its correspondent uniqueness
     info. Retrieves it from b_ref or wikipedia when necessary
     """
-    def __init__(self, name, team_info):
+    def __init__(self, name, team_info, team_name=None):
         self.name = name
         self.team_info = team_info
+        self.team_name = team_name or team_info.name
 
     def get(self):
+        player = self.known()
+        if not player:
+            logger.debug('No association for {0}. Wikipedia will be used.'.format(self.name))
+            player = self._player_basic_info_from_wikipedia()
+        return player
+
+    def known(self):
+        """
+        basic info found without downloading anything: in the roster, under another
+        name in the roster, from a previous wikipedia lookup or from the local index
+        of a wikipedia dump. None otherwise
+        """
         player = self.team_info.players_.get(self.name)
         if not player:
-            # see if it's on roster under another name. if not, download from wikipedia
             name = CACHE_PLAYERS_RATIO.get(self.name)
             if name:
                 player = self.team_info.players_[name]
@@ -47,8 +93,7 @@ class PlayerBasicInfo():
                     CACHE_PLAYERS_RATIO[self.name] = name
                     player = self.team_info.players_[name]
                 else:
-                    logger.debug('No association for {0}. Wikipedia will be used.'.format(self.name))
-                    player = self._player_basic_info_from_wikipedia()
+                    player = CACHE_PLAYERS_BASIC_INFO.get(self.name) or self._player_basic_info_from_index()
         return player
 
     def _get_most_suitable_player(self):
@@ -71,27 +116,75 @@ class PlayerBasicInfo():
         player = CACHE_PLAYERS_BASIC_INFO.get(self.name)
         if player:
             return player
+        return WIKIPEDIA_FLIGHTS.do(self.name, self._download_player_basic_info)
 
-        self.player_wiki_ = WikipediaPlayer(self.name, self.team_info.name)
+    def _download_player_basic_info(self):
+        player = CACHE_PLAYERS_BASIC_INFO.get(self.name)
+        if player:
+            # cached by a lookup that finished after ours started
+            return player
+
+        player = self._player_basic_info_from_index()
+        if player:
+            return player
+
+        if wikibatch.CLIENT is not None:
+            infobox = wikibatch.CLIENT.lookup(self.name, self.team_name)
+            if not infobox:
+                raise ValueError('No wikipedia page for {0}'.format(self.name))
+            return self._player_basic_info_from_infobox(infobox)
+
+        self.player_wiki_ = WikipediaPlayer(self.name, self.team_name)
         height = self._get_height()
         weight = self._get_weight()
-        start, end = self.player_wiki_.playing_career.replace('\n', '').split('–')
-        if end == 'present':
-            exp = datetime.now().year - int(start)
-        else:
-            exp = int(end) - int(start)
 
         player = {
             'position': POSITIONS[self.player_wiki_.position.split(' / ')[0]],
             'birth_date': self.player_wiki_.born[1:11],
             'height': height if height else None,
             'weight': weight if weight else None,
-            'experience': exp if exp else None,
+            'experience': self._get_experience(self.player_wiki_.playing_career),
         }
 
+        if low_memory():
+            self.player_wiki_.release()
+        CACHE_PLAYERS_BASIC_INFO[self.name] = player
+        return player
+
+    def _player_basic_info_from_index(self):
+        """
+        player's basic information from the local index of a wikipedia dump, if any
+        """
+        indexed = wikidump.lookup(self.name, self.team_name)
+        if not indexed:
+            return None
+        return self._player_basic_info_from_infobox(indexed)
+
+    def _player_basic_info_from_infobox(self, infobox):
+        """
+        player's basic information from infobox fields, as wikidump.parse_infobox
+        """
+        player = {
+            'position': POSITIONS.get((infobox['position'] or '').split(' / ')[0]),
+            'birth_date': infobox['born'],
+            'height': infobox['height'],
+            'weight': infobox['weight'],
+            'experience': self._get_experience(infobox['playing_career']) if infobox['playing_career'] else None,
+        }
         CACHE_PLAYERS_BASIC_INFO[self.name] = player
         return player
 
+    def _get_experience(self, playing_career):
+        try:
+            start, end = playing_career.replace('\n', '').split('–')
+            if end == 'present':
+                exp = datetime.now().year - int(start)
+            else:
+                exp = int(end) - int(start)
+        except ValueError:
+            return None
+        return exp if exp else None
+
     def _get_height(self):
         h = self.player_wiki_.listed_height
         if h.index('m') < h.index('ft'):
@@ -114,19 +207,24 @@ class BRefTeam():
     Generates team information from basketball reference
     """
 
-    def __init__(self, name, page):
+    def __init__(self, name, page, host=BREF_HOST):
         self.name = name
         self.page = page
-        rv = requests.get('http://www.basketball-reference.com{0}'.format(page))
+        rv = requests.get('{0}{1}'.format(host, page))
+        check_response(rv)
         self.soup = BeautifulSoup(rv.text)
 
     def gen_players_info(self):
         team = self.soup.find('div', {'id': 'div_roster'})
-        headers = [PLS_HEADERS[th.text.strip()] for th
+        self.players_ = {}
+        if team is None or team.thead is None:
+            # the players are then looked up in wikipedia
+            logger.warning('No roster in {0}'.format(self.page))
+            return
+        headers = [PLS_HEADERS.get(th.text.strip(), th.text.strip()) for th
                    in team.thead.find_all('th')[1:]]
         rows = [row for row in team.tbody.find_all('tr')]
 
-        self.players_ = {}
         for player in rows:
             player = [i.text for i in player.find_all('td')]
             player = dict(zip(headers, player))
@@ -146,6 +244,13 @@ class BRefTeam():
 
             self.players_[player['name']] = player
 
+    def release(self):
+        """
+        drops the parse tree of the team page once the roster is read
+        """
+        release_tree(self.soup)
+        self.soup = None
+
     def __repr__(self):
         'BRefTeam({0}, {1})'.format(self.name, self.page)
 
@@ -154,6 +259,11 @@ class BRefMatch:
     """
     Generates a match information from basketball reference
     """
+    team_host = BREF_HOST
+    # records.PendingPlayers where players missing from rosters are left for the
+    # enrichment stage. when None they are looked up in wikipedia right away
+    pending = None
+
     def __init__(self, country, league, season, code, match_type):
         self.country = country
         self.league = league
@@ -165,28 +275,61 @@ class BRefMatch:
         """
         returns wether match is already crawled
         """
-        return '{0}.json'.format(self.code) in os.listdir('./matches/{0}/{1}/{2}'.format(
-                                                          self.country, self.league, self.season))
+        return os.path.exists('./matches/{0}/{1}/{2}/{3}.json'.format(
+                              self.country, self.league, self.season, self.code))
 
-    @timeout
-    def crawl(self):
+    def fetch(self):
         """
-        generate all stats for a nba match
+        downloads the box score page and keeps the hash of its content
         """
         match_url = self.uri_base.format(self.code)
         headers = {'User-agent': random.choice(USER_AGENTS)}
         rv = requests.get(match_url, headers=headers)
-        self.soup_ = BeautifulSoup(rv.text)
+        check_response(rv)
+        self.hash_ = page_hash(rv.text)
+        return rv.text
+
+    @timeout
+    def crawl(self, html=None, event='crawled'):
+        """
+        generate all stats for a nba match. the page is fetched unless given
+        """
+        with reserve_page() as got:
+            if html is None:
+                with phase('fetch'):
+                    html = self.fetch()
+            got(html)
+            with phase('parse'), layout_errors(self.code):
+                self.parse(html)
+            html = None
+            if low_memory():
+                self.release()
+
+        with phase('enrichment'), layout_errors(self.code):
+            self._gen_teams_basic_info()
+        with phase('write'):
+            self._write_match(event)
+
+    def release(self):
+        """
+        drops the parse tree of the page, keeping what was extracted from it
+        """
+        release_tree(getattr(self, 'soup_', None))
+        self.soup_ = None
+
+    def parse(self, html):
+        """
+        generate match dict from the box score page, without players' basic info
+        """
+        self.soup_ = BeautifulSoup(html)
 
         self.match_ = defaultdict(dict)
         self._gen_teams_stats()
         self._gen_match_basic_info()
-        self._gen_teams_basic_info()
+        self._gen_teams_names()
         self._gen_scoring()
         self._gen_extra_info()
 
-        self._write_match()
-
     def _gen_teams_stats(self):
         """
         generate and add statistics related to teams and players to match dict
@@ -202,7 +345,9 @@ class BRefMatch:
         self._read_table(adv_stats_tables, last_col=True)
 
         self._gen_derived_stats()
+        self._gen_plus_minus()
 
+    def _gen_plus_minus(self):
         self.match_['home']['totals']['+/-'] = self.match_['home']['totals']['PTS'] - self.match_['away']['totals']['PTS']
         self.match_['away']['totals']['+/-'] = self.match_['away']['totals']['PTS'] - self.match_['home']['totals']['PTS']
 
@@ -210,13 +355,17 @@ class BRefMatch:
         """
         generate and add basic information related to match to match dict
         """
+        self._gen_match_ids()
+        self._gen_date_and_stadium([el.text for el in self.soup_.find('div', {'class': 'scorebox_meta'}).find_all('div')])
+
+    def _gen_match_ids(self):
         self.match_['code'] = self.code
         self.match_['type'] = self.type
         self.match_['league'] = self.league
         self.match_['season'] = self.season
         self.match_['country'] = " ".join(map(lambda x: x.capitalize(), self.country.split('_')))
 
-        loc_time = [el.text for el in self.soup_.find('div', {'class': 'scorebox_meta'}).find_all('div')]
+    def _gen_date_and_stadium(self, loc_time):
         if len(loc_time) >= 1:
             date = loc_time[0]
             if 'AM' in date or 'PM' in date:
@@ -229,29 +378,65 @@ class BRefMatch:
             self.match_['stadium'] = " ".join(map(lambda x: x.capitalize(),
                                               loc_time[1].split(',')[0].split(' ')))
 
-    def _gen_teams_basic_info(self):
+    def _gen_teams_names(self):
         """
-        generates teams (and their players) basic information
+        generates teams names and keeps their pages for _gen_teams_basic_info
         """
         teams = [team.find_all('a')[-1] for team in self.soup_.find('div', {'scorebox'}
                  ).find_all('div', {'itemprop': 'performer'})]
         away, home = [team.text for team in teams]
         away_page, home_page = [team['href'] for team in teams]
-        for team, team_name, team_page in zip(['away', 'home'], [away, home], [away_page, home_page]):
+        self.teams_ = [(away, away_page), (home, home_page)]
+        for team, (team_name, _) in zip(['away', 'home'], self.teams_):
             self.match_[team]['name'] = team_name
+
+    def _gen_teams_basic_info(self):
+        """
+        generates teams' players basic information
+        """
+        for team, (team_name, team_page) in zip(['away', 'home'], self.teams_):
             self._team_pls_basic_info(team, team_name, team_page)
 
     def _team_pls_basic_info(self, team_cond, team_name, team_page):
         """
         generate and add basic information related to players to match dict
         """
-        team_info = BRefTeam(team_name, team_page)
-        team_info.gen_players_info()
+        team_info = self._team_info(team_name, team_page)
 
         pls = self.match_[team_cond]['players']
         for pl, info in pls.items():
             pl_basic_info = PlayerBasicInfo(pl, team_info)
-            info.update(pl_basic_info.get())
+            try:
+                if self.pending is None:
+                    info.update(pl_basic_info.get())
+                    continue
+                basic_info = pl_basic_info.known()
+                if basic_info:
+                    info.update(basic_info)
+                else:
+                    self.pending.add(pl, team_name, self.code, team_cond)
+            except Exception as e:
+                raise EnrichmentException("Couldn't get basic info of {0}: {1!r}".format(pl, e)) from e
+
+    def _team_info(self, team_name, team_page):
+        """
+        returns team roster, downloading it only the first time it's needed
+        """
+        key = self.team_host + team_page
+        team_info = CACHE_TEAMS.get(key)
+        if team_info is None:
+            team_info = TEAM_FLIGHTS.do(key, lambda: self._download_team_info(key, team_name, team_page))
+        return team_info
+
+    def _download_team_info(self, key, team_name, team_page):
+        team_info = CACHE_TEAMS.get(key)
+        if team_info is None:
+            team_info = BRefTeam(team_name, team_page, self.team_host)
+            team_info.gen_players_info()
+            if low_memory():
+                team_info.release()
+            CACHE_TEAMS[key] = team_info
+        return team_info
 
     def _gen_scoring(self):
         """
@@ -272,73 +457,177 @@ class BRefMatch:
         raise NotImplementedError
 
     def _gen_derived_stats(self):
-        for team in ['home', 'away']:
-            team_stats = self.match_[team]['totals']
-
-            def add_derivated_stats_to_dict(d, type_):
-                d['FG%'] = gen_derived_var(d['FG'], d['FGA'])
-                d['FT%'] = gen_derived_var(d['FT'], d['FTA'])
-                d['3P%'] = gen_derived_var(d['3P'], d['3PA'])
-                d['eFG%'] = gen_derived_var((d['FG'] + 0.5 * d['3P']), d['FGA'])
-                d['TSA'] = d['FGA'] + 0.44 * d['FTA']
-                d['TS%'] = gen_derived_var(d['PTS'], 2*d['TSA'])
-                d['3PAr'] = gen_derived_var(d['3PA'], d['FGA'])
-                d['FTAr'] = gen_derived_var(d['FTA'], d['FGA'])
-                d['2P'] = d['FG'] - d['3P']
-                d['2PA'] = d['FGA'] - d['3PA']
-                d['2P%'] = gen_derived_var(d['2P'], d['2PA'])
-                d['2PAr'] = gen_derived_var(d['2PA'], d['FGA'])
-                d['DRB'] = d['TRB'] - d['ORB']
-                d['ORBr'] = gen_derived_var(d['ORB'], d['TRB'])
-                d['DRBr'] = gen_derived_var(d['DRB'], d['TRB'])
-                d['AST/TOV'] = gen_derived_var(d['AST'], d['TOV'])
-                d['STL/TOV'] = gen_derived_var(d['STL'], d['TOV'])
-                d['FIC'] = (d['PTS'] + d['ORB'] + 0.75 * d['DRB'] + d['AST'] + d['STL'] +
-                            d['BLK'] - 0.75 * d['FGA'] - 0.375 * d['FTA'] - d['TOV'] - 0.5 * d['PF'])
-                d['FT/FGA'] = gen_derived_var(d['FT'], d['FGA'])
-
-                d['HOB'] = gen_derived_var(d['FG'] + d['AST'], team_stats['FG'])
-
-            # derive players and teams stats
-            for player_stats in self.match_[team]['players'].values():
-                if player_stats['MP']:
-                    add_derivated_stats_to_dict(player_stats, 'player')
-            add_derivated_stats_to_dict(team_stats, 'team')
-
-    def _write_match(self):
+        derive_match(self.match_)
+
+    def _write_match(self, event='crawled'):
         filename = './matches/{0}/{1}/{2}/{3}.json'.format(self.country, self.league, self.season, self.code)
+        data = json.dumps(self.match_)
+        if event == 'revised' and os.path.exists(filename):
+            with open(filename, 'r') as f:
+                if f.read() == data:
+                    return
         with open(filename, 'w') as f:
-            f.write(json.dumps(self.match_))
+            f.write(data)
+        self._notify_listeners(event)
+
+    def _notify_listeners(self, event):
+        notify_listeners(self.match_, event)
+
+
+def notify_listeners(match, event):
+    """
+    calls every listener in MATCH_LISTENERS with a written match. failing listeners are logged
+    """
+    for listener in MATCH_LISTENERS:
+        try:
+            listener(match, event)
+        except Exception:
+            logger.exception('Listener {0} failed on match {1}'.format(listener, match.get('code')))
 
 
 class BRefSeason:
     """
     Crawls full season from basketball reference
     """
+    match_class = None
 
     def __init__(self, country, league, season, date=None):
         self.country = country
         self.league = league
         self.season = season
         self.date = date
+        self.dead_letters = DeadLetterQueue(country, league, season)
+        self.records = CrawlRecords(country, league, season)
+        self.pending = PendingPlayers(country, league, season)
+        # time by which matches must be discovered, set by season_jobs
+        self.deadline_ = None
+
+    def _match(self, code, match_type):
+        match = self.match_class(self.country, self.league, self.season, code, match_type)
+        match.pending = self.pending
+        return match
 
     def _crawl_match(self, code, match_type):
-        raise NotImplementedError
+        """
+        crawls given match. errors are left to propagate so they can be retried
+        """
+        match = self._match(code, match_type)
+        if not match.is_crawled():
+            match.crawl()
+            self.records.set(code, match.hash_)
+            logger.info('Crawled - {0}'.format(code))
 
-    def crawl_season(self):
+    def _revalidate_match(self, code, match_type):
+        """
+        fetches a crawled match again, parsing and rewriting it only if its page changed.
+        matches crawled before their page hash was recorded have the hash seeded from
+        this fetch instead of being parsed again
+        """
+        match = self._match(code, match_type)
+        html = match.fetch()
+        recorded = self.records.get(code)
+        if recorded is None:
+            self.records.set(code, match.hash_)
+            logger.info('Seeded crawl record - {0}'.format(code))
+            return
+        if match.hash_ == recorded:
+            return
+        match.crawl(html, event='revised')
+        self.records.set(code, match.hash_)
+        logger.info('Revalidated - {0}'.format(code))
+
+    def crawl_season(self, workers=5, time_budget=None):
         """
-        concurrently crawl every match in asked season
+        concurrently crawl every match in asked season. when a time budget (in seconds)
+        is given, it bounds the discovery of the matches too and matches not started by
+        then are sent to dead letters. matches already being crawled when it runs out
+        are let finish, so a run can overrun it by about one match crawl
+        """
+        deadline = time.time() + time_budget if time_budget else None
+        try:
+            self._crawl_jobs(self.season_jobs(deadline), workers, deadline)
+        finally:
+            self._save_state()
+
+    def season_jobs(self, deadline=None):
+        """
+        a job for every match of the season. seasons whose matches take long to
+        discover stop looking for them at deadline
+        """
+        self.deadline_ = deadline
+        try:
+            self._gen_matches_codes()
+        finally:
+            self.deadline_ = None
+        jobs = []
+        for match_type, matches in zip(['Season', 'Post-Season'], [self.reg_s_codes_, self.post_s_codes_]):
+            logger.info('Crawling {0} {1} matches of {2}'.format(len(matches), match_type, self.season))
+            jobs.extend(CrawlJob(code, match_type) for code in matches)
+        return jobs
+
+    def replay_dead_letters(self, workers=5):
+        """
+        crawls again every match that previously failed permanently
+        """
+        jobs = self.dead_letters.take()
+        logger.info('Replaying {0} dead letters'.format(len(jobs)))
+        try:
+            self._crawl_jobs(jobs, workers)
+        finally:
+            self._save_state()
+        self.dead_letters.finish()
+
+    def revalidate_season(self, workers=5):
+        """
+        re-fetches every crawled match of the season and rewrites the ones whose page
+        changed since, notifying listeners with 'revised'
         """
         self._gen_matches_codes()
+        jobs = []
         for match_type, matches in zip(['Season', 'Post-Season'], [self.reg_s_codes_, self.post_s_codes_]):
-            pool = ThreadPool(5)
-            logger.info('Crawling {0} {1} matches'.format(len(matches), match_type))
-            pool.map(lambda code: self._crawl_match(code, match_type), matches)
-            pool.close()
-            pool.join()
+            jobs.extend(CrawlJob(code, match_type) for code in matches
+                        if self._match(code, match_type).is_crawled())
+        logger.info('Revalidating {0} matches'.format(len(jobs)))
+        try:
+            self._crawl_jobs(jobs, workers, crawl=self._revalidate_match)
+        finally:
+            self._save_state()
+
+    def _save_state(self):
+        self.records.save()
+        self.pending.save()
+
+    def _crawl_jobs(self, jobs, workers, deadline=None, crawl=None):
+        """
+        crawls jobs by priority with a CrawlScheduler of its own, calling crawl
+        (_crawl_match by default) with their code and type
+        """
+        scheduler = CrawlScheduler(workers)
+        scheduler.add(self, jobs, crawl)
+        scheduler.run(deadline)
+        scheduler.metrics.report()
 
     def _gen_matches_codes(self):
         """
         generates b-reference codes for given league, season and date to crawl
         """
         raise NotImplementedError
+
+
+def crawl_seasons(seasons, workers=5, time_budget=None):
+    """
+    crawls several seasons with a single scheduler, so the recent matches of any of
+    them go before the backfill of the rest. time budget is in seconds for all of them,
+    discovery included, as in BRefSeason.crawl_season
+    """
+    deadline = time.time() + time_budget if time_budget else None
+    scheduler = CrawlScheduler(workers)
+    try:
+        for season in seasons:
+            scheduler.add(season, season.season_jobs(deadline))
+        scheduler.run(deadline)
+    finally:
+        for season in seasons:
+            season._save_state()
+    scheduler.metrics.report()
+    return scheduler.metrics
@@ -0,0 +1,144 @@
+import os
+import json
+import time
+import shutil
+import resource
+import tempfile
+import threading
+import logging, logging.config
+from multiprocessing import Process
+from argparse import ArgumentParser
+
+import numpy as np
+
+from replay import ReplayConfig, PageStore, serve
+
+with open('logging.json', 'r') as f:
+    logging.config.dictConfig(json.load(f))
+logger = logging.getLogger('stringer-bell')
+
+
+def _cpu_time():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def run_level(season_class, country, league, season, workers, limit=None):
+    """
+    crawls a season from scratch with the given concurrency, in a scratch directory,
+    then runs its enrichment stage with as many workers. returns the crawled matches,
+    wall time, cpu time, the latency of every match and the enrichment time
+    """
+    import base
+    import schedule
+    from enrichment import EnrichmentStage
+
+    latencies = []
+    lock = threading.Lock()
+
+    class BenchSeason(season_class):
+
+        def _gen_matches_codes(self):
+            super()._gen_matches_codes()
+            if limit:
+                self.reg_s_codes_ = self.reg_s_codes_[:limit]
+                self.post_s_codes_ = self.post_s_codes_[:max(0, limit - len(self.reg_s_codes_))]
+
+        def _crawl_match(self, code, match_type):
+            start = time.time()
+            super()._crawl_match(code, match_type)
+            with lock:
+                latencies.append(time.time() - start)
+
+    # every level starts cold, except for the schedule, fetched before timing
+    for cache in [base.CACHE_PLAYERS_BASIC_INFO, base.CACHE_PLAYERS_RATIO, base.CACHE_TEAMS]:
+        cache.clear()
+    schedule.get_schedule(league, season)
+
+    cwd = os.getcwd()
+    scratch = tempfile.mkdtemp(prefix='benchmark-')
+    try:
+        os.chdir(scratch)
+        os.makedirs('./matches/{0}/{1}/{2}'.format(country, league, season))
+        b_ref = BenchSeason(country, league, season)
+        start, cpu = time.time(), _cpu_time()
+        b_ref.crawl_season(workers)
+        wall, cpu = time.time() - start, _cpu_time() - cpu
+        start = time.time()
+        EnrichmentStage(country, league, season, workers).run()
+        enrichment = time.time() - start
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(scratch, ignore_errors=True)
+    return len(latencies), wall, cpu, latencies, enrichment
+
+
+def summary(workers, n_matches, wall, cpu, latencies, enrichment):
+    latencies = np.array(latencies) if latencies else np.zeros(1)
+    return {
+        'workers': workers,
+        'matches': n_matches,
+        'matches_per_second': n_matches / wall if wall else 0.0,
+        'p50_latency': float(np.percentile(latencies, 50)),
+        'p99_latency': float(np.percentile(latencies, 99)),
+        'cpu_per_match': cpu / n_matches if n_matches else 0.0,
+        'enrichment_seconds': enrichment,
+    }
+
+
+def _start_server(port, root, config):
+    server = Process(target=serve, args=(port, PageStore(root), config), daemon=True)
+    server.start()
+    time.sleep(0.5)
+    return server
+
+
+def main(league, season, levels, port, root, config, limit=None, output=None):
+    # hosts are read by constants when first imported, so the crawler is only imported
+    # once they point to the replay server
+    host = 'http://127.0.0.1:{0}'.format(port)
+    os.environ['BREF_HOST'] = os.environ['NCAA_HOST'] = host
+    os.environ['WIKIPEDIA_API_URL'] = host + '/w/api.php'
+    from constants import LEAGUES_TO_COUNTRIES
+    from leagues import LEAGUES_TO_SEASONS
+
+    results = []
+    for workers in levels:
+        # a server per level, so faults are drawn from the same request counts every time
+        server = _start_server(port, root, config)
+        try:
+            results.append(summary(workers, *run_level(LEAGUES_TO_SEASONS[league], LEAGUES_TO_COUNTRIES[league],
+                                                       league, season, workers, limit)))
+        finally:
+            server.terminate()
+            server.join()
+
+    for result in results:
+        logger.info('{workers} workers: {matches} matches, {matches_per_second:.2f} matches/s, '
+                    'p50 {p50_latency:.3f}s, p99 {p99_latency:.3f}s, '
+                    '{cpu_per_match:.4f}s cpu/match, enrichment {enrichment_seconds:.2f}s'.format(**result))
+    if output:
+        with open(output, 'w') as f:
+            json.dump({'league': league, 'season': season, 'config': vars(config), 'results': results},
+                      f, indent=2)
+    return results
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('--league', default='nba')
+    parser.add_argument('--season', default='2014-2015')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 5, 10, 20])
+    parser.add_argument('--matches', type=int, help='crawl only the first matches of the season')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--root', default='./replay', help='pages recorded with replay.py --record')
+    parser.add_argument('--latency', type=float, default=0.05, help='seconds')
+    parser.add_argument('--jitter', type=float, default=0.02, help='seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--throttle-rate', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='json file where the results are written')
+    args = parser.parse_args()
+    config = ReplayConfig(args.latency, args.jitter, args.error_rate, args.throttle_rate, seed=args.seed)
+    main(args.league, args.season, args.workers, args.port, os.path.abspath(args.root), config,
+         args.matches, args.output)
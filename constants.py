@@ -1,9 +1,47 @@
+import os
+
+# hosts of the crawled sites. they can be pointed to a local stand-in such as replay.py
+BREF_HOST = os.environ.get('BREF_HOST', 'http://www.basketball-reference.com')
+WIKIPEDIA_API_URL = os.environ.get('WIKIPEDIA_API_URL', 'http://en.wikipedia.org/w/api.php')
+
 LEAGUES_TO_PATH = {
-    'nba': 'http://www.basketball-reference.com/leagues/NBA_{0}_games.html',
-    'acb': 'http://www.basketball-reference.com/euro/spain-liga-acb/{0}-schedule.html',
-    'lnb': 'http://www.basketball-reference.com/euro/france-lnb-pro-a/{0}-schedule.html',
-    'seriea': 'http://www.basketball-reference.com/euro/italy-basket-serie-a/{0}-schedule.html',
-    'greek': 'http://www.basketball-reference.com/euro/greek-basket-league/{0}-schedule.html',
+    'nba': BREF_HOST + '/leagues/NBA_{0}_games.html',
+    'acb': BREF_HOST + '/euro/spain-liga-acb/{0}-schedule.html',
+    'lnb': BREF_HOST + '/euro/france-lnb-pro-a/{0}-schedule.html',
+    'seriea': BREF_HOST + '/euro/italy-basket-serie-a/{0}-schedule.html',
+    'greek': BREF_HOST + '/euro/greek-basket-league/{0}-schedule.html',
+}
+
+
+# box score layout of the european leagues: a basic stats table per team, in page
+# order, with the same headers as nba's
+EURO_BOX_SCORE_SPEC = {
+    'boxscore_url': BREF_HOST + '/euro/boxscores/{0}.html',
+    'boxscore_link': r'^/euro/boxscores/[^/]+\.html$',
+    'team_link': r'^/euro/teams/',
+    'tables': [
+        {'id': r'^box-score-basic', 'teams': ['away', 'home'], 'plus_minus': False},
+    ],
+}
+
+
+# how schedules and box scores of every league are read. leagues with a 'tables'
+# entry are crawled by leagues.SpecBRefSeason
+LEAGUE_SPECS = {
+    'nba': {
+        'boxscore_url': BREF_HOST + '/boxscores/{0}.html',
+        'boxscore_link': r'^/boxscores/\w+\.html$',
+        'team_link': r'^/teams/',
+        # codes of unplayed matches can be built from their date and home team
+        'unplayed_codes': True,
+        # box score codes start with the date the match was played, which the
+        # schedule rows of relocated or rescheduled matches don't always show
+        'code_dates': True,
+    },
+    'acb': EURO_BOX_SCORE_SPEC,
+    'lnb': EURO_BOX_SCORE_SPEC,
+    'seriea': EURO_BOX_SCORE_SPEC,
+    'greek': EURO_BOX_SCORE_SPEC,
 }
 
 
@@ -502,14 +540,20 @@ LEAGUES_TO_COUNTRIES = {
 
 
 LEAGUES_TO_PATH = {
-    'nba': 'http://www.basketball-reference.com/leagues/NBA_{0}_games.html',
-    'acb': 'http://www.basketball-reference.com/euro/spain-liga-acb/{0}-schedule.html',
-    'lnb': 'http://www.basketball-reference.com/euro/france-lnb-pro-a/{0}-schedule.html',
-    'seriea': 'http://www.basketball-reference.com/euro/italy-basket-serie-a/{0}-schedule.html',
-    'greek': 'http://www.basketball-reference.com/euro/greek-basket-league/{0}-schedule.html',
+    'nba': BREF_HOST + '/leagues/NBA_{0}_games.html',
+    'acb': BREF_HOST + '/euro/spain-liga-acb/{0}-schedule.html',
+    'lnb': BREF_HOST + '/euro/france-lnb-pro-a/{0}-schedule.html',
+    'seriea': BREF_HOST + '/euro/italy-basket-serie-a/{0}-schedule.html',
+    'greek': BREF_HOST + '/euro/greek-basket-league/{0}-schedule.html',
 }
 
 
+NCAA_URL = os.environ.get('NCAA_HOST', 'http://www.sports-reference.com')
+NCAA_SCHEDULE_PATH = NCAA_URL + '{0}{1}-schedule.html'
+# game types of ncaa schedules crawled as post season
+NCAA_POST_SEASON = {'CTOURN', 'NCAA', 'NIT', 'CBI', 'CIT'}
+
+
 COLLEGES_PATHS = {
     'Abilene Christian Wildcats': '/cbb/schools/abilene-christian/',
     'Air Force Falcons': '/cbb/schools/air-force/',
@@ -863,3 +907,116 @@ COLLEGES_PATHS = {
     'Yale Bulldogs': '/cbb/schools/yale/',
     'Youngstown State Penguins': '/cbb/schools/youngstown-state/'
 }
+
+
+RETRY_POLICIES = {
+    # error class: max attempts, base and cap (in seconds) of the exponential backoff
+    'transient': {'attempts': 6, 'base': 2, 'cap': 120},
+    'parse': {'attempts': 2, 'base': 30, 'cap': 60},
+    'enrichment': {'attempts': 3, 'base': 10, 'cap': 300},
+    'fatal': {'attempts': 1, 'base': 0, 'cap': 0},
+}
+
+
+# fixed positions of every stat stored in a match line. basic and advanced box score
+# columns first, then the ones added by BRefMatch._gen_derived_stats
+STATS_SCHEMA = [
+    'MP', 'FG', 'FGA', 'FG%', '3P', '3PA', '3P%', 'FT', 'FTA', 'FT%', 'ORB', 'DRB', 'TRB',
+    'AST', 'STL', 'BLK', 'TOV', 'PF', 'PTS', 'GmSc', '+/-',
+    'TS%', 'eFG%', '3PAr', 'FTAr', 'ORB%', 'DRB%', 'TRB%', 'AST%', 'STL%', 'BLK%', 'TOV%',
+    'USG%', 'ORtg', 'DRtg', 'BPM',
+    'TSA', '2P', '2PA', '2P%', '2PAr', 'ORBr', 'DRBr', 'AST/TOV', 'STL/TOV', 'FIC', 'FT/FGA',
+    'HOB',
+]
+
+
+# texts found instead of minutes played for players that didn't play
+DNP_STATUSES = {'Did Not Play', 'Player Suspended', 'Did Not Dress', 'Not With Team'}
+
+
+# players' identity fields coming from rosters or wikipedia
+BIO_FIELDS = [
+    'name', 'number', 'position', 'height', 'weight', 'birth_date', 'experience',
+    'college', 'class', 'hometown', 'high_school', 'summary', '',
+]
+
+
+# counting stats summed up in season aggregates
+AGGREGATE_STATS = [
+    'MP', 'FG', 'FGA', '3P', '3PA', 'FT', 'FTA', 'ORB', 'DRB', 'TRB', 'AST', 'STL', 'BLK',
+    'TOV', 'PF', 'PTS', '+/-',
+]
+
+
+# stats averaged by the feature store, the last games windows and the half life
+# (in games) of the exponentially weighted averages
+FEATURE_STATS = [
+    'PTS', 'FG', 'FGA', '3P', '3PA', 'FT', 'FTA', 'ORB', 'DRB', 'TRB', 'AST', 'STL', 'BLK',
+    'TOV', 'PF', '+/-', 'FG%', '3P%', 'FT%', 'eFG%', 'TS%', '3PAr', 'FTAr', 'AST/TOV', 'FIC',
+]
+FEATURE_WINDOWS = [3, 5, 10]
+FEATURE_HALFLIFE = 5
+
+
+# lower edges and names of the probability buckets used by utils.get_bucket
+BUCKET_EDGES = [0.5, 0.55, 0.6, 0.7, 0.8, 0.9]
+BUCKET_LABELS = ['50-55', '55-60', '60-70', '70-80', '80-90', '90-100']
+
+
+PBP_URL = BREF_HOST + '/boxscores/pbp/{0}.html'
+# values of the type column of play-by-play events
+PBP_EVENT_TYPES = [
+    'other',
+    'period_start',
+    'period_end',
+    'jump_ball',
+    'made_shot',
+    'missed_shot',
+    'made_free_throw',
+    'missed_free_throw',
+    'offensive_rebound',
+    'defensive_rebound',
+    'turnover',
+    'foul',
+    'substitution',
+    'timeout',
+    'violation',
+]
+# play-by-play columns and their array typecodes. clock is in tenths of second left
+# in the period, team is 0 for away, 1 for home and -1 for none, players are ids in
+# the store's players list (-1 for none)
+PBP_COLUMNS = [
+    ('period', 'b'),
+    ('clock', 'h'),
+    ('team', 'b'),
+    ('type', 'b'),
+    ('player', 'h'),
+    ('player2', 'h'),
+    ('points', 'b'),
+    ('away_score', 'h'),
+    ('home_score', 'h'),
+]
+# box score stats counted for lineups from play-by-play, for and against
+LINEUP_STATS = ['FGA', 'FG', 'FTA', 'FT', 'ORB', 'DRB', 'TOV', 'PTS']
+
+
+# minutes played by the five players of a team in a game without overtimes, and in every overtime
+REGULATION_MINUTES = {'nba': 240, 'default': 200}
+OVERTIME_MINUTES = 25
+
+
+# crawl priority classes, most urgent first. jobs of a class get a deadline that many
+# seconds after being queued, or none
+CRAWL_PRIORITIES = {'live': 0, 'recent': 1, 'post-season': 2, 'backfill': 3}
+CRAWL_DEADLINES = {'live': 120, 'recent': 4 * 3600, 'post-season': None, 'backfill': None}
+# matches played up to this many days ago are crawled as recent
+RECENT_DAYS = 2
+# workers backfill jobs can't take, so more urgent jobs start right away
+RESERVED_WORKERS = 1
+
+
+# seconds between polls of a live match, doubling from the minimum while its box score
+# doesn't change, and between refreshes of the schedule to find the finished ones
+LIVE_MIN_INTERVAL = 30
+LIVE_MAX_INTERVAL = 300
+LIVE_SCHEDULE_INTERVAL = 600
@@ -0,0 +1,72 @@
+from utils import gen_derived_var
+
+# stats computed from the raw box score stats of a line, in the order they're computed.
+# every formula has a version, stored with every match in match['derived'], to be
+# bumped when the formula changes so rederive.py recomputes it in the stored matches.
+# formulas get the line's stats and its team's totals, and the stats they read are listed
+# so the stats depending on a changed one are recomputed as well
+DERIVED_STATS = [
+    # stat, version, stats read, formula
+    ('FG%', 1, ['FG', 'FGA'], lambda d, team: gen_derived_var(d['FG'], d['FGA'])),
+    ('FT%', 1, ['FT', 'FTA'], lambda d, team: gen_derived_var(d['FT'], d['FTA'])),
+    ('3P%', 1, ['3P', '3PA'], lambda d, team: gen_derived_var(d['3P'], d['3PA'])),
+    ('eFG%', 1, ['FG', '3P', 'FGA'], lambda d, team: gen_derived_var((d['FG'] + 0.5 * d['3P']), d['FGA'])),
+    ('TSA', 1, ['FGA', 'FTA'], lambda d, team: d['FGA'] + 0.44 * d['FTA']),
+    ('TS%', 1, ['PTS', 'TSA'], lambda d, team: gen_derived_var(d['PTS'], 2 * d['TSA'])),
+    ('3PAr', 1, ['3PA', 'FGA'], lambda d, team: gen_derived_var(d['3PA'], d['FGA'])),
+    ('FTAr', 1, ['FTA', 'FGA'], lambda d, team: gen_derived_var(d['FTA'], d['FGA'])),
+    ('2P', 1, ['FG', '3P'], lambda d, team: d['FG'] - d['3P']),
+    ('2PA', 1, ['FGA', '3PA'], lambda d, team: d['FGA'] - d['3PA']),
+    ('2P%', 1, ['2P', '2PA'], lambda d, team: gen_derived_var(d['2P'], d['2PA'])),
+    ('2PAr', 1, ['2PA', 'FGA'], lambda d, team: gen_derived_var(d['2PA'], d['FGA'])),
+    ('DRB', 1, ['TRB', 'ORB'], lambda d, team: d['TRB'] - d['ORB']),
+    ('ORBr', 1, ['ORB', 'TRB'], lambda d, team: gen_derived_var(d['ORB'], d['TRB'])),
+    ('DRBr', 1, ['DRB', 'TRB'], lambda d, team: gen_derived_var(d['DRB'], d['TRB'])),
+    ('AST/TOV', 1, ['AST', 'TOV'], lambda d, team: gen_derived_var(d['AST'], d['TOV'])),
+    ('STL/TOV', 1, ['STL', 'TOV'], lambda d, team: gen_derived_var(d['STL'], d['TOV'])),
+    ('FIC', 1, ['PTS', 'ORB', 'DRB', 'AST', 'STL', 'BLK', 'FGA', 'FTA', 'TOV', 'PF'],
+     lambda d, team: (d['PTS'] + d['ORB'] + 0.75 * d['DRB'] + d['AST'] + d['STL'] + d['BLK'] -
+                      0.75 * d['FGA'] - 0.375 * d['FTA'] - d['TOV'] - 0.5 * d['PF'])),
+    ('FT/FGA', 1, ['FT', 'FGA'], lambda d, team: gen_derived_var(d['FT'], d['FGA'])),
+    ('HOB', 1, ['FG', 'AST'], lambda d, team: gen_derived_var(d['FG'] + d['AST'], team['FG'])),
+]
+
+
+def versions():
+    return {stat: version for stat, version, _, _ in DERIVED_STATS}
+
+
+def stale_stats(stored):
+    """
+    derived stats whose stored version isn't the current one, plus the ones computed
+    from them. stored are the versions kept in a match, missing in matches from before
+    versioning
+    """
+    stale = set()
+    for stat, version, reads, _ in DERIVED_STATS:
+        if (stored or {}).get(stat) != version or stale.intersection(reads):
+            stale.add(stat)
+    return stale
+
+
+def derive(d, team, stats=None):
+    """
+    computes the derived stats of a line in place, only the ones in stats when given
+    """
+    for stat, _, _, formula in DERIVED_STATS:
+        if stats is None or stat in stats:
+            d[stat] = formula(d, team)
+
+
+def derive_match(match, stats=None):
+    """
+    computes the derived stats of the players and teams of a match in place, and
+    stores the versions of the formulas
+    """
+    for team in ['home', 'away']:
+        team_stats = match[team]['totals']
+        for player_stats in match[team]['players'].values():
+            if player_stats['MP']:
+                derive(player_stats, team_stats, stats)
+        derive(team_stats, team_stats, stats)
+    match['derived'] = versions()
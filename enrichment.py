@@ -0,0 +1,109 @@
+import os
+import json
+import logging, logging.config
+from multiprocessing.dummy import Pool as ThreadPool
+
+from base import PlayerBasicInfo, CACHE_PLAYERS_BASIC_INFO, notify_listeners
+from records import PendingPlayers
+import wikibatch
+
+with open('logging.json', 'r') as f:
+    logging.config.dictConfig(json.load(f))
+logger = logging.getLogger('stringer-bell')
+
+
+class EnrichmentStage:
+    """
+    resolves the players left pending by the crawl of a season, each one once, and
+    backfills their basic info in the matches waiting for it, notifying
+    base.MATCH_LISTENERS with 'enriched' for every match rewritten
+    """
+    def __init__(self, country, league, season, workers=5):
+        self.country = country
+        self.league = league
+        self.season = season
+        self.workers = workers
+        self.pending = PendingPlayers(country, league, season)
+
+    def run(self):
+        names = sorted(self.pending.players)
+        if not names:
+            return
+        logger.info('Enriching {0} players of {1} {2}'.format(len(names), self.league, self.season))
+        if wikibatch.CLIENT is not None:
+            results = self._resolve_batched(names)
+        else:
+            pool = ThreadPool(self.workers)
+            results = pool.map(self._resolve, names)
+            pool.close()
+            pool.join()
+
+        # every match is rewritten once with all its resolved players
+        backfill = {}
+        for name, info in zip(names, results):
+            if info is None:
+                continue
+            for code, side in self.pending.players[name]['matches'].items():
+                backfill.setdefault(code, []).append((side, name, info))
+        for code, players in backfill.items():
+            self._backfill(code, players)
+        for name, info in zip(names, results):
+            if info is not None:
+                self.pending.remove(name)
+        self.pending.save()
+        logger.info('Enriched {0} matches. {1} players still pending'.format(len(backfill), len(self.pending)))
+
+    def _resolve(self, name):
+        player = self.pending.players[name]
+        try:
+            return PlayerBasicInfo(name, None, player['team'])._player_basic_info_from_wikipedia()
+        except Exception as e:
+            logger.warning("Couldn't get basic info of {0}: {1!r}".format(name, e))
+            return None
+
+    def _resolve_batched(self, names):
+        """
+        resolves every player not cached or indexed with as few api requests as
+        wikibatch.CLIENT can do them in
+        """
+        infos = {}
+        missing = []
+        for name in names:
+            player = PlayerBasicInfo(name, None, self.pending.players[name]['team'])
+            info = CACHE_PLAYERS_BASIC_INFO.get(name) or player._player_basic_info_from_index()
+            if info:
+                infos[name] = info
+            else:
+                missing.append(name)
+        client = wikibatch.CLIENT
+        requests_before = client.requests
+        try:
+            infoboxes = client.resolve([(name, self.pending.players[name]['team']) for name in missing])
+        except Exception as e:
+            logger.warning("Couldn't get basic info of {0} players: {1!r}".format(len(missing), e))
+            infoboxes = [None] * len(missing)
+        for name, infobox in zip(missing, infoboxes):
+            if not infobox:
+                continue
+            player = PlayerBasicInfo(name, None, self.pending.players[name]['team'])
+            try:
+                infos[name] = player._player_basic_info_from_infobox(infobox)
+            except Exception as e:
+                logger.warning("Couldn't get basic info of {0} from {1}: {2!r}".format(name, infobox['title'], e))
+        logger.info('Looked up {0} players in {1} wikipedia requests'.format(
+                    len(missing), client.requests - requests_before))
+        return [infos.get(name) for name in names]
+
+    def _backfill(self, code, players):
+        path = './matches/{0}/{1}/{2}/{3}.json'.format(self.country, self.league, self.season, code)
+        if not os.path.exists(path):
+            return
+        with open(path, 'r') as f:
+            match = json.load(f)
+        for side, name, info in players:
+            if name in match[side]['players']:
+                match[side]['players'][name].update(info)
+        with open(path + '.tmp', 'w') as f:
+            f.write(json.dumps(match))
+        os.replace(path + '.tmp', path)
+        notify_listeners(match, 'enriched')
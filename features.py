@@ -0,0 +1,253 @@
+import os
+import json
+import threading
+
+import numpy as np
+
+from constants import FEATURE_STATS, FEATURE_WINDOWS, FEATURE_HALFLIFE
+
+
+def feature_names(windows=FEATURE_WINDOWS):
+    names = []
+    for window in windows:
+        names.extend('{0}_last{1}'.format(stat, window) for stat in FEATURE_STATS)
+    names.extend('{0}_ewm'.format(stat) for stat in FEATURE_STATS)
+    return names
+
+
+def stats_vector(stats):
+    return np.array([np.nan if stats.get(stat) is None else stats[stat] for stat in FEATURE_STATS])
+
+
+class FeatureSeries:
+    """
+    games of a team or a player in date order. row i of features_ holds the averages
+    of the games played before game i, so the last row is the one for its next game.
+    rows live in buffers that double when full. a game is inserted at its date and
+    only the rows from it on are computed again, so adding it in date order is O(1)
+    """
+    def __init__(self, windows=FEATURE_WINDOWS, halflife=FEATURE_HALFLIFE):
+        self.windows = windows
+        self.decay = 0.5 ** (1.0 / halflife)
+        self.set([], np.empty(0, dtype='datetime64[D]'), np.empty((0, len(FEATURE_STATS))))
+
+    @property
+    def dates(self):
+        return self._dates[:len(self.codes)]
+
+    @property
+    def values(self):
+        return self._values[:len(self.codes)]
+
+    @property
+    def features_(self):
+        return self._features[:len(self.codes) + 1]
+
+    def add(self, code, date, values):
+        """
+        adds a game, replacing it if it was added already
+        """
+        date = np.datetime64(date, 'D')
+        start = len(self.codes)
+        if code in self._positions:
+            start = self._remove(self._positions[code])
+        n = len(self.codes)
+        i = int(np.searchsorted(self._dates[:n], date, 'right'))
+        self._reserve(n + 1)
+        self._dates[i + 1:n + 1] = self._dates[i:n]
+        self._values[i + 1:n + 1] = self._values[i:n]
+        self._dates[i] = date
+        self._values[i] = values
+        self.codes.insert(i, code)
+        for j in range(i, n + 1):
+            self._positions[self.codes[j]] = j
+        self._recompute(min(start, i))
+
+    def _remove(self, i):
+        """
+        takes game i out of the buffers, leaving the rows after it to be recomputed
+        """
+        n = len(self.codes)
+        self._dates[i:n - 1] = self._dates[i + 1:n]
+        self._values[i:n - 1] = self._values[i + 1:n]
+        del self._positions[self.codes.pop(i)]
+        for j in range(i, n - 1):
+            self._positions[self.codes[j]] = j
+        return i
+
+    def set(self, codes, dates, values):
+        """
+        replaces every game of the series at once
+        """
+        order = np.argsort(np.asarray(dates, dtype='datetime64[D]'), kind='stable')
+        self.codes = [codes[i] for i in order]
+        self._positions = {code: i for i, code in enumerate(self.codes)}
+        n, k = len(self.codes), len(FEATURE_STATS)
+        self._dates = np.asarray(dates, dtype='datetime64[D]')[order]
+        self._values = np.asarray(values, dtype=float).reshape(-1, k)[order]
+        # running sums, counts and exponentially weighted sums after every game
+        self._sums = np.zeros((n + 1, k))
+        self._counts = np.zeros((n + 1, k))
+        self._ewm_num = np.zeros((n + 1, k))
+        self._ewm_den = np.zeros((n + 1, k))
+        self._features = np.full((n + 1, k * (len(self.windows) + 1)), np.nan)
+        self._recompute(0)
+
+    def _reserve(self, n):
+        """
+        makes room for n games, doubling the buffers when they're full
+        """
+        capacity = len(self._dates)
+        if n <= capacity:
+            return
+        capacity = max(n, 2 * capacity, 8)
+        self._dates = self._resized(self._dates, capacity)
+        self._values = self._resized(self._values, capacity)
+        for name in ['_sums', '_counts', '_ewm_num', '_ewm_den', '_features']:
+            setattr(self, name, self._resized(getattr(self, name), capacity + 1))
+
+    @staticmethod
+    def _resized(array, rows):
+        resized = np.empty((rows,) + array.shape[1:], dtype=array.dtype)
+        resized[:len(array)] = array
+        return resized
+
+    def _recompute(self, start):
+        """
+        computes the running sums and features after every game from game start on
+        """
+        n = len(self.codes)
+        if start >= n:
+            return
+        x = self._values[start:n]
+        valid = ~np.isnan(x)
+        x0 = np.where(valid, x, 0.0)
+        self._sums[start + 1:n + 1] = self._sums[start] + np.cumsum(x0, axis=0)
+        self._counts[start + 1:n + 1] = self._counts[start] + np.cumsum(valid, axis=0)
+        num, den = self._ewm_num[start], self._ewm_den[start]
+        for j in range(len(x)):
+            num = self._ewm_num[start + j + 1] = self.decay * num + x0[j]
+            den = self._ewm_den[start + j + 1] = self.decay * den + valid[j]
+
+        idx = np.arange(start + 1, n + 1)
+        features = [self._window_means(idx, window) for window in self.windows]
+        features.append(self._ratio(self._ewm_num[idx], self._ewm_den[idx]))
+        self._features[start + 1:n + 1] = np.hstack(features)
+
+    def _window_means(self, idx, window):
+        lo = np.maximum(idx - window, 0)
+        return self._ratio(self._sums[idx] - self._sums[lo], self._counts[idx] - self._counts[lo])
+
+    @staticmethod
+    def _ratio(num, den):
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(den > 0, num / np.where(den > 0, den, 1), np.nan)
+
+    def pregame(self, date):
+        """
+        features of the entity before playing on date
+        """
+        return self._features[np.searchsorted(self.dates, np.datetime64(date, 'D'), 'left')]
+
+    def __len__(self):
+        return len(self.codes)
+
+
+class FeatureStore:
+    """
+    rolling and exponentially weighted averages of teams and players, served by
+    (name, date) before the game played that day. the games behind them are saved
+    to ./features/<country>/<league>.json
+    """
+    def __init__(self, windows=FEATURE_WINDOWS, halflife=FEATURE_HALFLIFE, country=None, league=None):
+        self.windows = windows
+        self.halflife = halflife
+        self.names = feature_names(windows)
+        self.path = './features/{0}/{1}.json'.format(country, league) if country else None
+        self.teams = {}
+        self.players = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, country, league, **kwargs):
+        """
+        the saved store of a league, built from every crawled season the first time
+        """
+        store = cls(country=country, league=league, **kwargs)
+        if not os.path.exists(store.path):
+            path = './matches/{0}/{1}'.format(country, league)
+            seasons = sorted(os.listdir(path)) if os.path.exists(path) else []
+            return cls.build(country, league, seasons, **kwargs)
+        with open(store.path, 'r') as f:
+            data = json.load(f)
+        for kind in ['teams', 'players']:
+            series = getattr(store, kind)
+            for name, games in data[kind].items():
+                values = np.array([[np.nan if value is None else value for value in row]
+                                   for row in games['values']]).reshape(-1, len(FEATURE_STATS))
+                series[name] = FeatureSeries(store.windows, store.halflife)
+                series[name].set(games['codes'], np.array(games['dates'], dtype='datetime64[D]'), values)
+        return store
+
+    def save(self):
+        with self._lock:
+            data = {kind: {name: {'codes': list(series.codes),
+                                  'dates': [str(date) for date in series.dates],
+                                  'values': [[None if value != value else value for value in row]
+                                             for row in series.values.tolist()]}
+                           for name, series in getattr(self, kind).items()}
+                    for kind in ['teams', 'players']}
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path + '.tmp', 'w') as f:
+            f.write(json.dumps(data))
+        os.replace(self.path + '.tmp', self.path)
+
+    @classmethod
+    def build(cls, country, league, seasons, **kwargs):
+        """
+        builds the store from every crawled match of given seasons
+        """
+        store = cls(country=country, league=league, **kwargs)
+        rows = {'teams': {}, 'players': {}}
+        for season in seasons:
+            path = './matches/{0}/{1}/{2}'.format(country, league, season)
+            for filename in sorted(os.listdir(path)):
+                if filename.endswith('.json'):
+                    with open(os.path.join(path, filename), 'r') as f:
+                        match = json.load(f)
+                    for kind, name, values in store._match_rows(match):
+                        rows[kind].setdefault(name, []).append((match['code'], match['date'], values))
+        for kind, entities in rows.items():
+            series = getattr(store, kind)
+            for name, games in entities.items():
+                codes, dates, values = zip(*games)
+                series[name] = FeatureSeries(store.windows, store.halflife)
+                series[name].set(list(codes), np.array(dates, dtype='datetime64[D]'), np.array(values))
+        return store
+
+    def _match_rows(self, match):
+        for team in ['home', 'away']:
+            yield 'teams', match[team]['name'], stats_vector(match[team]['totals'])
+            for name, stats in match[team]['players'].items():
+                if stats.get('MP'):
+                    yield 'players', name, stats_vector(stats)
+
+    def apply(self, match, event='crawled'):
+        """
+        adds a newly crawled or revised match. meant to be registered in base.MATCH_LISTENERS
+        """
+        with self._lock:
+            for kind, name, values in self._match_rows(match):
+                series = getattr(self, kind)
+                if name not in series:
+                    series[name] = FeatureSeries(self.windows, self.halflife)
+                series[name].add(match['code'], match['date'], values)
+
+    def team(self, name, date):
+        return self.teams[name].pregame(date)
+
+    def player(self, name, date):
+        return self.players[name].pregame(date)
+
+    def as_dict(self, vector):
+        return dict(zip(self.names, vector.tolist()))
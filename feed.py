@@ -0,0 +1,207 @@
+import os
+import json
+import time
+import socket
+import threading
+import socketserver
+from queue import Queue
+from argparse import ArgumentParser
+
+from aggregates import country_key
+
+
+def _recover(path):
+    """
+    drops a line left half written by a crash at the end of a feed and returns the
+    seq of the last entry, or 0
+    """
+    with open(path, 'rb+') as f:
+        pos = f.seek(0, os.SEEK_END)
+        tail = b''
+        while pos > 0:
+            step = min(4096, pos)
+            pos -= step
+            f.seek(pos)
+            tail = f.read(step) + tail
+            lines = tail.split(b'\n')
+            # the last element is what follows the last newline, complete lines come before
+            if len(lines) > 2 or (pos == 0 and len(lines) > 1):
+                f.truncate(pos + len(tail) - len(lines[-1]))
+                return json.loads(lines[-2])['seq']
+        f.truncate(0)
+    return 0
+
+
+def _line_at(f, offset):
+    """
+    seq of the first line starting at or after offset, and where it starts
+    """
+    if offset > 0:
+        f.seek(offset - 1)
+        f.readline()
+    else:
+        f.seek(0)
+    start = f.tell()
+    line = f.readline()
+    if not line.endswith(b'\n'):
+        return None, start
+    return json.loads(line)['seq'], start
+
+
+def read_feed(path, since=0):
+    """
+    entries of a feed with seq greater than since. the entry to start from is found
+    with a binary search over the file, so resuming doesn't read what was consumed
+    """
+    if not os.path.exists(path):
+        return
+    with open(path, 'rb') as f:
+        lo, hi = 0, f.seek(0, os.SEEK_END)
+        # first offset whose line has seq > since
+        while lo < hi:
+            mid = (lo + hi) // 2
+            seq, start = _line_at(f, mid)
+            if seq is None or seq > since:
+                hi = mid
+            else:
+                lo = start + 1
+        _, start = _line_at(f, lo)
+        f.seek(start)
+        for line in f:
+            if not line.endswith(b'\n'):
+                break
+            entry = json.loads(line)
+            if entry['seq'] > since:
+                yield entry
+
+
+class ChangeFeed:
+    """
+    append-only log of written matches as json lines with an increasing seq. meant
+    to be registered in base.MATCH_LISTENERS, so every match crawled, revised,
+    enriched or rederived is published. with a socket path, consumers connected to
+    it get new entries pushed
+    """
+    def __init__(self, path='./changes/feed.jsonl', socket_path=None):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.seq = _recover(path) if os.path.exists(path) else 0
+        self._file = open(path, 'a')
+        self.server = FeedServer(socket_path, self) if socket_path else None
+
+    def apply(self, match, event='crawled'):
+        self.publish(match, event)
+
+    def publish(self, match, event):
+        with self._lock:
+            self.seq += 1
+            entry = {
+                'seq': self.seq,
+                'event': event,
+                'code': match['code'],
+                'country': country_key(match['country']),
+                'league': match['league'],
+                'season': match['season'],
+                'at': time.time(),
+            }
+            self._file.write(json.dumps(entry) + '\n')
+            self._file.flush()
+            if self.server:
+                self.server.push(entry)
+        return entry
+
+    def close(self):
+        if self.server:
+            self.server.close()
+        self._file.close()
+
+
+class _FeedHandler(socketserver.StreamRequestHandler):
+    """
+    a consumer sends the last seq it processed in a line and gets every entry after
+    it, then the new ones as they're published
+    """
+    def handle(self):
+        since = int(self.rfile.readline().strip() or 0)
+        queue = self.server.subscribe()
+        try:
+            for entry in read_feed(self.server.feed.path, since):
+                self._send(entry)
+                since = entry['seq']
+            while True:
+                entry = queue.get()
+                if entry is None:
+                    return
+                if entry['seq'] > since:
+                    self._send(entry)
+                    since = entry['seq']
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            self.server.unsubscribe(queue)
+
+    def _send(self, entry):
+        self.wfile.write((json.dumps(entry) + '\n').encode('utf-8'))
+        self.wfile.flush()
+
+
+class FeedServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path, feed):
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        super().__init__(socket_path, _FeedHandler)
+        self.socket_path = socket_path
+        self.feed = feed
+        self._queues = set()
+        self._lock = threading.Lock()
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    def subscribe(self):
+        # subscribed before the file is replayed, so nothing published meanwhile is missed
+        queue = Queue()
+        with self._lock:
+            self._queues.add(queue)
+        return queue
+
+    def unsubscribe(self, queue):
+        with self._lock:
+            self._queues.discard(queue)
+
+    def push(self, entry):
+        with self._lock:
+            for queue in self._queues:
+                queue.put(entry)
+
+    def close(self):
+        with self._lock:
+            for queue in self._queues:
+                queue.put(None)
+        self.shutdown()
+        self.server_close()
+        os.remove(self.socket_path)
+
+
+def follow(socket_path, since=0):
+    """
+    entries after since from a feed's socket, waiting for new ones
+    """
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.connect(socket_path)
+    sock.sendall('{0}\n'.format(since).encode('utf-8'))
+    with sock, sock.makefile('rb') as f:
+        for line in f:
+            yield json.loads(line)
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('--path', default='./changes/feed.jsonl')
+    parser.add_argument('--socket', help='follow the feed from the socket of a running crawl')
+    parser.add_argument('--since', type=int, default=0)
+    args = parser.parse_args()
+    entries = follow(args.socket, args.since) if args.socket else read_feed(args.path, args.since)
+    for entry in entries:
+        print(json.dumps(entry))
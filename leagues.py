@@ -0,0 +1,104 @@
+import re
+import json
+import logging, logging.config
+
+from nba import NbaStreamBRefMatch, NbaBRefSeason
+from ncaa import NcaaBRefSeason
+from constants import LEAGUE_SPECS
+
+with open('logging.json', 'r') as f:
+    logging.config.dictConfig(json.load(f))
+logger = logging.getLogger('stringer-bell')
+
+# compiled specs by league
+SPECS = {}
+
+
+class LeagueSpec:
+    """
+    declarative box score layout of a league from LEAGUE_SPECS, compiled once and
+    shared by every match of the league
+    """
+    def __init__(self, league, spec):
+        self.league = league
+        self.uri_base = spec['boxscore_url']
+        self.tables = [(re.compile(table['id']), table['teams'], table.get('plus_minus', False))
+                       for table in spec['tables']]
+        # every (team, whether +/- column is kept) the spec expects in a page
+        self.slots = [(team, plus_minus) for _, teams, plus_minus in self.tables for team in teams]
+        self.columns = spec.get('columns', {})
+        self.separators = frozenset(spec.get('separators', ()))
+        self._headers = {}
+
+    def slot(self, table_id, seen):
+        """
+        returns the table spec matching table_id, or None. seen counts the tables
+        already matched by every table spec, and is updated
+        """
+        for i, (pattern, teams, plus_minus) in enumerate(self.tables):
+            if table_id and pattern.search(table_id) and seen[i] < len(teams):
+                seen[i] += 1
+                return teams[seen[i] - 1], plus_minus
+        return None
+
+    def header(self, metrics):
+        """
+        renames the metrics of a header row to nba's names
+        """
+        metrics = tuple(metrics)
+        header = self._headers.get(metrics)
+        if header is None:
+            header = self._headers.setdefault(metrics, [self.columns.get(m, m) for m in metrics])
+        return list(header)
+
+    def __repr__(self):
+        return 'LeagueSpec({0})'.format(self.league)
+
+
+def get_spec(league):
+    spec = SPECS.get(league)
+    if spec is None:
+        spec = SPECS.setdefault(league, LeagueSpec(league, LEAGUE_SPECS[league]))
+    return spec
+
+
+class SpecBRefMatch(NbaStreamBRefMatch):
+    """
+    match of any league described in LEAGUE_SPECS, parsed in a single streaming
+    pass driven by the league's spec
+    """
+    def __init__(self, country, league, season, code, match_type):
+        super().__init__(country, league, season, code, match_type)
+        self.spec = get_spec(league)
+        self.uri_base = self.spec.uri_base
+        self.TABLES = self.spec.slots
+        self.SEPARATORS = self.spec.separators
+
+    def parse(self, html):
+        self.seen_ = [0] * len(self.spec.tables)
+        super().parse(html)
+
+    def on_stats_table(self, index, table_id):
+        slot = self.spec.slot(table_id, self.seen_)
+        if slot is not None:
+            self.slots_[index] = slot
+
+    def on_stats_header(self, index, metrics):
+        if index in self.slots_:
+            self.headers_[index] = self.spec.header(metrics)
+
+
+class SpecBRefSeason(NbaBRefSeason):
+
+    match_class = SpecBRefMatch
+
+
+# season crawler of every league
+LEAGUES_TO_SEASONS = {
+    'nba': NbaBRefSeason,
+    'ncaa': NcaaBRefSeason,
+    'acb': SpecBRefSeason,
+    'lnb': SpecBRefSeason,
+    'seriea': SpecBRefSeason,
+    'greek': SpecBRefSeason,
+}
@@ -0,0 +1,305 @@
+import json
+import hashlib
+import threading
+import logging, logging.config
+from argparse import ArgumentParser
+
+import numpy as np
+
+from pbp import EventStore
+from constants import PBP_EVENT_TYPES, LINEUP_STATS, LEAGUES_TO_COUNTRIES
+from utils import gen_possessions
+
+with open('logging.json', 'r') as f:
+    logging.config.dictConfig(json.load(f))
+logger = logging.getLogger('stringer-bell')
+
+EVENT = {event: i for i, event in enumerate(PBP_EVENT_TYPES)}
+COLUMNS = ['seconds', 'stints'] + LINEUP_STATS + ['opp_' + stat for stat in LINEUP_STATS]
+COLUMN = {column: i for i, column in enumerate(COLUMNS)}
+# stats counted for the team doing each event, besides points
+EVENT_STATS = {
+    EVENT['made_shot']: ['FGA', 'FG'],
+    EVENT['missed_shot']: ['FGA'],
+    EVENT['made_free_throw']: ['FTA', 'FT'],
+    EVENT['missed_free_throw']: ['FTA'],
+    EVENT['offensive_rebound']: ['ORB'],
+    EVENT['defensive_rebound']: ['DRB'],
+    EVENT['turnover']: ['TOV'],
+}
+
+
+def lineup_hash(players):
+    """
+    hash of a set of player codes, the same in every season and store
+    """
+    return hashlib.blake2b('|'.join(sorted(players)).encode(), digest_size=8).hexdigest()
+
+
+def possessions(own, opp):
+    """
+    utils.gen_possessions over arrays of lineups. rebound rates of lineups that
+    saw no rebounds are taken as 0
+    """
+    opp = dict(opp, DRB=np.where(own['ORB'] + opp['DRB'] == 0, 1, opp['DRB']))
+    own = dict(own, DRB=np.where(opp['ORB'] + own['DRB'] == 0, 1, own['DRB']))
+    return gen_possessions(own, opp)
+
+
+def rate(stats):
+    """
+    minutes, possessions and offensive, defensive and net ratings of rows of
+    lineup stats laid out as COLUMNS
+    """
+    own = {stat: stats[:, COLUMN[stat]] for stat in LINEUP_STATS}
+    opp = {stat: stats[:, COLUMN['opp_' + stat]] for stat in LINEUP_STATS}
+    poss = possessions(own, opp)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        ortg = np.where(poss > 0, 100 * own['PTS'] / poss, np.nan)
+        drtg = np.where(poss > 0, 100 * opp['PTS'] / poss, np.nan)
+    return {
+        'MP': stats[:, COLUMN['seconds']] / 60,
+        'POS': poss,
+        'ORtg': ortg,
+        'DRtg': drtg,
+        'NRtg': ortg - drtg,
+        'PTS': own['PTS'],
+        'OPP_PTS': opp['PTS'],
+    }
+
+
+def _team_of(events):
+    """
+    team of every player appearing in a game's events. the second player is a teammate
+    in substitutions and assists, an opponent in steals, blocks and fouls drawn
+    """
+    teams = {}
+    for _, _, team, event_type, player, player2, _ in events:
+        if team >= 0:
+            teams.setdefault(player, team)
+            if event_type in (EVENT['substitution'], EVENT['made_shot']):
+                teams.setdefault(player2, team)
+    teams.pop(-1, None)
+    return teams
+
+
+def _period_starters(events, teams):
+    """
+    players on court when the period starts: the ones seen in it before entering the game
+    """
+    on, entered = [[], []], [set(), set()]
+    for _, _, team, event_type, player, player2, _ in events:
+        if event_type == EVENT['substitution'] and team >= 0:
+            if player2 >= 0 and player2 not in entered[team] and player2 not in on[team]:
+                on[team].append(player2)
+            entered[team].add(player)
+            continue
+        for pl in (player, player2):
+            pl_team = teams.get(pl)
+            if pl_team is not None and pl not in entered[pl_team] and pl not in on[pl_team]:
+                on[pl_team].append(pl)
+    return [team_on[:5] for team_on in on]
+
+
+class LineupEngine:
+    """
+    five-man units of a season rebuilt from play-by-play substitutions. stats of
+    every unit are rows of a matrix indexed by lineup hash, updated game by game.
+    the contribution of every game is kept, so adding it again replaces it
+    """
+    def __init__(self):
+        self.rows = {}
+        self.hashes = []
+        self.lineups = []
+        self.by_player = {}
+        self.names = {}
+        self.stats = np.zeros((64, len(COLUMNS)))
+        self.games = {}
+        # stints as (match code, period, start, end, team, lineup hash)
+        self.stints = []
+        self._ratings = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def build(cls, store):
+        """
+        builds the lineups of every match in a pbp.EventStore
+        """
+        engine = cls()
+        for code in store.codes:
+            engine.add_game(store, code)
+        return engine
+
+    def add_game(self, store, code):
+        game = store.game(code)
+        events = list(zip(game['period'], game['clock'], game['team'], game['type'],
+                          game['player'], game['player2'], game['points']))
+        contribution, stints, teams = self._reconstruct(events)
+
+        with self._lock:
+            previous = self.games.pop(code, None)
+            if previous is not None:
+                np.subtract.at(self.stats, previous[0], previous[1])
+                self.stints = [stint for stint in self.stints if stint[0] != code]
+            rows = np.array([self._row(lineup, store) for lineup in contribution], dtype=int)
+            values = np.array(list(contribution.values())).reshape(-1, len(COLUMNS))
+            np.add.at(self.stats, rows, values)
+            self.games[code] = (rows, values, np.array([teams[lineup] for lineup in contribution], dtype=int))
+            self.stints.extend((code, period, start, end, team, lineup_hash(self._codes(lineup, store)))
+                               for period, start, end, team, lineup in stints)
+            self._ratings = None
+
+    def _reconstruct(self, events):
+        """
+        walks the events of a game keeping the players on court. returns the stats
+        of every lineup that played, by tuple of player ids, its stints and its team
+        """
+        teams = _team_of(events)
+        contribution = {}
+        lineup_teams = {}
+        stints = []
+
+        def stats(lineup, team):
+            if lineup not in contribution:
+                contribution[lineup] = np.zeros(len(COLUMNS))
+                lineup_teams[lineup] = team
+            return contribution[lineup]
+
+        def close(team, period, end):
+            lineup = tuple(sorted(on[team]))
+            if start[team] > end:
+                stats(lineup, team)[COLUMN['seconds']] += (start[team] - end) / 10.0
+                stats(lineup, team)[COLUMN['stints']] += 1
+                stints.append((period, start[team], end, team, lineup))
+            start[team] = end
+
+        for period in sorted({event[0] for event in events}):
+            period_events = [event for event in events if event[0] == period]
+            on = _period_starters(period_events, teams)
+            start = [period_events[0][1]] * 2
+            for _, clock, team, event_type, player, player2, points in period_events:
+                if team < 0:
+                    continue
+                if event_type == EVENT['substitution']:
+                    close(team, period, clock)
+                    if player2 in on[team]:
+                        on[team][on[team].index(player2)] = player
+                    elif len(on[team]) < 5:
+                        on[team].append(player)
+                    continue
+                own, opp = stats(tuple(sorted(on[team])), team), stats(tuple(sorted(on[1 - team])), 1 - team)
+                for stat in EVENT_STATS.get(event_type, ()):
+                    own[COLUMN[stat]] += 1
+                    opp[COLUMN['opp_' + stat]] += 1
+                if points:
+                    own[COLUMN['PTS']] += points
+                    opp[COLUMN['opp_PTS']] += points
+            end = period_events[-1][1]
+            close(0, period, end)
+            close(1, period, end)
+        return contribution, stints, lineup_teams
+
+    def _codes(self, lineup, store):
+        return tuple(store.players[player][0] for player in lineup)
+
+    def _row(self, lineup, store):
+        codes = self._codes(lineup, store)
+        key = lineup_hash(codes)
+        row = self.rows.get(key)
+        if row is None:
+            row = self.rows[key] = len(self.hashes)
+            self.hashes.append(key)
+            self.lineups.append(codes)
+            for player in lineup:
+                code, name = store.players[player]
+                self.names[code] = name
+                self.by_player.setdefault(code, []).append(row)
+            if row == len(self.stats):
+                self.stats = np.vstack([self.stats, np.zeros_like(self.stats)])
+        return row
+
+    def ratings(self):
+        """
+        minutes, possessions and offensive, defensive and net ratings of every lineup
+        as arrays indexed by row
+        """
+        with self._lock:
+            if self._ratings is None:
+                self._ratings = rate(self.stats[:len(self.hashes)])
+            return self._ratings
+
+    def on_off(self, player):
+        """
+        ratings of a player's team with the player on and off court, over the games
+        the player appeared in
+        """
+        stats = np.zeros((2, len(COLUMNS)))
+        with self._lock:
+            for rows, values, teams in self.games.values():
+                on = np.array([player in self.lineups[row] for row in rows], dtype=bool)
+                if not on.any():
+                    continue
+                own = teams == teams[on][0]
+                stats[0] += values[own & on].sum(axis=0)
+                stats[1] += values[own & ~on].sum(axis=0)
+        ratings = rate(stats)
+        return {side: {rating: float(values[i]) for rating, values in ratings.items()}
+                for i, side in enumerate(['on', 'off'])}
+
+    def lineup(self, key):
+        """
+        stats and ratings of a lineup, given its hash or its player codes
+        """
+        if not isinstance(key, str):
+            key = lineup_hash(key)
+        return self._describe(self.rows[key])
+
+    def top(self, n=20, by='NRtg', min_possessions=50, player=None, ascending=False):
+        """
+        best (or worst) n lineups by given rating, optionally only the ones of a player
+        """
+        ratings = self.ratings()
+        rows = np.arange(len(self.hashes))
+        if player is not None:
+            rows = np.array(self.by_player.get(player, []), dtype=int)
+        rows = rows[ratings['POS'][rows] >= min_possessions]
+        values = ratings[by][rows]
+        order = np.argsort(values if ascending else -values, kind='stable')
+        return [self._describe(row) for row in rows[order[:n]]]
+
+    def _describe(self, row):
+        ratings = self.ratings()
+        lineup = {
+            'hash': self.hashes[row],
+            'players': [self.names[code] for code in self.lineups[row]],
+            'stints': int(self.stats[row, COLUMN['stints']]),
+        }
+        lineup.update({rating: float(values[row]) for rating, values in ratings.items()})
+        return lineup
+
+    def __len__(self):
+        return len(self.hashes)
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('--league', default='nba')
+    parser.add_argument('--season', default='2014-2015')
+    parser.add_argument('--top', type=int, default=20)
+    parser.add_argument('--by', default='NRtg')
+    parser.add_argument('--min-possessions', type=float, default=50)
+    parser.add_argument('--player', help='code of a player whose lineups and on/off ratings are reported')
+    parser.add_argument('--output', help='json file where the lineups are written')
+    args = parser.parse_args()
+
+    engine = LineupEngine.build(EventStore.load(LEAGUES_TO_COUNTRIES[args.league], args.league, args.season))
+    report = {'lineups': engine.top(args.top, args.by, args.min_possessions, args.player)}
+    if args.player:
+        report['on_off'] = engine.on_off(args.player)
+    for lineup in report['lineups']:
+        logger.info('{0}: {1} {2:.1f} in {3:.0f} possessions'.format(
+                    ', '.join(lineup['players']), args.by, lineup[args.by], lineup['POS']))
+    logger.info('{0} lineups in {1} games'.format(len(engine), len(engine.games)))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
@@ -0,0 +1,25 @@
+from base import MATCH_LISTENERS
+from constants import LEAGUES_TO_COUNTRIES
+from aggregates import AggregateStore
+from features import FeatureStore
+from sqlite_export import SQLiteExport
+from feed import ChangeFeed
+
+
+def register_listeners(leagues, sqlite=None, feed=None, feed_socket=None):
+    """
+    registers in base.MATCH_LISTENERS the aggregates, the features of every league
+    and the sqlite export and change feed when given. returns the aggregates, the
+    features, the export and the feed, to save or close once done
+    """
+    aggregates = AggregateStore()
+    MATCH_LISTENERS.append(aggregates.apply)
+    features = {league: FeatureStore.load(LEAGUES_TO_COUNTRIES[league], league) for league in leagues}
+    MATCH_LISTENERS.append(lambda match, event: features[match['league']].apply(match, event))
+    export = SQLiteExport(sqlite) if sqlite else None
+    if export:
+        MATCH_LISTENERS.append(export.apply)
+    change_feed = ChangeFeed(feed, feed_socket) if feed else None
+    if change_feed:
+        MATCH_LISTENERS.append(change_feed.apply)
+    return aggregates, list(features.values()), export, change_feed
@@ -0,0 +1,260 @@
+import os
+import json
+import time
+import random
+import datetime
+import logging, logging.config
+from multiprocessing.dummy import Pool as ThreadPool
+from argparse import ArgumentParser
+
+import requests
+
+from constants import (USER_AGENTS, LEAGUES_TO_COUNTRIES, LIVE_MIN_INTERVAL, LIVE_MAX_INTERVAL,
+                       LIVE_SCHEDULE_INTERVAL)
+from schedule import refresh_month
+from records import page_hash
+from utils import check_response
+from retry import CrawlJob, classify_error
+from listeners import register_listeners
+from leagues import LEAGUES_TO_SEASONS
+
+with open('logging.json', 'r') as f:
+    logging.config.dictConfig(json.load(f))
+logger = logging.getLogger('stringer-bell')
+
+# callables called with the code of a live match and its changed lines every time its
+# box score changes, as in diff_lines
+LIVE_LISTENERS = []
+
+
+def match_lines(match):
+    """
+    stats of every player and team totals of a parsed match by (team, player), with
+    None as the player of the totals
+    """
+    lines = {}
+    for team in ['home', 'away']:
+        lines[(team, None)] = dict(match[team]['totals'])
+        for player, stats in match[team]['players'].items():
+            lines[(team, player)] = dict(stats)
+    return lines
+
+
+def diff_lines(old, new):
+    """
+    stats that changed from the old lines to the new ones, only for the lines that changed
+    """
+    diff = {}
+    for key, stats in new.items():
+        previous = old.get(key, {})
+        changed = {stat: value for stat, value in stats.items() if previous.get(stat) != value}
+        if changed:
+            diff[key] = changed
+    return diff
+
+
+class LiveGame:
+    """
+    polling state of a match being played
+    """
+    def __init__(self, match, min_interval):
+        self.match = match
+        self.interval = min_interval
+        self.next_poll = 0
+        self.etag = None
+        self.hash = None
+        self.lines = {}
+        self.polls = 0
+        self.changes = 0
+
+    @property
+    def code(self):
+        return self.match.code
+
+
+class LivePoller:
+    """
+    follows the matches of a day while they're played. every box score is fetched
+    again on its own interval, which doubles while the page doesn't change and goes
+    back to the minimum when it does. unchanged pages are neither downloaded again
+    (when the server answers conditional requests) nor parsed. changed stat lines are
+    sent to LIVE_LISTENERS and appended to ./live/<country>/<league>/<date>.jsonl.
+    matches are crawled as usual once the schedule shows them played, which is checked
+    as soon as a box score stops changing
+    """
+    def __init__(self, season_class, country, league, season, date=None, workers=5,
+                 min_interval=LIVE_MIN_INTERVAL, max_interval=LIVE_MAX_INTERVAL,
+                 schedule_interval=LIVE_SCHEDULE_INTERVAL):
+        self.b_ref = season_class(country, league, season)
+        self.date = date or datetime.date.today()
+        self.workers = workers
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.schedule_interval = schedule_interval
+        self.path = './live/{0}/{1}/{2}.jsonl'.format(country, league, self.date)
+        self.games = {}
+        self.finished = set()
+        self._schedule_at = 0
+        self._refreshed_at = 0
+
+    def run(self):
+        pool = ThreadPool(self.workers)
+        try:
+            self._refresh_schedule()
+            while self.games:
+                now = time.time()
+                if now >= self._schedule_at:
+                    self._refresh_schedule()
+                due = [game for game in self.games.values() if game.next_poll <= now]
+                for game, status, html, etag in pool.map(self._fetch, due):
+                    self._update(game, status, html, etag)
+                if self.games:
+                    next_poll = min([game.next_poll for game in self.games.values()] + [self._schedule_at])
+                    time.sleep(max(0, next_poll - time.time()))
+        finally:
+            pool.close()
+            self.b_ref._save_state()
+
+    def _refresh_schedule(self):
+        """
+        starts following the day's matches and finishes the ones already played. only
+        the schedule page of the day's month is fetched again
+        """
+        schedule = refresh_month(self.b_ref.league, self.b_ref.season, self.date)
+        self._refreshed_at = time.time()
+        self._schedule_at = self._refreshed_at + self.schedule_interval
+        for game in schedule.games_on(self.date):
+            code = game['code']
+            if code in self.finished:
+                continue
+            if code not in self.games:
+                match_type = 'Post-Season' if game['post_season'] else 'Season'
+                match = self.b_ref._match(code, match_type)
+                if game['played'] and match.is_crawled():
+                    self.finished.add(code)
+                    continue
+                self.games[code] = LiveGame(match, self.min_interval)
+                logger.info('Following live - {0}'.format(code))
+            if game['played']:
+                self._finish(self.games[code])
+
+    def _fetch(self, game):
+        headers = {'User-agent': random.choice(USER_AGENTS)}
+        if game.etag:
+            headers['If-None-Match'] = game.etag
+        try:
+            rv = requests.get(game.match.uri_base.format(game.code), headers=headers)
+            if rv.status_code in (304, 404):
+                # not changed, or not started yet
+                return game, rv.status_code, None, game.etag
+            check_response(rv)
+        except Exception as e:
+            logger.warning('Couldn\'t poll {0}: {1!r}'.format(game.code, e))
+            return game, None, None, game.etag
+        return game, rv.status_code, rv.text, rv.headers.get('ETag')
+
+    def _update(self, game, status, html, etag):
+        game.polls += 1
+        game.etag = etag
+        changed = False
+        if html is not None:
+            hash_ = page_hash(html)
+            if hash_ != game.hash:
+                changed = self._parse(game, html)
+                game.hash = hash_
+        if changed:
+            game.interval = self.min_interval
+        elif game.interval < self.max_interval:
+            game.interval = min(self.max_interval, game.interval * 2)
+            if game.interval == self.max_interval:
+                # a box score that stopped changing is likely final, so the schedule
+                # is checked now rather than on its own interval
+                self._schedule_at = min(self._schedule_at,
+                                        max(time.time(), self._refreshed_at + self.min_interval))
+        game.next_poll = time.time() + game.interval
+
+    def _parse(self, game, html):
+        """
+        parses a new snapshot of a match and emits its changed lines. returns whether
+        any stat changed
+        """
+        try:
+            game.match.parse(html)
+            lines = match_lines(game.match.match_)
+        except Exception as e:
+            logger.warning('Couldn\'t parse live {0}: {1!r}'.format(game.code, e))
+            return False
+        diff = diff_lines(game.lines, lines)
+        game.lines = lines
+        if not diff:
+            return False
+        game.changes += 1
+        self._emit(game.code, diff)
+        return True
+
+    def _emit(self, code, diff):
+        lines = sorted(diff.items(), key=lambda item: (item[0][0], item[0][1] or ''))
+        entry = {
+            'code': code,
+            'at': time.time(),
+            'lines': [{'team': team, 'player': player, 'stats': stats} for (team, player), stats in lines],
+        }
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(entry) + '\n')
+        for listener in LIVE_LISTENERS:
+            try:
+                listener(code, diff)
+            except Exception:
+                logger.exception('Live listener {0} failed on match {1}'.format(listener, code))
+
+    def _finish(self, game):
+        """
+        crawls a match the schedule shows as played from its final box score
+        """
+        del self.games[game.code]
+        self.finished.add(game.code)
+        match = game.match
+        try:
+            html = match.fetch()
+            match.crawl(html)
+            self.b_ref.records.set(game.code, match.hash_)
+        except Exception as e:
+            job = CrawlJob(game.code, match.type, attempts=1)
+            job.error_class, job.last_error = classify_error(e), repr(e)
+            self.b_ref.dead_letters.add(job)
+            return
+        logger.info('Final - {0} after {1} polls, {2} with changes'.format(game.code, game.polls, game.changes))
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('--league', default='nba')
+    parser.add_argument('--season', default='2014-2015')
+    parser.add_argument('--date', help='YYYY-MM-DD, today by default')
+    parser.add_argument('--workers', type=int, default=5)
+    parser.add_argument('--min-interval', type=float, default=LIVE_MIN_INTERVAL)
+    parser.add_argument('--max-interval', type=float, default=LIVE_MAX_INTERVAL)
+    parser.add_argument('--schedule-interval', type=float, default=LIVE_SCHEDULE_INTERVAL)
+    parser.add_argument('--sqlite', help='database where finished matches are upserted')
+    parser.add_argument('--feed', help='json lines file where finished matches are published')
+    parser.add_argument('--feed-socket', help='unix socket pushing the feed to consumers')
+    args = parser.parse_args()
+    date = datetime.date(*map(int, args.date.split('-'))) if args.date else None
+    country = LEAGUES_TO_COUNTRIES[args.league]
+    path = './matches/{0}/{1}/{2}'.format(country, args.league, args.season)
+    if not os.path.exists(path):
+        os.makedirs(path)
+    aggregates, features, export, change_feed = register_listeners([args.league], args.sqlite, args.feed,
+                                                                   args.feed_socket)
+    try:
+        LivePoller(LEAGUES_TO_SEASONS[args.league], country, args.league, args.season, date, args.workers,
+                   args.min_interval, args.max_interval, args.schedule_interval).run()
+    finally:
+        aggregates.save()
+        for store in features:
+            store.save()
+        if export:
+            export.close()
+        if change_feed:
+            change_feed.close()
@@ -4,22 +4,64 @@ import json
 from argparse import ArgumentParser
 
 from utils import get_seasons
-from nba import NbaBRefSeason
+from base import crawl_seasons
+from constants import LEAGUES_TO_COUNTRIES
+from leagues import LEAGUES_TO_SEASONS
+from pbp import NbaPbpSeason
+from enrichment import EnrichmentStage
+from listeners import register_listeners
+import memory
+import wikidump
+import wikibatch
 
 with open('logging.json', 'r') as f:
     logging.config.dictConfig(json.load(f))
 logger = logging.getLogger('stringer-bell')
 
 
-def main(league, seasons):
+def main(league, seasons, workers, replay_dead_letters, time_budget, pbp=False, revalidate=False,
+         memory_budget=None, enrichment_workers=5, sqlite=None, feed=None, feed_socket=None,
+         wikipedia_index=None, batch_wikipedia=False):
     seasons = get_seasons(seasons)
-    for season in seasons:
-        path = './matches/{0}/{1}/{2}'.format('united_states', 'nba', season)
-        if not os.path.exists(path):
-            os.makedirs(path)
-        logger.info('Crawling season {0}'.format(season))
-        b_ref = NbaBRefSeason('united_states', league, season)
-        b_ref.crawl_season()
+    memory.configure(int(memory_budget * 1e6) if memory_budget else None)
+    wikidump.configure(wikipedia_index)
+    wikibatch.configure(batch_wikipedia)
+    aggregates, features, export, change_feed = register_listeners([league], sqlite, feed, feed_socket)
+    country = LEAGUES_TO_COUNTRIES[league]
+    season_class = NbaPbpSeason if pbp else LEAGUES_TO_SEASONS[league]
+    try:
+        b_refs = []
+        for season in seasons:
+            path = './matches/{0}/{1}/{2}'.format(country, league, season)
+            if not os.path.exists(path):
+                os.makedirs(path)
+            b_refs.append(season_class(country, league, season))
+
+        if revalidate or replay_dead_letters:
+            for b_ref in b_refs:
+                if revalidate:
+                    logger.info('Revalidating season {0}'.format(b_ref.season))
+                    b_ref.revalidate_season(workers)
+                else:
+                    logger.info('Replaying failed matches of season {0}'.format(b_ref.season))
+                    b_ref.replay_dead_letters(workers)
+        else:
+            logger.info('Crawling seasons {0}'.format(', '.join(seasons)))
+            crawl_seasons(b_refs, workers, time_budget * len(b_refs) if time_budget else None)
+
+        for b_ref in b_refs:
+            if not pbp and enrichment_workers:
+                EnrichmentStage(country, league, b_ref.season, enrichment_workers).run()
+        aggregates.save()
+        for store in features:
+            store.save()
+        if memory.low_memory():
+            memory.report()
+    finally:
+        if export:
+            export.close()
+        if change_feed:
+            change_feed.close()
 
 
 if __name__ == '__main__':
@@ -27,5 +69,27 @@ if __name__ == '__main__':
     parser.add_argument('--league', default='nba')
     parser.add_argument('--seasons', nargs='+', default=['2014-2015'])
     parser.add_argument('--date', default='10')
+    parser.add_argument('--workers', type=int, default=5)
+    parser.add_argument('--replay-dead-letters', action='store_true')
+    parser.add_argument('--time-budget', type=float, help='seconds per season')
+    parser.add_argument('--pbp', action='store_true', help='crawl play-by-play instead of box scores')
+    parser.add_argument('--revalidate', action='store_true',
+                        help='re-fetch crawled matches and rewrite the ones that changed')
+    parser.add_argument('--memory-budget', type=float,
+                        help='MB of raw pages held at once. releases parse trees early')
+    parser.add_argument('--enrichment-workers', type=int, default=5,
+                        help='concurrency of the players enrichment stage. 0 skips it')
+    parser.add_argument('--sqlite', help='database where crawled matches are upserted')
+    parser.add_argument('--feed', help='json lines file where written matches are published')
+    parser.add_argument('--feed-socket', help='unix socket pushing the feed to consumers')
+    parser.add_argument('--wikipedia-index', help='players index built by wikidump.py, used before wikipedia')
+    parser.add_argument('--batch-wikipedia', action='store_true',
+                        help='look players up in wikipedia with batched api requests')
     args = parser.parse_args()
-    main(args.league, args.seasons)
+    if args.pbp and args.revalidate:
+        parser.error('--revalidate only applies to box scores')
+    if args.pbp and args.league != 'nba':
+        parser.error('--pbp is only available for the nba')
+    main(args.league, args.seasons, args.workers, args.replay_dead_letters, args.time_budget,
+         args.pbp, args.revalidate, args.memory_budget, args.enrichment_workers, args.sqlite,
+         args.feed, args.feed_socket, args.wikipedia_index, args.batch_wikipedia)
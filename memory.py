@@ -0,0 +1,140 @@
+import os
+import json
+import resource
+import threading
+import logging, logging.config
+from contextlib import contextmanager
+
+with open('logging.json', 'r') as f:
+    logging.config.dictConfig(json.load(f))
+logger = logging.getLogger('stringer-bell')
+
+# size assumed for a page before it's downloaded
+PAGE_ESTIMATE = 512 * 1024
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+
+# ByteBudget of the bounded memory mode, None when it's off
+BUDGET = None
+# highest rss seen at the end of every phase, in bytes
+PHASES = {}
+_PHASES_LOCK = threading.Lock()
+
+
+class ByteBudget:
+    """
+    caps the bytes of raw pages held by in-flight matches. callers wait until their
+    reservation fits, except when nothing else is reserved
+    """
+    def __init__(self, limit):
+        self.limit = limit
+        self.used = 0
+        self.largest = PAGE_ESTIMATE
+        self._cond = threading.Condition()
+
+    def acquire(self, n):
+        with self._cond:
+            while self.used and self.used + n > self.limit:
+                self._cond.wait()
+            self.used += n
+
+    def resize(self, reserved, n):
+        """
+        replaces a reservation by the actual size of the page, which is already in memory
+        """
+        with self._cond:
+            self.used += n - reserved
+            self.largest = max(self.largest, n)
+            self._cond.notify_all()
+
+    def release(self, n):
+        with self._cond:
+            self.used -= n
+            self._cond.notify_all()
+
+    @contextmanager
+    def reserve(self):
+        """
+        reserves room for a page as big as the largest seen. yields a function to
+        call with the page once downloaded
+        """
+        reserved = [self.largest]
+        self.acquire(reserved[0])
+
+        def got(page):
+            self.resize(reserved[0], len(page))
+            reserved[0] = len(page)
+        try:
+            yield got
+        finally:
+            self.release(reserved[0])
+
+
+def configure(limit):
+    """
+    turns the bounded memory mode on with a budget of limit bytes of raw pages, or
+    off when limit is None
+    """
+    global BUDGET
+    BUDGET = ByteBudget(limit) if limit else None
+    PHASES.clear()
+
+
+def low_memory():
+    return BUDGET is not None
+
+
+@contextmanager
+def reserve_page():
+    """
+    BUDGET.reserve in bounded memory mode, a no-op otherwise
+    """
+    budget = BUDGET
+    if budget is None:
+        yield lambda page: None
+    else:
+        with budget.reserve() as got:
+            yield got
+
+
+def release_tree(soup):
+    """
+    breaks a parse tree apart so it's freed right away instead of waiting for the
+    garbage collector to find its reference cycles
+    """
+    if soup is not None:
+        soup.decompose()
+
+
+def current_rss():
+    with open('/proc/self/statm', 'r') as f:
+        return int(f.read().split()[1]) * _PAGE_SIZE
+
+
+def peak_rss():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+@contextmanager
+def phase(name):
+    """
+    records the rss at the end of a crawl phase in bounded memory mode
+    """
+    try:
+        yield
+    finally:
+        if BUDGET is not None:
+            rss = current_rss()
+            with _PHASES_LOCK:
+                PHASES[name] = max(PHASES.get(name, 0), rss)
+
+
+def report():
+    """
+    logs the peak rss of every phase and of the process
+    """
+    with _PHASES_LOCK:
+        phases = sorted(PHASES.items(), key=lambda item: item[1], reverse=True)
+    for name, rss in phases:
+        logger.info('Peak RSS after {0}: {1:.1f} MB'.format(name, rss / 1e6))
+    peak = max([peak_rss()] + [rss for _, rss in phases])
+    logger.info('Peak RSS of process: {0:.1f} MB'.format(peak / 1e6))
@@ -0,0 +1,259 @@
+import os
+import sys
+import json
+from array import array
+
+from constants import STATS_SCHEMA, BIO_FIELDS
+
+STAT_INDEX = {stat: i for i, stat in enumerate(STATS_SCHEMA)}
+BIO_INDEX = {field: i for i, field in enumerate(BIO_FIELDS)}
+MATCH_FIELDS = ['code', 'type', 'league', 'season', 'country', 'date', 'time', 'stadium']
+
+_NAN = float('nan')
+_EMPTY_STATS = array('d', [_NAN] * len(STATS_SCHEMA))
+_MISSING = object()
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def _share(values, shared):
+    """
+    the tuple equal to values already in shared, so bios of the same player and key
+    orders of dicts written the same way are stored once. shared lives as long as the
+    matches loaded with it, like the ones of a season in load_season
+    """
+    values = tuple(values)
+    return shared.setdefault(values, values)
+
+
+def _order(d, shared):
+    return _share((_intern(key) for key in d), shared)
+
+
+def _ordered(d, order):
+    """
+    d with its keys in the order they were read in
+    """
+    ordered = {key: d[key] for key in order if key in d}
+    if len(ordered) < len(d):
+        ordered.update(d)
+    return ordered
+
+
+def _pack_stats(d):
+    """
+    splits a stats dict into an array following STATS_SCHEMA, a bitmask of the stats
+    present in it and a dict with the entries that don't fit the schema.
+    None is stored as NaN
+    """
+    stats = array('d', _EMPTY_STATS)
+    mask = 0
+    rest = {}
+    for key, value in d.items():
+        i = STAT_INDEX.get(key)
+        # NaN stands for None, so a NaN read from the json is kept as is
+        if i is None or not (value is None or (type(value) is float and value == value)):
+            rest[key] = value
+            continue
+        mask |= 1 << i
+        if value is not None:
+            stats[i] = value
+    return stats, mask, rest
+
+
+def _unpack_stats(stats, mask, d):
+    for i, stat in enumerate(STATS_SCHEMA):
+        if mask >> i & 1:
+            value = stats[i]
+            d[stat] = None if value != value else value
+    return d
+
+
+def _get_stat(stats, mask, stat):
+    i = STAT_INDEX[stat]
+    if not mask >> i & 1:
+        raise KeyError(stat)
+    value = stats[i]
+    return None if value != value else value
+
+
+def _pack_bio(d, shared):
+    """
+    turns identity fields into a shared tuple following BIO_FIELDS. returns it together
+    with the entries that are neither stats nor identity fields
+    """
+    bio = [_MISSING] * len(BIO_FIELDS)
+    rest = {}
+    for key, value in d.items():
+        i = BIO_INDEX.get(key)
+        if i is None or isinstance(value, (dict, list)):
+            rest[key] = value
+        else:
+            bio[i] = _intern(value)
+    return _share(bio, shared), rest
+
+
+class PlayerLine:
+    """
+    stats of a player in a match packed in an array plus his identity info
+    """
+    __slots__ = ('name', 'stats', 'mask', 'bio', 'extra', 'order')
+
+    def __init__(self, name, stats, mask, bio, extra=None, order=()):
+        self.name = name
+        self.stats = stats
+        self.mask = mask
+        self.bio = bio
+        self.extra = extra
+        self.order = order
+
+    def __getitem__(self, stat):
+        return _get_stat(self.stats, self.mask, stat)
+
+    def get(self, stat, default=None):
+        try:
+            return self[stat]
+        except KeyError:
+            return default
+
+    @property
+    def info(self):
+        return {field: value for field, value in zip(BIO_FIELDS, self.bio)
+                if value is not _MISSING}
+
+    @classmethod
+    def from_json(cls, name, d, shared=None):
+        shared = {} if shared is None else shared
+        stats, mask, rest = _pack_stats(d)
+        bio, rest = _pack_bio(rest, shared)
+        return cls(_intern(name), stats, mask, bio, rest or None, _order(d, shared))
+
+    def to_json(self):
+        d = _unpack_stats(self.stats, self.mask, {})
+        d.update(self.info)
+        if self.extra:
+            d.update(self.extra)
+        return _ordered(d, self.order)
+
+    def __repr__(self):
+        return 'PlayerLine({0})'.format(self.name)
+
+
+class TeamLine:
+    """
+    team totals packed in an array plus its players' lines
+    """
+    __slots__ = ('name', 'totals', 'mask', 'players', 'scores', 'extra', 'order', 'totals_order')
+
+    def __init__(self, name, totals, mask, players, scores, extra=None, order=(), totals_order=()):
+        self.name = name
+        self.totals = totals
+        self.mask = mask
+        self.players = players
+        self.scores = scores
+        self.extra = extra
+        self.order = order
+        self.totals_order = totals_order
+
+    def __getitem__(self, stat):
+        return _get_stat(self.totals, self.mask, stat)
+
+    def get(self, stat, default=None):
+        try:
+            return self[stat]
+        except KeyError:
+            return default
+
+    @classmethod
+    def from_json(cls, d, shared=None):
+        shared = {} if shared is None else shared
+        order = _order(d, shared)
+        d = dict(d)
+        totals_order = _order(d.get('totals', {}), shared)
+        totals, mask, rest = _pack_stats(d.pop('totals', {}))
+        players = tuple(PlayerLine.from_json(name, stats, shared)
+                        for name, stats in d.pop('players', {}).items())
+        name = _intern(d.pop('name', None))
+        scores = d.pop('scores', None)
+        if scores is not None:
+            scores = {_intern(k): _intern(v) for k, v in scores.items()}
+        if rest:
+            d['_totals'] = rest
+        return cls(name, totals, mask, players, scores, d or None, order, totals_order)
+
+    def to_json(self):
+        d = {
+            'players': {pl.name: pl.to_json() for pl in self.players},
+            'totals': _unpack_stats(self.totals, self.mask, {}),
+        }
+        extra = dict(self.extra) if self.extra else {}
+        d['totals'].update(extra.pop('_totals', {}))
+        d['totals'] = _ordered(d['totals'], self.totals_order)
+        if self.name is not None:
+            d['name'] = self.name
+        if self.scores is not None:
+            d['scores'] = dict(self.scores)
+        d.update(extra)
+        return _ordered(d, self.order)
+
+    def __repr__(self):
+        return 'TeamLine({0})'.format(self.name)
+
+
+class Match:
+    """
+    compact in-memory representation of a match json as written by BRefMatch
+    """
+    __slots__ = ['home', 'away', 'extra', 'order'] + MATCH_FIELDS
+
+    def __init__(self, home, away, extra=None, order=(), **info):
+        self.home = home
+        self.away = away
+        self.extra = extra
+        self.order = order
+        for field in MATCH_FIELDS:
+            setattr(self, field, _intern(info.get(field, _MISSING)))
+
+    @classmethod
+    def from_json(cls, d, shared=None):
+        """
+        compact match from its json. matches loaded with the same shared dict share
+        their bios and key orders
+        """
+        shared = {} if shared is None else shared
+        order = _order(d, shared)
+        d = dict(d)
+        home = TeamLine.from_json(d.pop('home'), shared)
+        away = TeamLine.from_json(d.pop('away'), shared)
+        info = {field: d.pop(field) for field in MATCH_FIELDS if field in d}
+        return cls(home, away, d or None, order, **info)
+
+    def to_json(self):
+        d = {'home': self.home.to_json(), 'away': self.away.to_json()}
+        for field in MATCH_FIELDS:
+            value = getattr(self, field)
+            if value is not _MISSING:
+                d[field] = value
+        if self.extra:
+            d.update(self.extra)
+        return _ordered(d, self.order)
+
+    @classmethod
+    def load(cls, path, shared=None):
+        with open(path, 'r') as f:
+            return cls.from_json(json.load(f), shared)
+
+    def __repr__(self):
+        return 'Match({0})'.format(self.code)
+
+
+def load_season(country, league, season):
+    """
+    loads every crawled match of a season in its compact form
+    """
+    path = './matches/{0}/{1}/{2}'.format(country, league, season)
+    shared = {}
+    return [Match.load(os.path.join(path, filename), shared)
+            for filename in sorted(os.listdir(path)) if filename.endswith('.json')]
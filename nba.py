@@ -1,11 +1,14 @@
 import json
 import logging, logging.config
+from collections import defaultdict
 
-import requests
 from bs4 import BeautifulSoup
 from base import BRefMatch, BRefSeason
-from constants import LEAGUES_TO_PATH
-from utils import TimeoutException, convert_to_min
+from schedule import get_schedule
+from tables import compile_schema, is_separator, cell_text
+from stream import BoxScoreParser
+from memory import release_tree, low_memory
+from constants import BREF_HOST
 
 with open('logging.json', 'r') as f:
     logging.config.dictConfig(json.load(f))
@@ -14,7 +17,7 @@ logger = logging.getLogger('stringer-bell')
 
 class NbaBRefMatch(BRefMatch):
 
-    uri_base = 'http://www.basketball-reference.com/boxscores/{0}.html'
+    uri_base = BREF_HOST + '/boxscores/{0}.html'
 
     def _read_table(self, table, last_col):
         """
@@ -36,20 +39,14 @@ class NbaBRefMatch(BRefMatch):
         self.match_[team]['totals'].update(dict(zip(metrics, stats)))
 
     def parse_players(self, team, table):
-        metrics = [metric.text for metric in
-                   table.find('thead').find_all('tr')[1].find_all('th')[1:]]
-        rows = table.find('tbody').find_all('tr')
-        rows.pop(5)
-        for player in rows:
-            name = player.th.a.text
-            stats = [inf.text for inf in player.find_all('td')]
-            for metric, stat in zip(metrics, stats):
-                stat = stat if stat != '' else None
-                if metric == 'MP':
-                    stat = stat if stat not in [None, 'Did Not Play', 'Player Suspended'] else '0.0'
-                    stat = convert_to_min(stat)
-                stat = float(stat) if stat else None
-                self.match_[team]['players'][name][metric] = stat
+        schema = compile_schema(metric.text for metric in
+                                table.find('thead').find_all('tr')[1].find_all('th')[1:])
+        players = self.match_[team]['players']
+        for player in table.find('tbody').find_all('tr', recursive=False):
+            cells = [cell_text(inf) for inf in player.children if inf.name == 'td']
+            if is_separator(player, cells):
+                continue
+            players[player.th.a.text].update(schema.convert(cells))
 
     def _gen_scoring(self):
         """
@@ -68,8 +65,10 @@ class NbaBRefMatch(BRefMatch):
 
         src = str(self.soup_.find('div', {'id': 'all_line_score'}))
         src = src.replace('<!--', '')
-        scoring_table = BeautifulSoup(src).find('table', {'id': 'line_score'})
-        quarters_score = gen_scoring(scoring_table)
+        scoring_soup = BeautifulSoup(src)
+        quarters_score = gen_scoring(scoring_soup.find('table', {'id': 'line_score'}))
+        if low_memory():
+            release_tree(scoring_soup)
         for team, scores in quarters_score.items():
             self.match_[team]['scores'] = scores
 
@@ -91,48 +90,93 @@ class NbaBRefMatch(BRefMatch):
         #         self.match_['duration'] = int(hours) * 60 + int(minutes)
 
 
+class NbaStreamBRefMatch(NbaBRefMatch):
+    """
+    builds the same match dict as NbaBRefMatch from a single streaming pass over
+    the page, without building a tree. Meant for bulk re-parsing of stored pages
+    """
+    # stats tables in page order: team and wether +/- column is kept
+    TABLES = [('away', False), ('away', True), ('home', False), ('home', True)]
+    # names of tbody rows that aren't players
+    SEPARATORS = frozenset()
+
+    def parse(self, html):
+        """
+        generate match dict from the box score page, without players' basic info
+        """
+        self.match_ = defaultdict(dict)
+        for team in ['home', 'away']:
+            self.match_[team]['players'] = defaultdict(dict)
+            self.match_[team]['totals'] = defaultdict(dict)
+            self.match_[team]['name'] = None
+        self.teams_ = []
+        self.meta_ = []
+        self.slots_ = {}
+        self.headers_ = {}
+
+        parser = BoxScoreParser(self)
+        parser.feed(html)
+        parser.close()
+        if len(self.teams_) != 2 or len(self.slots_) < len(self.TABLES) \
+                or len(self.headers_) < len(self.slots_):
+            raise ValueError('Missing scorebox or stats tables')
+
+        # same steps in the same order as NbaBRefMatch, so the json is the same
+        self._gen_derived_stats()
+        self._gen_plus_minus()
+        self._gen_match_ids()
+        self._gen_date_and_stadium(self.meta_)
+
+    def on_team(self, index, name, page):
+        if index < 2:
+            self.teams_.append((name, page))
+            self.match_[['away', 'home'][index]]['name'] = name
+
+    def on_meta(self, texts):
+        self.meta_ = texts
+
+    def on_stats_table(self, index, table_id):
+        """
+        decides which team and columns a stats table holds. tables without a slot are ignored
+        """
+        if index < len(self.TABLES):
+            self.slots_[index] = self.TABLES[index]
+
+    def on_stats_header(self, index, metrics):
+        if index in self.slots_:
+            self.headers_[index] = metrics
+
+    def on_player(self, index, name, cells):
+        if index in self.slots_ and name not in self.SEPARATORS:
+            team, _ = self.slots_[index]
+            schema = compile_schema(self.headers_[index][1:])
+            self.match_[team]['players'][name].update(schema.convert(cells))
+
+    def on_totals(self, index, cells):
+        if index in self.slots_:
+            team, plus_minus = self.slots_[index]
+            metrics, stats = self.headers_[index][2:], cells[1:]
+            if not plus_minus and '+/-' in metrics:
+                stats.pop(-1)
+                metrics.pop(-1)
+            self.match_[team]['totals'].update(zip(metrics, map(float, stats)))
+
+    def on_line_score(self, rows):
+        if 'scores' in self.match_['away']:
+            return
+        quarters = rows[1][0][1:]
+        for team, (_, scoring) in zip(['away', 'home'], rows[2:4]):
+            self.match_[team]['scores'] = dict(zip(quarters, scoring[1:]))
+
+
 class NbaBRefSeason(BRefSeason):
 
-    def _crawl_match(self, code, match_type):
-        match = NbaBRefMatch(self.country, self.league, self.season, code, match_type)
-        if not match.is_crawled():
-            for j in range(5):
-                try:
-                    match.crawl()
-                    logger.info('Crawled - {0}'.format(code))
-                    break
-                except TimeoutException:
-                    logger.info("Timeout. Couldn't crawl match {0}. Retrying {1}/5".format(code, j+1))
-                    continue
-                except:
-                    logger.exception("Couldn't crawl match{0}".format(code))
-                    break
+    match_class = NbaBRefMatch
 
     def _gen_matches_codes(self):
         """
         generates b-reference codes for given league, season and date to crawl
         """
-        self.reg_s_codes_, self.post_s_codes_ = [], []
-        base_url = LEAGUES_TO_PATH['nba'].format(self.season.split('-')[1])
-        for month in ['october', 'november', 'december', 'january',
-                      'february', 'march', 'april', 'may', 'june']:
-            url = base_url.replace('.html', '-' + month + '.html')
-            self._gen_month_codes(url)
-
-    def _gen_month_codes(self, url):
-        rv = requests.get(url)
-        soup = BeautifulSoup(rv.text)
-        seasons = soup.find_all('table', {'class': 'stats_table'})
-        if len(seasons) == 2:
-            reg_season, post_season = seasons
-        else:
-            reg_season, post_season = seasons[0], None
-        for codes, table in zip([self.reg_s_codes_, self.post_s_codes_],
-                                [reg_season, post_season]):
-            if table:
-                rows = table.tbody.find_all('tr')
-                for row in rows:
-                    match = row.find('a', href=True, text='Box Score')
-                    if match:
-                        match_code = match['href'].split('/')[2].split('.')[0]
-                        codes.append(match_code)
+        schedule = get_schedule(self.league, self.season)
+        self.reg_s_codes_ = schedule.codes(post_season=False)
+        self.post_s_codes_ = schedule.codes(post_season=True)
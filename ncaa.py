@@ -0,0 +1,107 @@
+import json
+import time
+import logging, logging.config
+from collections import defaultdict
+from multiprocessing.dummy import Pool as ThreadPool
+
+import requests
+from bs4 import BeautifulSoup
+from base import BRefSeason
+from nba import NbaBRefMatch
+from constants import COLLEGES_PATHS, NCAA_URL, NCAA_SCHEDULE_PATH, NCAA_POST_SEASON
+from utils import check_response
+
+with open('logging.json', 'r') as f:
+    logging.config.dictConfig(json.load(f))
+logger = logging.getLogger('stringer-bell')
+
+
+class NcaaBRefMatch(NbaBRefMatch):
+    """
+    college box scores share nba's layout, but only have basic stats tables and
+    no +/- column
+    """
+    uri_base = NCAA_URL + '/cbb/boxscores/{0}.html'
+    team_host = NCAA_URL
+
+    def _gen_teams_stats(self):
+        """
+        generate and add statistics related to teams and players to match dict
+        """
+        for team in ['home', 'away']:
+            self.match_[team]['players'] = defaultdict(dict)
+            self.match_[team]['totals'] = defaultdict(dict)
+
+        stats_tables = self.soup_.find_all('table', {'class': 'stats_table'})
+        bas_stats_tables = [table for table in stats_tables
+                            if (table.get('id') or '').startswith('box-score-basic')] or stats_tables
+        self._read_table(bas_stats_tables[:2], last_col=False)
+
+        self._gen_derived_stats()
+        self._gen_plus_minus()
+
+
+class NcaaBRefSeason(BRefSeason):
+    """
+    ncaa has no season schedule page, so matches are discovered from every school's
+    schedule. every match shows up in both schools' schedules and is crawled once
+    """
+    match_class = NcaaBRefMatch
+
+    def __init__(self, country, league, season, date=None, discovery_workers=20):
+        super().__init__(country, league, season, date)
+        self.discovery_workers = discovery_workers
+
+    def _gen_matches_codes(self):
+        """
+        generates b-reference codes for given league, season and date to crawl
+        """
+        year = self.season.split('-')[1]
+        schools = sorted(set(COLLEGES_PATHS.values()))
+        pool = ThreadPool(self.discovery_workers)
+        schedules = pool.map(lambda school: self._school_codes(school, year), schools)
+        pool.close()
+        pool.join()
+
+        skipped = schedules.count(None)
+        if skipped:
+            logger.warning('Time budget ran out before the schedules of {0} schools'.format(skipped))
+
+        # dicts keep discovery order while removing duplicates
+        reg_season, post_season = {}, {}
+        for codes in filter(None, schedules):
+            for code, is_post_season in codes:
+                (post_season if is_post_season else reg_season)[code] = None
+        self.reg_s_codes_ = [code for code in reg_season if code not in post_season]
+        self.post_s_codes_ = list(post_season)
+        logger.info('Discovered {0} matches from {1} schools'.format(
+                    len(self.reg_s_codes_) + len(self.post_s_codes_), len(schools)))
+
+    def _school_codes(self, school, year):
+        """
+        returns codes of the matches in a school's schedule and wether they are post season,
+        or None if the season's deadline passed before getting to it
+        """
+        timeout = None
+        if self.deadline_ is not None:
+            timeout = self.deadline_ - time.time()
+            if timeout <= 0:
+                return None
+        try:
+            rv = requests.get(NCAA_SCHEDULE_PATH.format(school, year), timeout=timeout)
+            check_response(rv)
+        except Exception as e:
+            # its matches can still be found in the opponents' schedules
+            logger.warning("Couldn't get schedule of {0}: {1!r}".format(school, e))
+            return []
+        table = BeautifulSoup(rv.text).find('table', {'id': 'schedule'})
+        if table is None or table.tbody is None:
+            return []
+        codes = []
+        for row in table.tbody.find_all('tr'):
+            match = row.find('a', href=lambda href: href and href.startswith('/cbb/boxscores/'))
+            if match:
+                game_type = row.find('td', {'data-stat': 'game_type'})
+                codes.append((match['href'].split('/')[-1].split('.')[0],
+                              game_type is not None and game_type.text.strip() in NCAA_POST_SEASON))
+        return codes
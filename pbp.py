@@ -0,0 +1,335 @@
+import os
+import re
+import json
+import random
+import threading
+import logging, logging.config
+from array import array
+
+import requests
+
+from base import layout_errors
+from nba import NbaBRefSeason
+from retry import DeadLetterQueue
+from memory import reserve_page, phase
+from stream import Tokenizer
+from constants import PBP_URL, PBP_EVENT_TYPES, PBP_COLUMNS, USER_AGENTS
+from utils import timeout, check_response, ParseException
+
+with open('logging.json', 'r') as f:
+    logging.config.dictConfig(json.load(f))
+logger = logging.getLogger('stringer-bell')
+
+EVENT_TYPE = {event: i for i, event in enumerate(PBP_EVENT_TYPES)}
+# first pattern found in an event's description gives its type
+EVENT_PATTERNS = [(re.compile(pattern), EVENT_TYPE[event]) for pattern, event in [
+    (r'^Start of', 'period_start'),
+    (r'^End of', 'period_end'),
+    (r'^Jump ball', 'jump_ball'),
+    (r'makes .*free throw', 'made_free_throw'),
+    (r'misses .*free throw', 'missed_free_throw'),
+    (r'makes [23]-pt', 'made_shot'),
+    (r'misses [23]-pt', 'missed_shot'),
+    (r'^Offensive rebound', 'offensive_rebound'),
+    (r'^Defensive rebound', 'defensive_rebound'),
+    (r'^Turnover', 'turnover'),
+    (r'enters the game', 'substitution'),
+    (r'timeout', 'timeout'),
+    (r'[Ff]oul', 'foul'),
+    (r'^Violation', 'violation'),
+]]
+
+
+def classify_event(description):
+    for pattern, event_type in EVENT_PATTERNS:
+        if pattern.search(description):
+            return event_type
+    return EVENT_TYPE['other']
+
+
+def to_tenths(clock):
+    """
+    '11:47.0' to tenths of second
+    """
+    minutes, seconds = clock.split(':')
+    return int(minutes) * 600 + int(round(float(seconds) * 10))
+
+
+class PbpParser(Tokenizer):
+    """
+    single pass over a play-by-play page emitting the rows of its pbp table to a
+    sink, which must implement on_period(period) and on_event(cells). cells are
+    (text, [(player code, player name), ...]) tuples
+    """
+    def __init__(self, sink):
+        self.sink = sink
+        self._in_table = False
+        # tables nested in the pbp table
+        self._nested = 0
+        self._row = None
+        self._cell = None
+        self._link = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'table':
+            if self._in_table:
+                self._nested += 1
+            elif attrs.get('id') == 'pbp':
+                self._in_table = True
+        elif not self._in_table or self._nested:
+            return
+        elif tag == 'tr':
+            self._row = {'class': (attrs.get('class') or '').split(), 'id': attrs.get('id') or '',
+                         'td': []}
+        elif tag == 'td' and self._row is not None:
+            self._cell = ([], [])
+            self._row['td'].append(self._cell)
+        elif tag == 'a' and self._cell is not None:
+            href = attrs.get('href') or ''
+            if href.startswith('/players/'):
+                self._link = (href.rsplit('/', 1)[-1].split('.')[0], [])
+                self._cell[1].append(self._link)
+
+    def handle_endtag(self, tag):
+        if not self._in_table:
+            return
+        if tag == 'table':
+            if self._nested:
+                self._nested -= 1
+            else:
+                self._in_table = False
+        elif self._nested:
+            return
+        elif tag == 'a':
+            self._link = None
+        elif tag == 'td':
+            self._cell = self._link = None
+        elif tag == 'tr' and self._row is not None:
+            row, self._row = self._row, None
+            if re.match(r'^q\d+$', row['id']):
+                self.sink.on_period(int(row['id'][1:]))
+            elif row['td'] and 'thead' not in row['class']:
+                self.sink.on_event([(''.join(text), [(code, ''.join(name)) for code, name in links])
+                                    for text, links in row['td']])
+
+    def handle_data(self, data):
+        if self._cell is not None and not self._nested:
+            self._cell[0].append(data)
+            if self._link is not None:
+                self._link[1].append(data)
+
+    def handle_comment(self, data):
+        pass
+
+
+class PlayByPlay:
+    """
+    events of a match as typed columns following PBP_COLUMNS. player_id maps a
+    player's code and name to its id in the event store
+    """
+    def __init__(self, code, player_id):
+        self.code = code
+        self.player_id = player_id
+        self.columns = {name: array(typecode) for name, typecode in PBP_COLUMNS}
+
+    def __len__(self):
+        return len(self.columns['type'])
+
+    @timeout
+    def crawl(self):
+        headers = {'User-agent': random.choice(USER_AGENTS)}
+        with reserve_page() as got:
+            with phase('fetch'):
+                rv = requests.get(PBP_URL.format(self.code), headers=headers)
+                check_response(rv)
+            got(rv.text)
+            with phase('parse'), layout_errors(self.code):
+                self.parse(rv.text)
+        if not len(self):
+            raise ParseException('No play-by-play in {0}'.format(self.code))
+
+    def parse(self, html):
+        self.period_ = 0
+        self.starts_ = 0
+        self.score_ = (0, 0)
+        parser = PbpParser(self)
+        parser.feed(html)
+        parser.close()
+
+    def on_period(self, period):
+        self.period_ = period
+
+    def on_event(self, cells):
+        clock = cells[0][0].strip()
+        if ':' not in clock:
+            return
+        if len(cells) >= 6:
+            away, home = cells[1], cells[5]
+            team = 0 if away[0].strip() else 1
+            description, players = (away, home)[team]
+            points = (cells[2], cells[4])[team][0].strip()
+            points = int(points) if points else 0
+            score = cells[3][0].strip()
+            if '-' in score:
+                self.score_ = tuple(map(int, score.split('-')))
+        else:
+            team, points = -1, 0
+            description, players = cells[-1]
+
+        event_type = classify_event(description.strip())
+        if event_type == EVENT_TYPE['period_start']:
+            # pages without quarter anchors are split by their 'Start of' rows
+            self.starts_ += 1
+            self.period_ = max(self.period_, self.starts_)
+        ids = [self.player_id(code, name) for code, name in players[:2]] + [-1, -1]
+        for name, value in zip(['period', 'clock', 'team', 'type', 'player', 'player2', 'points',
+                                'away_score', 'home_score'],
+                               [self.period_, to_tenths(clock), team, event_type, ids[0], ids[1],
+                                points, self.score_[0], self.score_[1]]):
+            self.columns[name].append(value)
+
+
+class EventStore:
+    """
+    play-by-play of a season as one array per column with the offsets of every match,
+    stored as raw column files next to a small json index
+    """
+    def __init__(self, country, league, season):
+        self.path = './pbp/{0}/{1}/{2}'.format(country, league, season)
+        # code of every match range in the columns, None for ranges replaced since the last save
+        self._slots = []
+        self.index = {}
+        self.offsets = array('l', [0])
+        self.columns = {name: array(typecode) for name, typecode in PBP_COLUMNS}
+        # [code, name] of every player, indexed by id
+        self.players = []
+        self._player_ids = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, country, league, season):
+        store = cls(country, league, season)
+        index_path = os.path.join(store.path, 'index.json')
+        if not os.path.exists(index_path):
+            return store
+        with open(index_path, 'r') as f:
+            index = json.load(f)
+        store._slots = index['codes']
+        store.index = {code: i for i, code in enumerate(store._slots)}
+        store.offsets = array('l', index['offsets'])
+        store.players = index['players']
+        store._player_ids = {code: i for i, (code, _) in enumerate(store.players)}
+        for name, typecode in PBP_COLUMNS:
+            with open(os.path.join(store.path, name + '.bin'), 'rb') as f:
+                store.columns[name].frombytes(f.read())
+        return store
+
+    def save(self):
+        os.makedirs(self.path, exist_ok=True)
+        with self._lock:
+            self._compact()
+            for name, _ in PBP_COLUMNS:
+                self._write(name + '.bin', self.columns[name].tobytes(), 'wb')
+            index = {'codes': self._slots, 'offsets': self.offsets.tolist(), 'players': self.players}
+            self._write('index.json', json.dumps(index), 'w')
+
+    def _write(self, filename, data, mode):
+        path = os.path.join(self.path, filename)
+        with open(path + '.tmp', mode) as f:
+            f.write(data)
+        os.replace(path + '.tmp', path)
+
+    def player_id(self, code, name):
+        player_id = self._player_ids.get(code)
+        if player_id is None:
+            with self._lock:
+                player_id = self._player_ids.get(code)
+                if player_id is None:
+                    player_id = self._player_ids[code] = len(self.players)
+                    self.players.append([code, name])
+        return player_id
+
+    @property
+    def codes(self):
+        return [code for code in self._slots if code is not None]
+
+    def add(self, pbp):
+        """
+        appends the events of a match. the ones it had are left in place until the
+        next save, so replacing a match doesn't shift the whole season
+        """
+        with self._lock:
+            if pbp.code in self.index:
+                self._slots[self.index[pbp.code]] = None
+            self.index[pbp.code] = len(self._slots)
+            self._slots.append(pbp.code)
+            for name, _ in PBP_COLUMNS:
+                self.columns[name].extend(pbp.columns[name])
+            self.offsets.append(self.offsets[-1] + len(pbp))
+
+    def _compact(self):
+        """
+        drops the events of replaced matches, in one pass over the columns
+        """
+        if len(self.index) == len(self._slots):
+            return
+        columns = {name: array(typecode) for name, typecode in PBP_COLUMNS}
+        offsets = array('l', [0])
+        for i, code in enumerate(self._slots):
+            if code is None:
+                continue
+            lo, hi = self.offsets[i], self.offsets[i + 1]
+            for name, column in columns.items():
+                column.extend(self.columns[name][lo:hi])
+            offsets.append(offsets[-1] + hi - lo)
+        self.columns, self.offsets = columns, offsets
+        self._slots = [code for code in self._slots if code is not None]
+        self.index = {code: i for i, code in enumerate(self._slots)}
+
+    def __contains__(self, code):
+        return code in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def game(self, code):
+        """
+        columns of a match's events
+        """
+        i = self.index[code]
+        lo, hi = self.offsets[i], self.offsets[i + 1]
+        return {name: column[lo:hi] for name, column in self.columns.items()}
+
+    def events(self, code):
+        """
+        events of a match as dicts, with event types and player names
+        """
+        game = self.game(code)
+        names = [name for name, _ in PBP_COLUMNS]
+        for values in zip(*[game[name] for name in names]):
+            event = dict(zip(names, values))
+            event['type'] = PBP_EVENT_TYPES[event['type']]
+            for key in ['player', 'player2']:
+                event[key] = self.players[event[key]][1] if event[key] >= 0 else None
+            yield event
+
+
+class NbaPbpSeason(NbaBRefSeason):
+    """
+    crawls the play-by-play of every match of a season into its event store
+    """
+    def __init__(self, country, league, season, date=None):
+        super().__init__(country, league, season, date)
+        self.store = EventStore.load(country, league, season)
+        self.dead_letters = DeadLetterQueue(country, '{0}/pbp'.format(league), season)
+
+    def _save_state(self):
+        super()._save_state()
+        self.store.save()
+
+    def _crawl_match(self, code, match_type):
+        if code not in self.store:
+            pbp = PlayByPlay(code, self.store.player_id)
+            pbp.crawl()
+            self.store.add(pbp)
+            logger.info('Crawled play-by-play - {0}'.format(code))
@@ -0,0 +1,91 @@
+import os
+import re
+import json
+import hashlib
+import threading
+from datetime import datetime
+
+# parts of a page that change on every request without the box score changing.
+# comment markers are dropped but not their content, as the line score is commented
+VOLATILE_RE = re.compile(r'<script\b.*?</script\s*>|<style\b.*?</style\s*>|<!--|-->', re.S | re.I)
+
+
+def normalize_page(html):
+    """
+    content of a page without scripts, site chrome and whitespace differences
+    """
+    start = html.find('<div id="content"')
+    if start >= 0:
+        end = html.find('<div id="footer"', start)
+        html = html[start:end if end >= 0 else len(html)]
+    return ' '.join(VOLATILE_RE.sub('', html).split())
+
+
+def page_hash(html):
+    return hashlib.sha1(normalize_page(html).encode('utf-8')).hexdigest()
+
+
+class CrawlRecords:
+    """
+    hash of the page every match of a season was last parsed from
+    """
+    def __init__(self, country, league, season):
+        self.path = './crawl_records/{0}/{1}/{2}.json'.format(country, league, season)
+        self.records = {}
+        self._lock = threading.Lock()
+        if os.path.exists(self.path):
+            with open(self.path, 'r') as f:
+                self.records = json.load(f)
+
+    def get(self, code):
+        record = self.records.get(code)
+        return record['hash'] if record else None
+
+    def set(self, code, page_hash):
+        with self._lock:
+            self.records[code] = {'hash': page_hash, 'crawled_at': str(datetime.now())}
+
+    def save(self):
+        with self._lock:
+            data = json.dumps(self.records)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path + '.tmp', 'w') as f:
+            f.write(data)
+        os.replace(self.path + '.tmp', self.path)
+
+
+class PendingPlayers:
+    """
+    players of a season that couldn't be resolved from rosters while crawling, with
+    the matches waiting for their basic info
+    """
+    def __init__(self, country, league, season):
+        self.path = './enrichment/{0}/{1}/{2}.json'.format(country, league, season)
+        # name -> {'team': team name, 'matches': {match code: 'home' or 'away'}}
+        self.players = {}
+        self._lock = threading.Lock()
+        if os.path.exists(self.path):
+            with open(self.path, 'r') as f:
+                self.players = json.load(f)
+
+    def add(self, name, team, code, side):
+        with self._lock:
+            player = self.players.setdefault(name, {'team': team, 'matches': {}})
+            player['matches'][code] = side
+
+    def remove(self, name):
+        with self._lock:
+            self.players.pop(name, None)
+
+    def __len__(self):
+        return len(self.players)
+
+    def save(self):
+        if not self.players and not os.path.exists(self.path):
+            return
+        with self._lock:
+            data = json.dumps(self.players)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path + '.tmp', 'w') as f:
+            f.write(data)
+        os.replace(self.path + '.tmp', self.path)
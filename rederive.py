@@ -0,0 +1,83 @@
+import os
+import json
+import time
+import logging, logging.config
+from multiprocessing import Pool, cpu_count
+from argparse import ArgumentParser
+
+from base import notify_listeners
+from derived import stale_stats, derive_match
+from validate import find_seasons
+from listeners import register_listeners
+
+with open('logging.json', 'r') as f:
+    logging.config.dictConfig(json.load(f))
+logger = logging.getLogger('stringer-bell')
+
+
+def rederive_season(path):
+    """
+    recomputes the stale derived stats of the stored matches of a season from their
+    raw stats. returns the season, the number of matches and the files rewritten
+    """
+    n_matches, rewritten = 0, []
+    for filename in sorted(os.listdir(path)):
+        if not filename.endswith('.json'):
+            continue
+        filename = os.path.join(path, filename)
+        with open(filename, 'r') as f:
+            match = json.load(f)
+        n_matches += 1
+        stale = stale_stats(match.get('derived'))
+        if not stale:
+            continue
+        try:
+            derive_match(match, stale)
+        except (KeyError, TypeError):
+            logger.exception('Couldn\'t rederive {0}'.format(filename))
+            continue
+        with open(filename + '.tmp', 'w') as f:
+            json.dump(match, f)
+        os.replace(filename + '.tmp', filename)
+        rewritten.append(filename)
+    return path, n_matches, rewritten
+
+
+def rederive(paths, processes=None):
+    """
+    rederives every season in its own process. rewritten matches are published to
+    base.MATCH_LISTENERS with 'rederived' from this process
+    """
+    with Pool(processes or cpu_count()) as pool:
+        for path, n_matches, rewritten in pool.imap_unordered(rederive_season, paths):
+            logger.info('Rederived {0} of {1} matches in {2}'.format(len(rewritten), n_matches, path))
+            for filename in rewritten:
+                with open(filename, 'r') as f:
+                    notify_listeners(json.load(f), 'rederived')
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('--root', default='./matches')
+    parser.add_argument('--leagues', nargs='+')
+    parser.add_argument('--seasons', nargs='+')
+    parser.add_argument('--processes', type=int)
+    parser.add_argument('--sqlite', help='database where rederived matches are upserted')
+    parser.add_argument('--feed', help='json lines file where rederived matches are published')
+    parser.add_argument('--feed-socket', help='unix socket pushing the feed to consumers')
+    args = parser.parse_args()
+
+    start = time.time()
+    paths = find_seasons(args.root, args.leagues, args.seasons)
+    leagues = sorted({path.split(os.sep)[-2] for path in paths})
+    aggregates, features, export, change_feed = register_listeners(leagues, args.sqlite, args.feed,
+                                                                   args.feed_socket)
+    rederive(paths, args.processes)
+    aggregates.save()
+    for store in features:
+        store.save()
+    if export:
+        export.close()
+    if change_feed:
+        change_feed.close()
+    logger.info('Rederived {0} seasons in {1:.1f}s'.format(len(paths), time.time() - start))
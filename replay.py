@@ -0,0 +1,246 @@
+import os
+import re
+import json
+import time
+import random
+import hashlib
+import threading
+import logging, logging.config
+from argparse import ArgumentParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qsl, urlencode
+
+import requests
+
+with open('logging.json', 'r') as f:
+    logging.config.dictConfig(json.load(f))
+logger = logging.getLogger('stringer-bell')
+
+# path of the wikipedia api in the stand-in server. anything else is basketball reference
+WIKIPEDIA_API_PATH = '/w/api.php'
+REDIRECT_RE = re.compile(r'^#REDIRECT\s*\[\[([^\]|#]+)', re.I)
+DISAMBIGUATION_RE = re.compile(r'\{\{\s*(disambiguation|disambig|hndis)\b', re.I)
+WIKILINK_RE = re.compile(r'\[\[([^\]|#:]+)(?:[|#][^\]]*)?\]\]')
+UPSTREAMS = {
+    'bref': 'http://www.basketball-reference.com',
+    'wikipedia': 'http://en.wikipedia.org',
+}
+
+
+class ReplayConfig:
+    """
+    behaviour of the stand-in server. latency and jitter are in seconds, error and
+    throttle rates are the share of requests answered with a 500 and a 429. faults
+    are drawn from the seed, the url and how many times it was asked for, so runs
+    with the same seed get the same faults whatever the order of the requests
+    """
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, throttle_rate=0.0, retry_after=1,
+                 rate_limit=None, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        # requests per second above which every request gets a 429
+        self.rate_limit = rate_limit
+        self.seed = seed
+
+
+class PageStore:
+    """
+    recorded pages on disk, one file per url. wikipedia api calls are keyed by a hash
+    of their parameters. missing pages are fetched from the real sites when recording.
+    a page changing over time, like the box score of a live match, can be recorded as
+    snapshots <file>.1, <file>.2... served in turn, the last one from then on.
+    api queries over titles and searches are answered from the wikitext files in
+    <root>/wiki when there is such a directory, named after the titles
+    """
+    def __init__(self, root='./replay', record=False):
+        self.root = root
+        self.record = record
+
+    def path(self, url):
+        parts = urlsplit(url)
+        path = parts.path.lstrip('/') or 'index.html'
+        if parts.query:
+            query = urlencode(sorted(parse_qsl(parts.query)))
+            path = '{0}/{1}.json'.format(path, hashlib.sha1(query.encode('utf-8')).hexdigest()[:20])
+        return os.path.join(self.root, path)
+
+    def get(self, url, n=1):
+        """
+        page of url, asked for the nth time
+        """
+        parts = urlsplit(url)
+        if parts.path == WIKIPEDIA_API_PATH and os.path.isdir(os.path.join(self.root, 'wiki')):
+            params = dict(parse_qsl(parts.query))
+            if params.get('action') == 'query' and params.get('titles'):
+                return json.dumps(self.query(params)).encode('utf-8')
+            if params.get('action') == 'query' and params.get('list') == 'search':
+                return json.dumps(self.search(params)).encode('utf-8')
+        path = self.path(url)
+        snapshot = n
+        while snapshot > 1 and not os.path.exists('{0}.{1}'.format(path, snapshot)):
+            snapshot -= 1
+        if os.path.exists('{0}.{1}'.format(path, snapshot)):
+            path = '{0}.{1}'.format(path, snapshot)
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                return f.read()
+        if not self.record:
+            return None
+        upstream = UPSTREAMS['wikipedia' if urlsplit(url).path == WIKIPEDIA_API_PATH else 'bref']
+        rv = requests.get(upstream + url)
+        if rv.status_code != 200:
+            return None
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + '.tmp', 'wb') as f:
+            f.write(rv.content)
+        os.replace(path + '.tmp', path)
+        return rv.content
+
+    def _wikitext(self, title):
+        path = os.path.join(self.root, 'wiki', title.replace('/', '%2F'))
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            return f.read()
+
+    def query(self, params):
+        """
+        answer of the mediawiki api to an action=query over titles, in formatversion 2,
+        for the revisions (content), pageprops (disambiguation) and links props
+        """
+        props = params.get('prop', '').split('|')
+        query = {'normalized': [], 'redirects': [], 'pages': []}
+        for title in params['titles'].split('|'):
+            normalized = title.replace('_', ' ').strip()
+            normalized = normalized[:1].upper() + normalized[1:]
+            if normalized != title:
+                query['normalized'].append({'from': title, 'to': normalized})
+            text = self._wikitext(normalized)
+            redirect = REDIRECT_RE.match(text) if text and params.get('redirects') else None
+            if redirect:
+                query['redirects'].append({'from': normalized, 'to': redirect.group(1).strip()})
+                normalized = redirect.group(1).strip()
+                text = self._wikitext(normalized)
+            if text is None:
+                query['pages'].append({'ns': 0, 'title': normalized, 'missing': True})
+                continue
+            page = {'pageid': int(hashlib.sha1(normalized.encode('utf-8')).hexdigest()[:8], 16),
+                    'ns': 0, 'title': normalized}
+            if 'revisions' in props:
+                content = text.split('\n==', 1)[0] if params.get('rvsection') == '0' else text
+                page['revisions'] = [{'slots': {'main': {'contentmodel': 'wikitext', 'content': content}}}]
+            if 'pageprops' in props and DISAMBIGUATION_RE.search(text):
+                page['pageprops'] = {'disambiguation': ''}
+            if 'links' in props:
+                page['links'] = [{'ns': 0, 'title': link.strip()} for link in WIKILINK_RE.findall(text)]
+            query['pages'].append(page)
+        for key in ['normalized', 'redirects']:
+            if not query[key]:
+                del query[key]
+        return {'batchcomplete': True, 'query': query}
+
+    def search(self, params):
+        """
+        answer of the mediawiki api to a list=search: the titles of the wikitext files
+        with every word searched for, ignoring case and punctuation
+        """
+        words = re.sub(r'[^\w\s]', '', params['srsearch'].lower()).split()
+        results = []
+        for filename in sorted(os.listdir(os.path.join(self.root, 'wiki'))):
+            title = filename.replace('%2F', '/')
+            text = self._wikitext(title)
+            searched = re.sub(r'[^\w\s]', '', (title + ' ' + text).lower())
+            if all(word in searched for word in words) and not REDIRECT_RE.match(text):
+                results.append({'ns': 0, 'title': title})
+        return {'batchcomplete': True, 'query': {'search': results[:int(params.get('srlimit', 10))]}}
+
+
+class ReplayServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, store, config):
+        super().__init__(address, ReplayHandler)
+        self.store = store
+        self.config = config
+        self.asked = {}
+        self.window = [int(time.time()), 0]
+        self._lock = threading.Lock()
+
+    def fault(self, url):
+        """
+        returns the status to answer with before looking the page up, if any, and how
+        many times url was asked for
+        """
+        config = self.config
+        with self._lock:
+            n = self.asked[url] = self.asked.get(url, 0) + 1
+            second = int(time.time())
+            if self.window[0] != second:
+                self.window = [second, 0]
+            self.window[1] += 1
+            over_limit = config.rate_limit and self.window[1] > config.rate_limit
+        rng = random.Random('{0}:{1}:{2}'.format(config.seed, url, n))
+        time.sleep(max(0.0, config.latency + rng.uniform(-config.jitter, config.jitter)))
+        draw = rng.random()
+        if over_limit or draw < config.throttle_rate:
+            return 429, n
+        if draw < config.throttle_rate + config.error_rate:
+            return 500, n
+        return None, n
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        status, n = self.server.fault(self.path)
+        page = self.server.store.get(self.path, n) if status is None else None
+        if status is None and page is None:
+            status = 404
+        if status is None:
+            etag = '"{0}"'.format(hashlib.sha1(page).hexdigest())
+            if self.headers.get('If-None-Match') == etag:
+                status = 304
+        if status is not None:
+            self.send_response(status)
+            if status == 429:
+                self.send_header('Retry-After', str(self.server.config.retry_after))
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        json_page = urlsplit(self.path).path == WIKIPEDIA_API_PATH
+        self.send_response(200)
+        self.send_header('ETag', etag)
+        self.send_header('Content-Type', 'application/json' if json_page else 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(page)))
+        self.end_headers()
+        self.wfile.write(page)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port, store, config):
+    server = ReplayServer(('127.0.0.1', port), store, config)
+    logger.info('Replaying {0} on port {1}'.format(store.root, port))
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--root', default='./replay')
+    parser.add_argument('--record', action='store_true', help='fetch and keep pages missing from root')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds')
+    parser.add_argument('--jitter', type=float, default=0.0, help='seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--throttle-rate', type=float, default=0.0)
+    parser.add_argument('--retry-after', type=int, default=1)
+    parser.add_argument('--rate-limit', type=int, help='requests per second')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    serve(args.port, PageStore(args.root, args.record),
+          ReplayConfig(args.latency, args.jitter, args.error_rate, args.throttle_rate, args.retry_after,
+                       args.rate_limit, args.seed))
@@ -0,0 +1,212 @@
+import os
+import json
+import heapq
+import random
+import time
+import threading
+import logging, logging.config
+from datetime import datetime
+
+import requests
+
+from constants import RETRY_POLICIES, CRAWL_PRIORITIES
+from utils import TimeoutException, TransientHTTPException, ParseException, EnrichmentException
+
+with open('logging.json', 'r') as f:
+    logging.config.dictConfig(json.load(f))
+logger = logging.getLogger('stringer-bell')
+
+
+def classify_error(exc):
+    """
+    maps an exception raised while crawling a match to one of the error classes
+    in RETRY_POLICIES
+    """
+    if isinstance(exc, (TimeoutException, TransientHTTPException,
+                        requests.ConnectionError, requests.Timeout)):
+        return 'transient'
+    if isinstance(exc, requests.HTTPError):
+        status = exc.response.status_code if exc.response is not None else None
+        if status == 429 or (status and status >= 500):
+            return 'transient'
+        return 'fatal'
+    if isinstance(exc, ParseException):
+        return 'parse'
+    if isinstance(exc, EnrichmentException):
+        return 'enrichment'
+    return 'fatal'
+
+
+def backoff_delay(error_class, attempt, retry_after=None):
+    """
+    exponential backoff with equal jitter for the given attempt (starting at 1).
+    a Retry-After sent by the server is used as a lower bound
+    """
+    policy = RETRY_POLICIES[error_class]
+    delay = min(policy['cap'], policy['base'] * 2 ** (attempt - 1))
+    delay = delay / 2 + random.uniform(0, delay / 2)
+    if retry_after:
+        delay = max(delay, retry_after)
+    return delay
+
+
+class CrawlJob:
+    """
+    a match code waiting to be crawled together with its retry history
+    """
+    def __init__(self, code, match_type, attempts=0, priority=None, deadline=None):
+        self.code = code
+        self.match_type = match_type
+        self.attempts = attempts
+        # class in CRAWL_PRIORITIES, given by the scheduler when None, and time by
+        # which the job should be done
+        self.priority = priority
+        self.deadline = deadline
+        self.last_error = None
+        self.error_class = None
+
+    def __repr__(self):
+        return 'CrawlJob({0}, {1}, {2})'.format(self.code, self.match_type, self.attempts)
+
+
+class RetryQueue:
+    """
+    holds jobs ready to be crawled, by priority and deadline, and jobs delayed by a
+    backoff. failed jobs are re-queued with a delay instead of being retried in place,
+    so no worker is held while waiting
+    """
+    def __init__(self, jobs=()):
+        self._ready = []
+        self._delayed = []
+        self._seq = 0
+        for job in jobs:
+            self.push(job)
+
+    def __len__(self):
+        return len(self._ready) + len(self._delayed)
+
+    def push(self, job, delay=0):
+        self._seq += 1
+        if delay <= 0:
+            heapq.heappush(self._ready, (self._rank(job), self._seq, job))
+        else:
+            heapq.heappush(self._delayed, (time.time() + delay, self._seq, job))
+
+    def _rank(self, job):
+        return CRAWL_PRIORITIES[job.priority or 'backfill'], job.deadline or float('inf')
+
+    def pop_ready(self, n, admit=None):
+        """
+        returns up to n jobs that can be crawled right now, most urgent first. stops at
+        the first job admit returns False for
+        """
+        now = time.time()
+        while self._delayed and self._delayed[0][0] <= now:
+            self.push(heapq.heappop(self._delayed)[2])
+        jobs = []
+        while self._ready and len(jobs) < n:
+            job = self._ready[0][2]
+            if admit is not None and not admit(job):
+                break
+            jobs.append(heapq.heappop(self._ready)[2])
+        return jobs
+
+    def drain(self):
+        """
+        removes and returns every queued job
+        """
+        jobs = [job for _, _, job in sorted(self._ready)] + [job for _, _, job in self._delayed]
+        self._ready, self._delayed = [], []
+        return jobs
+
+    def wait_time(self):
+        """
+        seconds until the next delayed job is ready. None if there is nothing delayed
+        """
+        if self._ready:
+            return 0
+        return self.next_delay()
+
+    def next_delay(self):
+        """
+        seconds until the next delayed job is ready, ignoring the ready ones
+        """
+        if self._delayed:
+            return max(0, self._delayed[0][0] - time.time())
+        return None
+
+    def fail(self, job, exc):
+        """
+        records a failed attempt. returns True if job was re-queued, False if it
+        exhausted its retries
+        """
+        job.attempts += 1
+        job.error_class = classify_error(exc)
+        job.last_error = repr(exc)
+        if job.attempts >= RETRY_POLICIES[job.error_class]['attempts']:
+            return False
+        delay = backoff_delay(job.error_class, job.attempts, getattr(exc, 'retry_after', None))
+        logger.info('{0} error crawling {1}. Retrying {2}/{3} in {4:.1f}s'.format(
+                    job.error_class, job.code, job.attempts,
+                    RETRY_POLICIES[job.error_class]['attempts'] - 1, delay))
+        self.push(job, delay)
+        return True
+
+
+class DeadLetterQueue:
+    """
+    append-only file of match codes that failed permanently, which can be replayed later
+    """
+    def __init__(self, country, league, season):
+        self.path = './dead_letters/{0}/{1}/{2}.jsonl'.format(country, league, season)
+        self._lock = threading.Lock()
+
+    def add(self, job, log=True):
+        entry = {
+            'code': job.code,
+            'type': job.match_type,
+            'error_class': job.error_class,
+            'error': job.last_error,
+            'attempts': job.attempts,
+            'failed_at': str(datetime.now()),
+        }
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path, 'a') as f:
+                f.write(json.dumps(entry) + '\n')
+        if log:
+            logger.error('Giving up on {0} after {1} attempts ({2})'.format(
+                         job.code, job.attempts, job.last_error))
+
+    def take(self):
+        """
+        moves every dead letter to a .replaying file and returns them as fresh jobs.
+        the file is only removed by finish, so a replay that crashes leaves them to be
+        taken again
+        """
+        replaying = self.path + '.replaying'
+        with self._lock:
+            if os.path.exists(self.path):
+                if os.path.exists(replaying):
+                    with open(self.path, 'r') as f, open(replaying, 'a') as g:
+                        g.write(f.read())
+                    os.remove(self.path)
+                else:
+                    os.replace(self.path, replaying)
+            if not os.path.exists(replaying):
+                return []
+            with open(replaying, 'r') as f:
+                entries = [json.loads(line) for line in f if line.strip()]
+        jobs = {}
+        for entry in entries:
+            jobs[entry['code']] = CrawlJob(entry['code'], entry['type'])
+        return list(jobs.values())
+
+    def finish(self):
+        """
+        drops the dead letters taken once their replay is over. the ones that failed
+        again were added back as new dead letters
+        """
+        with self._lock:
+            if os.path.exists(self.path + '.replaying'):
+                os.remove(self.path + '.replaying')
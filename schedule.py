@@ -0,0 +1,253 @@
+import os
+import re
+import json
+import datetime
+import logging, logging.config
+
+import requests
+from bs4 import BeautifulSoup
+
+from constants import LEAGUES_TO_PATH, LEAGUE_SPECS, BREF_HOST
+from utils import gen_date, check_response
+from singleflight import SingleFlight
+
+with open('logging.json', 'r') as f:
+    logging.config.dictConfig(json.load(f))
+logger = logging.getLogger('stringer-bell')
+
+# parsed schedules by (league, season), shared by every consumer in the process
+SCHEDULES = {}
+# one download per season at a time, without holding up the other seasons
+SCHEDULE_FLIGHTS = SingleFlight()
+
+
+class SeasonSchedule:
+    """
+    every match of a season as parallel columns, indexed by code, date and team
+    """
+    FIELDS = ['code', 'date', 'away', 'home', 'away_page', 'home_page', 'post_season', 'played']
+
+    def __init__(self, league, season, games=()):
+        self.league = league
+        self.season = season
+        self.columns = {field: [] for field in self.FIELDS}
+        self.by_code = {}
+        self.by_date = {}
+        self.by_team = {}
+        # month pages of the season, when it has them
+        self.pages = []
+        for game in games:
+            self.add(**game)
+
+    def add(self, code, date, away, home, away_page, home_page, post_season, played):
+        if code in self.by_code:
+            return
+        i = len(self)
+        for field, value in zip(self.FIELDS, [code, date, away, home, away_page, home_page,
+                                              post_season, played]):
+            self.columns[field].append(value)
+        self.by_code[code] = i
+        self.by_date.setdefault(date, []).append(i)
+        self.by_team.setdefault(away, []).append(i)
+        self.by_team.setdefault(home, []).append(i)
+
+    def __len__(self):
+        return len(self.columns['code'])
+
+    def game(self, i):
+        return {field: self.columns[field][i] for field in self.FIELDS}
+
+    def codes(self, post_season=False, played=True):
+        """
+        codes of regular season (or post season) matches, only played ones by default
+        """
+        columns = self.columns
+        return [code for code, post, done in zip(columns['code'], columns['post_season'], columns['played'])
+                if post == post_season and (done or not played)]
+
+    def games_on(self, date):
+        return [self.game(i) for i in self.by_date.get(date, [])]
+
+    def games_of(self, team):
+        return [self.game(i) for i in self.by_team.get(team, [])]
+
+    def dates(self, played=True):
+        return sorted({date for date, done in zip(self.columns['date'], self.columns['played'])
+                       if done or not played})
+
+    @property
+    def complete(self):
+        return all(self.columns['played'])
+
+    def to_json(self):
+        return [dict(self.game(i), date=str(self.columns['date'][i])) for i in range(len(self))]
+
+    @classmethod
+    def from_json(cls, league, season, games):
+        for game in games:
+            game['date'] = datetime.date(*map(int, game['date'].split('-')))
+        return cls(league, season, games)
+
+
+def get_schedule(league, season, refresh=False):
+    """
+    returns the schedule of a season, fetching and parsing it only the first time
+    it is asked for. schedules of finished seasons are also kept on disk
+    """
+    key = (league, season)
+    schedule = SCHEDULES.get(key)
+    if schedule is not None and not refresh:
+        return schedule
+    return SCHEDULE_FLIGHTS.do((league, season, refresh), lambda: _store_schedule(league, season, refresh))
+
+
+def _store_schedule(league, season, refresh):
+    schedule = None if refresh else SCHEDULES.get((league, season))
+    if schedule is None:
+        schedule = SCHEDULES[(league, season)] = _load_schedule(league, season, refresh)
+    return schedule
+
+
+def get_dates(season, info):
+    """
+    returns list of dates in which matches were played in the season
+    """
+    date_format = '%Y-%m-%d' if info == 'money_lines' else '%Y%m%d'
+    return [date.strftime(date_format) for date in get_schedule('nba', season).dates()]
+
+
+def refresh_month(league, season, date):
+    """
+    re-fetches only the schedule page with the matches of date's month, instead of
+    every page of the season, and returns the updated schedule
+    """
+    return SCHEDULE_FLIGHTS.do((league, season, date.strftime('%Y-%m')),
+                               lambda: _refresh_month(league, season, date))
+
+
+def _refresh_month(league, season, date):
+    schedule = get_schedule(league, season)
+    month = '-{0}.html'.format(date.strftime('%B').lower())
+    if not schedule.pages:
+        # leagues with a single page, or schedules read from disk that don't know their pages
+        soup = _fetch(LEAGUES_TO_PATH[league].format(season.split('-')[1]))
+        schedule.pages = _month_pages(soup)
+    pages = [page for page in schedule.pages if page.endswith(month)]
+    if pages:
+        soup = _fetch(BREF_HOST + pages[0])
+    elif schedule.pages:
+        return schedule
+
+    fetched = SeasonSchedule(league, season)
+    _parse_schedule_page(soup, fetched, LEAGUE_SPECS[league])
+    # the month's matches are replaced, or every match for leagues with a single page
+    kept = [schedule.game(i) for i, day in enumerate(schedule.columns['date'])
+            if pages and (day.year, day.month) != (date.year, date.month)]
+    refreshed = SeasonSchedule(league, season, kept + [fetched.game(i) for i in range(len(fetched))])
+    refreshed.pages = schedule.pages
+    SCHEDULES[(league, season)] = refreshed
+    _save_complete(refreshed)
+    return refreshed
+
+
+def _cache_path(league, season):
+    return './schedules/{0}/{1}.json'.format(league, season)
+
+
+def _load_schedule(league, season, refresh):
+    path = _cache_path(league, season)
+    if os.path.exists(path) and not refresh:
+        with open(path, 'r') as f:
+            return SeasonSchedule.from_json(league, season, json.load(f))
+
+    schedule = SeasonSchedule(league, season)
+    url = LEAGUES_TO_PATH[league].format(season.split('-')[1])
+    soup = _fetch(url)
+    schedule.pages = _month_pages(soup)
+    if not schedule.pages:
+        _parse_schedule_page(soup, schedule, LEAGUE_SPECS[league])
+    for month in schedule.pages:
+        _parse_schedule_page(_fetch(BREF_HOST + month),
+                             schedule, LEAGUE_SPECS[league])
+    logger.info('Schedule of {0} {1}: {2} matches'.format(league, season, len(schedule)))
+    _save_complete(schedule)
+    return schedule
+
+
+def _month_pages(soup):
+    return list(dict.fromkeys(a['href'] for a in soup.find_all('a', href=re.compile(r'_games-[a-z]+\.html$'))))
+
+
+def _save_complete(schedule):
+    """
+    keeps on disk the schedules of finished seasons
+    """
+    if len(schedule) and schedule.complete:
+        path = _cache_path(schedule.league, schedule.season)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(json.dumps(schedule.to_json()))
+
+
+def _fetch(url):
+    rv = requests.get(url)
+    check_response(rv)
+    return BeautifulSoup(rv.text)
+
+
+def _parse_schedule_page(soup, schedule, spec):
+    """
+    adds the matches of a schedule page. playoffs come either in a second table or
+    after a 'Playoffs' separator row
+    """
+    tables = soup.find_all('table', {'class': 'stats_table'})
+    for post_season, table in enumerate(tables[:2]):
+        if not table.tbody:
+            continue
+        for row in table.tbody.find_all('tr'):
+            if 'thead' in (row.get('class') or []):
+                if 'Playoffs' in row.text:
+                    post_season = True
+                continue
+            game = _parse_row(row, bool(post_season), spec)
+            if game:
+                schedule.add(**game)
+
+
+def _parse_row(row, post_season, spec):
+    teams = row.find_all('a', href=re.compile(spec['team_link']))
+    if len(teams) < 2:
+        return None
+    away, home = teams[0], teams[1]
+    box_score = row.find('a', href=re.compile(spec['boxscore_link']))
+    if not box_score and not spec.get('unplayed_codes'):
+        return None
+    if box_score:
+        code = box_score['href'].split('/')[-1].split('.')[0]
+        if spec.get('code_dates'):
+            date = datetime.date(int(code[:4]), int(code[4:6]), int(code[6:8]))
+        else:
+            date = _row_date(row.find(['th', 'td']).text)
+    else:
+        date = _row_date(row.find(['th', 'td']).text)
+        code = '{0}0{1}'.format(date.strftime('%Y%m%d'), home['href'].split('/')[2])
+    return {
+        'code': code,
+        'date': date,
+        'away': away.text,
+        'home': home.text,
+        'away_page': away['href'],
+        'home_page': home['href'],
+        'post_season': post_season,
+        'played': bool(box_score),
+    }
+
+
+def _row_date(text):
+    """
+    date of a schedule row, either 'Tue, Oct 28, 2014' or '2014-10-28'
+    """
+    text = text.strip()
+    if re.match(r'^\d{4}-\d{2}-\d{2}$', text):
+        return datetime.date(*map(int, text.split('-')))
+    return gen_date(text.split(', ', 1)[1] if text.count(',') > 1 else text)
@@ -0,0 +1,180 @@
+import re
+import json
+import time
+import datetime
+import threading
+import logging, logging.config
+from queue import Queue, Empty
+from multiprocessing.dummy import Pool as ThreadPool
+
+from constants import CRAWL_PRIORITIES, CRAWL_DEADLINES, RECENT_DAYS, RESERVED_WORKERS
+from retry import RetryQueue
+
+with open('logging.json', 'r') as f:
+    logging.config.dictConfig(json.load(f))
+logger = logging.getLogger('stringer-bell')
+
+# dates that start match codes: 201410280SAS for nba, 2015-01-03-14-duke for ncaa
+CODE_DATE_RE = re.compile(r'^(\d{4})-?(\d{2})-?(\d{2})')
+
+
+def match_date(code):
+    match = CODE_DATE_RE.match(code)
+    if not match:
+        return None
+    try:
+        return datetime.date(*map(int, match.groups()))
+    except ValueError:
+        return None
+
+
+def job_priority(code, match_type, today=None):
+    """
+    priority class of a match: live when played today, recent when played in the last
+    days, then post season and the rest as backfill
+    """
+    today = today or datetime.date.today()
+    date = match_date(code)
+    if date == today:
+        return 'live'
+    if date and 0 < (today - date).days <= RECENT_DAYS:
+        return 'recent'
+    if match_type == 'Post-Season':
+        return 'post-season'
+    return 'backfill'
+
+
+class DeadlineMetrics:
+    """
+    jobs done on time, done late and failed by priority class
+    """
+    def __init__(self):
+        # failed_deadline are the failed jobs that had a deadline, also counted in failed
+        self.counts = {priority: {'on_time': 0, 'late': 0, 'failed': 0, 'failed_deadline': 0, 'no_deadline': 0}
+                       for priority in CRAWL_PRIORITIES}
+        self._lock = threading.Lock()
+
+    def done(self, job):
+        if job.deadline is None:
+            outcome = 'no_deadline'
+        else:
+            outcome = 'on_time' if time.time() <= job.deadline else 'late'
+        with self._lock:
+            self.counts[job.priority][outcome] += 1
+
+    def failed(self, job):
+        with self._lock:
+            self.counts[job.priority]['failed'] += 1
+            self.counts[job.priority]['failed_deadline'] += job.deadline is not None
+
+    def hit_rate(self, priority=None):
+        """
+        share of the jobs with a deadline done by it, None if there were none
+        """
+        counts = [self.counts[priority]] if priority else self.counts.values()
+        on_time = sum(c['on_time'] for c in counts)
+        total = sum(c['on_time'] + c['late'] + c['failed_deadline'] for c in counts)
+        return on_time / total if total else None
+
+    def report(self):
+        for priority in sorted(CRAWL_PRIORITIES, key=CRAWL_PRIORITIES.get):
+            counts = self.counts[priority]
+            if not any(counts.values()):
+                continue
+            hit_rate = self.hit_rate(priority)
+            logger.info('{0}: {1} on time, {2} late, {3} failed, {4} without deadline{5}'.format(
+                        priority, counts['on_time'], counts['late'], counts['failed'], counts['no_deadline'],
+                        '. Deadline hit rate {0:.1%}'.format(hit_rate) if hit_rate is not None else ''))
+
+
+class CrawlScheduler:
+    """
+    runs the crawl jobs of one or more seasons on a pool of workers, most urgent first.
+    workers are never interrupted, so low priority work is preempted between jobs: it
+    only starts when nothing more urgent is ready, and never takes the reserved workers.
+    jobs can be added from other threads while it runs
+    """
+    def __init__(self, workers=5, reserved=RESERVED_WORKERS):
+        self.workers = workers
+        # backfill keeps at least one worker
+        self.reserved = max(0, min(reserved, workers - 1))
+        self.queue = RetryQueue()
+        self.metrics = DeadlineMetrics()
+        self._results = Queue()
+        self._lock = threading.Lock()
+        self._backfill = 0
+
+    def add(self, season, jobs, crawl=None):
+        """
+        queues jobs of season, crawled with crawl (its _crawl_match by default)
+        """
+        now = time.time()
+        with self._lock:
+            for job in jobs:
+                job.season, job.crawl = season, crawl or season._crawl_match
+                job.priority = job.priority or job_priority(job.code, job.match_type)
+                if job.deadline is None and CRAWL_DEADLINES[job.priority]:
+                    job.deadline = now + CRAWL_DEADLINES[job.priority]
+                self.queue.push(job)
+        # wakes run up
+        self._results.put(None)
+
+    def _admit(self, job):
+        return job.priority != 'backfill' or self._backfill < self.workers - self.reserved
+
+    def run(self, deadline=None):
+        """
+        crawls until every job is done or failed permanently. failed jobs go back to
+        the queue with a backoff and are sent to their season's dead letters once they
+        exhaust their attempts. when deadline comes, jobs not started are sent to dead letters
+        """
+        pool = ThreadPool(self.workers)
+        in_flight = 0
+        while True:
+            with self._lock:
+                if not self.queue and not in_flight:
+                    break
+                if deadline and time.time() > deadline and self.queue:
+                    self._expire()
+                    continue
+                for job in self.queue.pop_ready(self.workers - in_flight, self._admit):
+                    self._backfill += job.priority == 'backfill'
+                    pool.apply_async(self._attempt, (job,), callback=self._results.put)
+                    in_flight += 1
+                # ready jobs left wait for a worker, so wake up with a result or
+                # when the next delayed job is due
+                timeout = self.queue.next_delay()
+            if deadline and timeout is not None:
+                timeout = min(timeout, max(0, deadline - time.time()))
+            try:
+                result = self._results.get(timeout=timeout)
+            except Empty:
+                continue
+            if result is None:
+                continue
+            job, exc = result
+            in_flight -= 1
+            with self._lock:
+                self._backfill -= job.priority == 'backfill'
+                if exc is None:
+                    self.metrics.done(job)
+                elif not self.queue.fail(job, exc):
+                    self.metrics.failed(job)
+                    job.season.dead_letters.add(job)
+        pool.close()
+        pool.join()
+
+    def _expire(self):
+        pending = self.queue.drain()
+        logger.warning('Time budget exhausted. {0} matches left for replay'.format(len(pending)))
+        for job in pending:
+            job.error_class, job.last_error = 'deadline', 'time budget exhausted'
+            self.metrics.failed(job)
+            job.season.dead_letters.add(job, log=False)
+
+    def _attempt(self, job):
+        try:
+            job.crawl(job.code, job.match_type)
+        except Exception as e:
+            return job, e
+        return job, None
@@ -9,5 +9,5 @@ setup(
     author_email='frangoitia@gmail.com',
     url='https://github.com/FranGoitia/basketball_reference',
     license='LICENSE.txt',
-    install_requires=['python-levenshtein', 'bs4', 'requests', 'wikipedia'],
+    install_requires=['python-levenshtein', 'bs4', 'requests', 'wikipedia', 'numpy'],
 )
@@ -0,0 +1,200 @@
+import os
+import json
+import sqlite3
+import threading
+import logging, logging.config
+from argparse import ArgumentParser
+
+from utils import get_seasons
+from aggregates import country_key
+from constants import STATS_SCHEMA, LEAGUES_TO_COUNTRIES
+
+with open('logging.json', 'r') as f:
+    logging.config.dictConfig(json.load(f))
+logger = logging.getLogger('stringer-bell')
+
+
+def column_name(stat):
+    """
+    sql friendly name of a stat, following the names of utils' derived stats:
+    'FG%' -> 'FGP', '3PA' -> 'THRA', '+/-' -> 'PM', 'AST/TOV' -> 'AST_TOV'
+    """
+    if stat == '+/-':
+        return 'PM'
+    name = stat.replace('%', 'P').replace('/', '_')
+    if name.startswith('3P'):
+        name = 'THR' + name[2:]
+    elif name.startswith('2P'):
+        name = 'TWO' + name[2:]
+    return name
+
+
+STAT_COLUMNS = [column_name(stat) for stat in STATS_SCHEMA]
+MATCH_COLUMNS = ['code', 'country', 'league', 'season', 'type', 'date', 'time', 'stadium',
+                 'home', 'away', 'home_pts', 'away_pts']
+PLAYER_COLUMNS = ['name', 'birth_date', 'position', 'height', 'weight', 'experience']
+LINE_COLUMNS = ['code', 'season', 'date', 'side', 'team', 'opponent']
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS matches (
+    code TEXT PRIMARY KEY, country TEXT, league TEXT, season TEXT, type TEXT, date TEXT,
+    time TEXT, stadium TEXT, home TEXT, away TEXT, home_pts REAL, away_pts REAL
+);
+CREATE TABLE IF NOT EXISTS players (
+    player_id INTEGER PRIMARY KEY, name TEXT NOT NULL, birth_date TEXT NOT NULL DEFAULT '',
+    position TEXT, height REAL, weight REAL, experience INTEGER,
+    UNIQUE (name, birth_date)
+);
+CREATE TABLE IF NOT EXISTS team_lines (
+    code TEXT, season TEXT, date TEXT, side TEXT, team TEXT, opponent TEXT, {stats},
+    PRIMARY KEY (code, side)
+);
+CREATE TABLE IF NOT EXISTS player_lines (
+    code TEXT, season TEXT, date TEXT, side TEXT, team TEXT, opponent TEXT,
+    player_id INTEGER REFERENCES players, {stats},
+    PRIMARY KEY (code, player_id)
+);
+CREATE INDEX IF NOT EXISTS player_lines_player_date ON player_lines (player_id, date);
+CREATE INDEX IF NOT EXISTS team_lines_team_season ON team_lines (team, season);
+CREATE INDEX IF NOT EXISTS matches_season_date ON matches (season, date);
+""".format(stats=', '.join('{0} REAL'.format(column) for column in STAT_COLUMNS))
+
+
+def _insert(table, columns, upsert_key=None):
+    """
+    replaces rows with the same primary key, or when upsert_key is given updates
+    the columns that come with a value
+    """
+    sql = 'INTO {0} ({1}) VALUES ({2})'.format(table, ', '.join(columns), ', '.join('?' * len(columns)))
+    if upsert_key is None:
+        return 'INSERT OR REPLACE ' + sql
+    updates = ['{0} = COALESCE(excluded.{0}, {0})'.format(column) for column in columns
+               if column not in upsert_key]
+    return 'INSERT {0} ON CONFLICT ({1}) DO UPDATE SET {2}'.format(sql, ', '.join(upsert_key),
+                                                                    ', '.join(updates))
+
+
+def _stats(stats):
+    return [stats.get(stat) for stat in STATS_SCHEMA]
+
+
+class SQLiteExport:
+    """
+    normalized copy of the crawled matches in a sqlite database: matches, team and
+    player lines, and player identities keyed by name and birth date
+    """
+    def __init__(self, path='./basketball.db'):
+        self.path = path
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode = WAL')
+        self.conn.execute('PRAGMA synchronous = NORMAL')
+        self.conn.executescript(SCHEMA)
+        self.player_ids = {(name, birth_date): player_id for player_id, name, birth_date
+                           in self.conn.execute('SELECT player_id, name, birth_date FROM players')}
+        self._lock = threading.Lock()
+
+    def load_season(self, country, league, season, batch=1000):
+        """
+        bulk loads every crawled match of a season, batch matches per transaction
+        """
+        path = './matches/{0}/{1}/{2}'.format(country, league, season)
+        filenames = sorted(filename for filename in os.listdir(path) if filename.endswith('.json'))
+        for i in range(0, len(filenames), batch):
+            matches = []
+            for filename in filenames[i:i + batch]:
+                with open(os.path.join(path, filename), 'r') as f:
+                    matches.append(json.load(f))
+            self.upsert(matches)
+        logger.info('Exported {0} matches of {1} {2}'.format(len(filenames), league, season))
+
+    def upsert(self, matches):
+        """
+        inserts matches or replaces their previous rows, in a single transaction
+        """
+        players = {}
+        for match in matches:
+            for team in ['home', 'away']:
+                for name, stats in match[team]['players'].items():
+                    key = (name, stats.get('birth_date') or '')
+                    players[key] = [name, key[1]] + [stats.get(c) for c in PLAYER_COLUMNS[2:]]
+
+        with self._lock, self.conn:
+            self._reconcile(players)
+            self.conn.executemany(_insert('players', PLAYER_COLUMNS, ['name', 'birth_date']),
+                                  list(players.values()))
+            if any(key not in self.player_ids for key in players):
+                self.player_ids = {(name, birth_date): player_id for player_id, name, birth_date
+                                   in self.conn.execute('SELECT player_id, name, birth_date FROM players')}
+
+            match_rows, team_rows, player_rows = [], [], []
+            for match in matches:
+                match_rows.append(self._match_row(match))
+                for team, opp in [('home', 'away'), ('away', 'home')]:
+                    line = [match['code'], match['season'], match.get('date'), team,
+                            match[team]['name'], match[opp]['name']]
+                    team_rows.append(line + _stats(match[team]['totals']))
+                    for name, stats in match[team]['players'].items():
+                        player_id = self.player_ids[(name, stats.get('birth_date') or '')]
+                        player_rows.append(line + [player_id] + _stats(stats))
+
+            codes = [(match['code'],) for match in matches]
+            self.conn.executemany('DELETE FROM player_lines WHERE code = ?', codes)
+            self.conn.executemany(_insert('matches', MATCH_COLUMNS), match_rows)
+            self.conn.executemany(_insert('team_lines', LINE_COLUMNS + STAT_COLUMNS), team_rows)
+            self.conn.executemany(_insert('player_lines', LINE_COLUMNS + ['player_id'] + STAT_COLUMNS),
+                                  player_rows)
+            self._drop_unknown_births(players)
+
+    def _reconcile(self, players):
+        """
+        gives the birth date now known to players stored without one, so their
+        lines keep the same player_id
+        """
+        for name, birth_date in players:
+            if (birth_date and (name, '') in self.player_ids and (name, '') not in players
+                    and not any(key[0] == name and key[1] for key in self.player_ids)):
+                self.conn.execute("UPDATE players SET birth_date = ? WHERE name = ? AND birth_date = ''",
+                                  (birth_date, name))
+                self.player_ids[(name, birth_date)] = self.player_ids.pop((name, ''))
+
+    def _drop_unknown_births(self, players):
+        """
+        deletes rows of players without birth date left with no lines once their
+        matches were written with it
+        """
+        names = [(name,) for name, birth_date in players
+                 if birth_date and (name, '') in self.player_ids and (name, '') not in players]
+        if not names:
+            return
+        self.conn.executemany("DELETE FROM players WHERE name = ? AND birth_date = '' AND NOT EXISTS "
+                              "(SELECT 1 FROM player_lines WHERE player_lines.player_id = players.player_id)",
+                              names)
+        self.player_ids = {(name, birth_date): player_id for player_id, name, birth_date
+                           in self.conn.execute('SELECT player_id, name, birth_date FROM players')}
+
+    def _match_row(self, match):
+        row = [match.get(column) for column in MATCH_COLUMNS[:8]]
+        row[1] = country_key(match['country'])
+        return row + [match['home']['name'], match['away']['name'],
+                      match['home']['totals'].get('PTS'), match['away']['totals'].get('PTS')]
+
+    def apply(self, match, event='crawled'):
+        """
+        upserts a newly crawled or revised match. meant to be registered in base.MATCH_LISTENERS
+        """
+        self.upsert([match])
+
+    def close(self):
+        self.conn.close()
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('--league', default='nba')
+    parser.add_argument('--seasons', nargs='+', default=['2014-2015'])
+    parser.add_argument('--db', default='./basketball.db')
+    args = parser.parse_args()
+    export = SQLiteExport(args.db)
+    for season in get_seasons(args.seasons):
+        export.load_season(LEAGUES_TO_COUNTRIES[args.league], args.league, season)
+    export.close()
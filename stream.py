@@ -0,0 +1,320 @@
+import re
+from html import unescape
+
+VOID_TAGS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta',
+             'param', 'source', 'track', 'wbr'}
+# only these tags have their attributes read
+ATTR_TAGS = {'div', 'table', 'tr', 'a'}
+
+TOKEN_RE = re.compile(r'<!--(.*?)-->|<(script|style)\b[^>]*>.*?</\2\s*>|<(/?)([a-zA-Z][a-zA-Z0-9]*)([^>]*)>|<![^>]*>',
+                      re.S | re.I)
+# rows of a stats table, with the section tags in between so rows know where they are
+ROW_RE = re.compile(r'<(thead|tbody|tfoot)\b[^>]*>|<tr\b([^>]*)>(.*?)</tr\s*>', re.S | re.I)
+CELL_RE = re.compile(r'<(th|td)\b[^>]*>(.*?)</\1\s*>', re.S | re.I)
+LINK_TEXT_RE = re.compile(r'<a\b[^>]*>(.*?)</a\s*>', re.S | re.I)
+SKIPPED_RE = re.compile(r'<!--.*?-->|<(script|style)\b[^>]*>.*?</\1\s*>', re.S | re.I)
+INNER_TAG_RE = re.compile(r'<[^>]*>')
+ATTR_RE = re.compile(r'([^\s=/>]+)(?:\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s>]+)))?')
+
+
+def _classes(attrs):
+    return (attrs.get('class') or '').split()
+
+
+def _text(html):
+    """
+    text of a fragment, as the data the tokenizer would emit for it
+    """
+    text = INNER_TAG_RE.sub('', html) if '<' in html else html
+    return unescape(text) if '&' in text else text
+
+
+def _plain_table(html):
+    """
+    whether the lowercased inside of a table has no nested tables and every row and
+    cell closed, so its rows can be read with regexes
+    """
+    return '<table' not in html \
+        and html.count('<tr') == html.count('</tr') \
+        and html.count('<td') == html.count('</td') \
+        and html.count('<th') - html.count('<thead') == html.count('</th') - html.count('</thead')
+
+
+def _attrs(text):
+    return {m.group(1).lower(): unescape(m.group(2) or m.group(3) or m.group(4) or '')
+            for m in ATTR_RE.finditer(text)}
+
+
+class Tokenizer:
+    """
+    minimal event based tokenizer in the spirit of html.parser.HTMLParser, without
+    the per tag bookkeeping it does. scripts and styles are skipped
+    """
+    def feed(self, html):
+        self._html = html
+        pos = self._pos = 0
+        data, starttag, endtag = self._data, self.handle_starttag, self.handle_endtag
+        search = TOKEN_RE.search
+        while True:
+            m = search(html, pos)
+            if m is None:
+                break
+            start, end = m.span()
+            if start > pos:
+                data(html[pos:start])
+            pos = self._pos = end
+            comment, _, closing, tag, attrs = m.groups()
+            if tag is not None:
+                tag = tag.lower()
+                if closing:
+                    endtag(tag)
+                else:
+                    starttag(tag, _attrs(attrs) if tag in ATTR_TAGS else {})
+            elif comment is not None:
+                self.handle_comment(comment)
+            # handlers may have read ahead with raw_until
+            pos = self._pos
+        if pos < len(html):
+            data(html[pos:])
+        self._html = None
+
+    def raw_until(self, tag):
+        """
+        from a start tag handler, the raw html up to the closing tag of the element
+        just opened, which is consumed together with it. None if it isn't closed
+        """
+        m = re.compile(r'</{0}\s*>'.format(tag), re.I).search(self._html, self._pos)
+        if m is None:
+            return None
+        raw = self._html[self._pos:m.start()]
+        self._pos = m.end()
+        return raw
+
+    def _data(self, data):
+        self.handle_data(unescape(data) if '&' in data else data)
+
+    def close(self):
+        pass
+
+
+class BoxScoreParser(Tokenizer):
+    """
+    single pass over a box score page that emits the scorebox, line score and
+    stats tables rows to a sink as soon as they are read, without building a tree.
+    sink must implement on_team(index, name, page), on_meta(texts),
+    on_stats_table(table_index, table_id), on_stats_header(table_index, metrics),
+    on_player(table_index, name, cells), on_totals(table_index, cells) and
+    on_line_score(rows). on_stats_header is called for every header row, the last
+    one being the metrics row
+    """
+    def __init__(self, sink, state=None):
+        self.sink = sink
+        # commented sections are parsed by a child parser sharing this state
+        self.commented = state is not None
+        self.state = state if state is not None else {'teams': 0, 'tables': 0,
+                                                      'scorebox': False, 'meta': False}
+        # open elements as (tag, text capture, callbacks run when it's closed)
+        self._stack = []
+        self._captures = []
+        self._in_scorebox = False
+        self._in_line_score_div = 0
+        self._performer = None
+        self._meta = None
+        self._table = None
+        self._row = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag in VOID_TAGS:
+            return
+        capture, on_close = None, []
+        if self.commented:
+            if tag == 'table' and self._table is None and attrs.get('id') == 'line_score':
+                on_close.append(self._start_table('line_score'))
+        elif tag == 'div':
+            capture = self._start_div(attrs, on_close)
+        elif tag == 'table' and self._table is None:
+            if 'stats_table' in _classes(attrs):
+                on_close.append(self._start_table('stats'))
+                self.sink.on_stats_table(self._table['index'], attrs.get('id'))
+                if self._read_stats_table():
+                    return
+            elif attrs.get('id') == 'line_score':
+                on_close.append(self._start_table('line_score'))
+        elif tag == 'a' and self._performer is not None:
+            capture = []
+            self._performer[0] = (capture, attrs.get('href'))
+
+        if self._table is not None and tag != 'table':
+            cell = self._start_table_el(tag, attrs, on_close)
+            if cell is not None:
+                capture = cell
+        if capture is not None:
+            self._captures.append(capture)
+        self._stack.append((tag, capture, on_close))
+
+    def _start_div(self, attrs, on_close):
+        classes = _classes(attrs)
+        capture = None
+        if 'scorebox' in classes and not self.state['scorebox']:
+            self.state['scorebox'] = self._in_scorebox = True
+            on_close.append(lambda: setattr(self, '_in_scorebox', False))
+        elif self._in_scorebox and attrs.get('itemprop') == 'performer' and self._performer is None:
+            self._performer = [None]
+            on_close.append(self._end_performer)
+        if 'scorebox_meta' in classes and not self.state['meta']:
+            self.state['meta'] = True
+            self._meta = []
+            on_close.append(self._end_meta)
+        elif self._meta is not None:
+            capture = []
+            self._meta.append(capture)
+        if attrs.get('id') == 'all_line_score':
+            self._in_line_score_div += 1
+            on_close.append(self._end_line_score_div)
+        return capture
+
+    def _end_performer(self):
+        if self._performer[0] is not None:
+            text, page = self._performer[0]
+            self.sink.on_team(self.state['teams'], ''.join(text), page)
+            self.state['teams'] += 1
+        self._performer = None
+
+    def _end_meta(self):
+        self.sink.on_meta([''.join(text) for text in self._meta])
+        self._meta = None
+
+    def _end_line_score_div(self):
+        self._in_line_score_div -= 1
+
+    def _start_table(self, kind):
+        if kind == 'stats':
+            self._table = {'kind': kind, 'index': self.state['tables'], 'section': None,
+                           'foot': []}
+            self.state['tables'] += 1
+        else:
+            self._table = {'kind': kind, 'section': None, 'rows': []}
+        return self._end_table
+
+    def _end_table(self):
+        table = self._table
+        if table['kind'] == 'stats':
+            self.sink.on_totals(table['index'], table['foot'])
+        else:
+            self.sink.on_line_score(table['rows'])
+        self._table = None
+
+    def _read_stats_table(self):
+        """
+        reads the rows of the stats table just opened with regexes instead of going
+        tag by tag, which is where most of the time goes. emits the same events.
+        returns False, reading nothing, for tables whose markup is not plain enough
+        """
+        start = self._pos
+        raw = self.raw_until('table')
+        if raw is None:
+            return False
+        raw = SKIPPED_RE.sub('', raw)
+        if not _plain_table(raw.lower()):
+            self._pos = start
+            return False
+        table, sink = self._table, self.sink
+        for m in ROW_RE.finditer(raw):
+            section = m.group(1)
+            if section is not None:
+                table['section'] = section.lower()
+                continue
+            th, td = [], []
+            cells = CELL_RE.findall(m.group(3))
+            for kind, html in cells:
+                (th if kind in ('th', 'TH', 'Th', 'tH') else td).append(_text(html))
+            if table['section'] == 'thead':
+                sink.on_stats_header(table['index'], th)
+            elif table['section'] == 'tbody':
+                if td and 'thead' not in _classes(_attrs(m.group(2))):
+                    sink.on_player(table['index'], self._row_name(cells), td)
+            elif table['section'] == 'tfoot':
+                table['foot'].extend(td)
+        self._end_table()
+        return True
+
+    def _row_name(self, cells):
+        """
+        text of the first link in the row's first cell, if it's a header cell before any td
+        """
+        if not cells or cells[0][0].lower() != 'th':
+            return ''
+        link = LINK_TEXT_RE.search(cells[0][1])
+        return _text(link.group(1)) if link else ''
+
+    def _start_table_el(self, tag, attrs, on_close):
+        row = self._row
+        if tag in ('thead', 'tbody', 'tfoot'):
+            self._table['section'] = tag
+        elif tag == 'tr':
+            self._row = {'class': _classes(attrs), 'th': [], 'td': [], 'name': None}
+            on_close.append(self._end_row)
+        elif tag in ('th', 'td') and row is not None:
+            capture = []
+            row[tag].append(capture)
+            return capture
+        elif tag == 'a' and row is not None and row['name'] is None \
+                and len(row['th']) == 1 and not row['td']:
+            # name of the player is the first link in the first header cell
+            row['name'] = []
+            return row['name']
+
+    def _end_row(self):
+        table, row = self._table, self._row
+        self._row = None
+        th = [''.join(text) for text in row['th']]
+        td = [''.join(text) for text in row['td']]
+        if table['kind'] == 'line_score':
+            table['rows'].append((th, td))
+        elif table['section'] == 'thead':
+            self.sink.on_stats_header(table['index'], th)
+        elif table['section'] == 'tbody':
+            if td and 'thead' not in row['class']:
+                self.sink.on_player(table['index'], ''.join(row['name'] or ''), td)
+        elif table['section'] == 'tfoot':
+            table['foot'].extend(td)
+
+    def _data(self, data):
+        # text outside of what's being captured isn't even unescaped
+        if self._captures:
+            Tokenizer._data(self, data)
+
+    def handle_endtag(self, tag):
+        stack = self._stack
+        if stack and stack[-1][0] == tag:
+            _, capture, on_close = stack.pop()
+            if capture is not None:
+                self._captures.pop()
+            for callback in on_close:
+                callback()
+            return
+        if tag in VOID_TAGS:
+            return
+        for i in range(len(self._stack) - 1, -1, -1):
+            if self._stack[i][0] == tag:
+                break
+        else:
+            return
+        # close the element together with anything left open inside it
+        while len(self._stack) > i:
+            _, capture, on_close = self._stack.pop()
+            if capture is not None:
+                self._captures.pop()
+            for callback in on_close:
+                callback()
+
+    def handle_data(self, data):
+        for capture in self._captures:
+            capture.append(data)
+
+    def handle_comment(self, data):
+        # the line score is commented out in the page
+        if self._in_line_score_div and not self.commented:
+            parser = BoxScoreParser(self.sink, self.state)
+            parser.feed(data)
+            parser.close()
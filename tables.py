@@ -0,0 +1,73 @@
+from constants import DNP_STATUSES
+
+# compiled schemas by table header, shared by every match
+SCHEMAS = {}
+
+
+def to_float(text):
+    return float(text) if text else None
+
+
+def to_minutes(text):
+    """
+    minutes played as float. players that didn't play get 0.0
+    """
+    if not text or text in DNP_STATUSES:
+        return 0.0
+    if ':' in text:
+        minutes, seconds = text.split(':')
+        minutes = float(minutes) + float(seconds) / float(60)
+        return minutes if minutes else None
+    return float(text)
+
+
+CONVERTERS = {
+    'MP': to_minutes,
+}
+
+
+class TableSchema:
+    """
+    header of a stats table compiled into one converter per column, so rows are
+    converted without looking at the metric names again
+    """
+    def __init__(self, metrics, converters=None):
+        converters = converters or CONVERTERS
+        self.metrics = tuple(metrics)
+        self.converters = tuple(converters.get(metric, to_float) for metric in self.metrics)
+
+    def convert(self, cells):
+        """
+        converts the text of a row's cells into a dict of stats. rows shorter than
+        the header (players that didn't play) only get their first stats
+        """
+        return dict(zip(self.metrics, [conv(cell) for conv, cell in zip(self.converters, cells)]))
+
+    def __repr__(self):
+        return 'TableSchema({0})'.format(', '.join(self.metrics))
+
+
+def compile_schema(metrics):
+    """
+    returns the schema for given header, compiling it the first time it's seen
+    """
+    metrics = tuple(metrics)
+    schema = SCHEMAS.get(metrics)
+    if schema is None:
+        schema = SCHEMAS.setdefault(metrics, TableSchema(metrics))
+    return schema
+
+
+def cell_text(cell):
+    """
+    same as cell.text without walking the descendants of cells holding a single string
+    """
+    text = cell.string
+    return text if text is not None else cell.get_text()
+
+
+def is_separator(row, cells):
+    """
+    whether a tbody row is a repeated header (like 'Reserves') instead of a player
+    """
+    return not cells or 'thead' in (row.get('class') or [])
@@ -0,0 +1,8 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# modules are imported flat and read logging.json from the working directory
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
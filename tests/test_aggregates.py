@@ -0,0 +1,78 @@
+import json
+
+import pytest
+
+from aggregates import SeasonAggregates, AggregateStore
+
+
+def _line(pts, birth_date=None):
+    stats = {'MP': 30.0, 'PTS': pts, 'FGA': 10, 'FTA': 4, 'TOV': 2, 'ORB': 1, 'DRB': 4, 'FG': 5}
+    if birth_date:
+        stats['birth_date'] = birth_date
+    return stats
+
+
+def _match(code, date, home, away, home_players, away_players):
+    def team(name, players):
+        totals = {'MP': 240.0, 'FGA': 80, 'FTA': 20, 'TOV': 12, 'ORB': 10, 'DRB': 30, 'FG': 40,
+                  'PTS': 100 + len(players)}
+        return {'name': name, 'players': players, 'totals': totals}
+    return {'code': code, 'date': date, 'country': 'United States', 'league': 'nba', 'season': '2014-2015',
+            'home': team(home, home_players), 'away': team(away, away_players)}
+
+
+MATCHES = [
+    _match('201410280LAL', '2014-10-28', 'Los Angeles Lakers', 'Houston Rockets',
+           {'Chris Johnson': _line(10, '1985-04-15'), 'Jordan Clarkson': _line(4)}, {'Jason Terry': _line(12)}),
+    _match('201501050UTA', '2015-01-05', 'Utah Jazz', 'Boston Celtics',
+           {'Chris Johnson': _line(20, '1990-09-29')}, {'Chris Johnson': _line(6, '1985-04-15')}),
+    _match('201412010BOS', '2014-12-01', 'Boston Celtics', 'Atlanta Hawks',
+           {'Chris Johnson': _line(8, '1985-04-15')}, {}),
+]
+
+
+def test_players_with_the_same_name_are_kept_apart():
+    aggregates = SeasonAggregates('united_states', 'nba', '2014-2015')
+    for match in MATCHES:
+        aggregates.apply(match)
+    traded = aggregates.player('Chris Johnson', '1985-04-15')
+    assert (traded['G'], traded['totals']['PTS']) == (3, 24)
+    # the last game was with Boston, although applied before the December one
+    assert traded['team'] == 'Boston Celtics'
+    assert traded['teams'] == {'Los Angeles Lakers': 1, 'Boston Celtics': 2}
+    other = aggregates.player('Chris Johnson', '1990-09-29')
+    assert (other['team'], other['G']) == ('Utah Jazz', 1)
+    assert aggregates.player('Jordan Clarkson')['G'] == 1
+
+
+def test_revised_matches_replace_their_numbers():
+    aggregates = SeasonAggregates('united_states', 'nba', '2014-2015')
+    for match in MATCHES:
+        aggregates.apply(match)
+    revised = json.loads(json.dumps(MATCHES[2]))
+    revised['home']['players']['Chris Johnson']['PTS'] = 18
+    aggregates.apply(revised)
+    assert aggregates.player('Chris Johnson', '1985-04-15')['totals']['PTS'] == 34
+    assert aggregates.team('Boston Celtics')['G'] == 2
+
+
+def test_leaders():
+    aggregates = SeasonAggregates('united_states', 'nba', '2014-2015')
+    for match in MATCHES:
+        aggregates.apply(match)
+    assert aggregates.leaders('PTS', n=2) == [('Chris Johnson', 20.0), ('Jason Terry', 12.0)]
+    assert aggregates.leaders('PTS', n=1, per_game=False) == [('Chris Johnson', 24.0)]
+    assert aggregates.leaders('PTS', min_games=2) == [('Chris Johnson', 8.0)]
+
+
+def test_saved_aggregates_load_back(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    store = AggregateStore()
+    for match in MATCHES:
+        store.apply(match)
+    store.save()
+    loaded = SeasonAggregates.load('united_states', 'nba', '2014-2015')
+    assert loaded.player('Chris Johnson', '1985-04-15')['team'] == 'Boston Celtics'
+    assert loaded.team('Los Angeles Lakers')['W'] == 1
+    assert loaded.team('Los Angeles Lakers')['ORtg'] == pytest.approx(
+        store.get('united_states', 'nba', '2014-2015').team('Los Angeles Lakers')['ORtg'])
@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+
+import utils
+from backtest import backtest, get_buckets, convert_odds, load_odds
+from constants import BUCKET_LABELS
+
+ODDS = """date,home,away,home_odds,away_odds,home_close,away_close,home_prob
+2014-10-28,Los Angeles Lakers,Houston Rockets,250,-300,270,-330,0.3
+2014-10-28,San Antonio Spurs,Dallas Mavericks,-200,170,-220,180,0.72
+2014-10-29,Golden State Warriors,Sacramento Kings,-400,320,,,0.93
+2014-10-29,Utah Jazz,Houston Rockets,110,-130,105,-125,0.52
+2014-10-30,Boston Celtics,Brooklyn Nets,-110,-110,-105,-115,
+2014-10-30,Chicago Bulls,New York Knicks,-150,130,-160,140,0.58
+2014-10-31,Denver Nuggets,Detroit Pistons,-120,100,,,0.61
+"""
+
+OUTCOMES = {
+    'date': np.array(['2014-10-28', '2014-10-28', '2014-10-29', '2014-10-29', '2014-10-30', '2014-10-30'],
+                     dtype='datetime64[D]'),
+    'home': np.array(['Los Angeles Lakers', 'San Antonio Spurs', 'Golden State Warriors', 'Utah Jazz',
+                      'Boston Celtics', 'Chicago Bulls']),
+    'home_pts': np.array([90, 101, 95, 100, 121, 104], dtype=float),
+    'away_pts': np.array([108, 100, 77, 102, 105, 80], dtype=float),
+}
+
+
+def _scalar(rows, outcomes):
+    """
+    the backtest bet by bet with utils' scalar helpers
+    """
+    games = {(str(date), home): (h, a) for date, home, h, a in zip(outcomes['date'], outcomes['home'],
+                                                                  outcomes['home_pts'], outcomes['away_pts'])}
+    buckets = {label: [] for label in BUCKET_LABELS}
+    brier, profits = [], []
+    for row in rows:
+        if (row['date'], row['home']) not in games or not row['home_prob']:
+            continue
+        home_pts, away_pts = games[(row['date'], row['home'])]
+        prob = float(row['home_prob'])
+        brier.append((prob - (home_pts > away_pts)) ** 2)
+        bet_home = prob >= 0.5
+        price = utils.convert_odds(float(row['home_odds'] if bet_home else row['away_odds']))
+        won = (home_pts > away_pts) == bet_home
+        profit = price - 1 if won else -1.0
+        profits.append(profit)
+        buckets[utils.get_bucket(prob if bet_home else 1 - prob)].append(profit)
+    return profits, buckets, np.mean(brier)
+
+
+def test_vectorized_helpers_match_scalar_ones():
+    probs = [0.5, 0.549, 0.55, 0.6, 0.75, 0.8, 0.95, 1.0]
+    assert [BUCKET_LABELS[i] for i in get_buckets(probs)] == [utils.get_bucket(p) for p in probs]
+    assert get_buckets([0.3, np.nan]).tolist() == [-1, -1]
+    odds = [-300, -110, 100, 170]
+    assert convert_odds(odds) == pytest.approx([utils.convert_odds(o) for o in odds])
+
+
+def test_backtest_matches_bet_by_bet(tmp_path):
+    path = tmp_path / 'odds.csv'
+    path.write_text(ODDS)
+    odds = load_odds([str(path)])
+    report = backtest(odds['home_prob'], odds, OUTCOMES)
+    rows = [dict(zip(ODDS.splitlines()[0].split(','), line.split(','))) for line in ODDS.splitlines()[1:]]
+    profits, buckets, brier = _scalar(rows, OUTCOMES)
+
+    assert report['matched'] == 6
+    # the Celtics have no probability and the Nuggets no result
+    assert report['bets'] == len(profits) == 5
+    assert report['profit'] == pytest.approx(sum(profits))
+    assert report['brier'] == pytest.approx(brier)
+    for label, bets, roi in zip(BUCKET_LABELS, report['buckets']['bets'], report['buckets']['roi']):
+        assert bets == len(buckets[label])
+        if bets:
+            assert roi == pytest.approx(np.mean(buckets[label]))
+    assert report['closing_line']['bets'] == 4
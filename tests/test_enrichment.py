@@ -0,0 +1,26 @@
+import os
+import json
+
+import base
+from enrichment import EnrichmentStage
+
+
+def test_backfilled_matches_are_published(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs('./matches/united_states/nba/2014-2015')
+    match = {'code': '201410280LAL', 'home': {'players': {'Jordan Clarkson': {'PTS': 2}}}, 'away': {'players': {}}}
+    with open('./matches/united_states/nba/2014-2015/201410280LAL.json', 'w') as f:
+        json.dump(match, f)
+    events = []
+    monkeypatch.setattr(base, 'MATCH_LISTENERS', [lambda match, event: events.append((match, event))])
+
+    stage = EnrichmentStage('united_states', 'nba', '2014-2015', workers=1)
+    stage.pending.add('Jordan Clarkson', 'Los Angeles Lakers', '201410280LAL', 'home')
+    monkeypatch.setattr(stage, '_resolve', lambda name: {'college': 'Missouri'})
+    stage.run()
+
+    assert len(events) == 1
+    enriched, event = events[0]
+    assert event == 'enriched'
+    assert enriched['home']['players']['Jordan Clarkson'] == {'PTS': 2, 'college': 'Missouri'}
+    assert len(stage.pending) == 0
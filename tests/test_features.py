@@ -0,0 +1,102 @@
+import numpy as np
+
+from constants import FEATURE_STATS
+from features import FeatureSeries, FeatureStore
+
+
+def _naive(values, windows, decay):
+    """
+    features before every game computed straight from their definition
+    """
+    rows = []
+    for i in range(len(values) + 1):
+        past = values[:i]
+        row = []
+        for window in windows:
+            row.extend(np.nanmean(past[-window:], axis=0) if i else [np.nan] * past.shape[1])
+        weights = decay ** np.arange(i - 1, -1, -1)[:, None] * ~np.isnan(past)
+        with np.errstate(invalid='ignore'):
+            row.extend((weights * np.nan_to_num(past)).sum(axis=0) / weights.sum(axis=0))
+        rows.append(row)
+    return np.array(rows)
+
+
+def _games(n, seed):
+    rnd = np.random.RandomState(seed)
+    values = rnd.rand(n, len(FEATURE_STATS)) * 30
+    values[rnd.rand(n, len(FEATURE_STATS)) < 0.1] = np.nan
+    dates = np.datetime64('2014-10-28') + rnd.permutation(n * 2)[:n].astype('timedelta64[D]')
+    return ['g{0}'.format(i) for i in range(n)], dates, values
+
+
+def test_incremental_matches_definition():
+    codes, dates, values = _games(60, 0)
+    series = FeatureSeries()
+    # in date order first, then the rest out of order
+    order = np.argsort(dates)
+    for i in list(order[:40]) + list(order[40:][::-1]):
+        series.add(codes[i], dates[i], values[i])
+    expected = _naive(values[order], series.windows, series.decay)
+    with np.errstate(invalid='ignore'):
+        assert np.allclose(series.features_, expected, equal_nan=True)
+    assert series.codes == [codes[i] for i in order]
+
+
+def test_revised_game_replaces_its_values():
+    codes, dates, values = _games(20, 1)
+    series = FeatureSeries()
+    for code, date, row in zip(codes, dates, values):
+        series.add(code, date, row)
+    values[5] = values[5] + 1
+    series.add(codes[5], dates[5], values[5])
+    order = np.argsort(dates, kind='stable')
+    assert len(series) == 20
+    assert np.allclose(series.features_, _naive(values[order], series.windows, series.decay), equal_nan=True)
+
+
+def _match(code, date, home, away, pts):
+    totals = {stat: float(pts) for stat in FEATURE_STATS}
+    return {'code': code, 'date': date,
+            'home': {'name': home, 'totals': totals, 'players': {'A': dict(totals, MP=30.0)}},
+            'away': {'name': away, 'totals': totals, 'players': {'B': dict(totals, MP=None)}}}
+
+
+def test_store_is_saved_and_loaded(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    store = FeatureStore.load('united_states', 'nba')
+    for i in range(12):
+        store.apply(_match('m{0}'.format(i), '2015-01-{0:02d}'.format(i + 1), 'Home', 'Away', 90 + i))
+    store.save()
+    loaded = FeatureStore.load('united_states', 'nba')
+    assert sorted(loaded.teams) == ['Away', 'Home'] and sorted(loaded.players) == ['A']
+    assert np.allclose(loaded.team('Home', '2015-01-12'), store.team('Home', '2015-01-12'), equal_nan=True)
+    assert loaded.as_dict(loaded.team('Home', '2015-01-04'))['PTS_last3'] == 91.0
+
+
+def test_late_games_only_recompute_from_their_date(monkeypatch):
+    codes, dates, values = _games(50, 2)
+    order = np.argsort(dates, kind='stable')
+    series = FeatureSeries()
+    for i in order[:-3]:
+        series.add(codes[i], dates[i], values[i])
+    starts = []
+    recompute = series._recompute
+    monkeypatch.setattr(series, '_recompute', lambda start: starts.append(start) or recompute(start))
+    # the last games of the season arrive out of order
+    for i in order[-3:][::-1]:
+        series.add(codes[i], dates[i], values[i])
+    assert min(starts) >= 46
+    assert np.allclose(series.features_, _naive(values[order], series.windows, series.decay), equal_nan=True)
+
+
+def test_revised_game_can_move():
+    codes, dates, values = _games(20, 3)
+    series = FeatureSeries()
+    for code, date, row in zip(codes, dates, values):
+        series.add(code, date, row)
+    dates[7] = dates.min() - np.timedelta64(1, 'D')
+    series.add(codes[7], dates[7], values[7])
+    order = np.argsort(dates, kind='stable')
+    assert series.codes == [codes[i] for i in order]
+    assert np.allclose(series.features_, _naive(values[order], series.windows, series.decay), equal_nan=True)
+    assert np.allclose(series.pregame(dates[order[1]])[:len(FEATURE_STATS)], values[7], equal_nan=True)
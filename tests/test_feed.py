@@ -0,0 +1,35 @@
+import os
+import json
+
+import base
+from enrichment import EnrichmentStage
+from feed import ChangeFeed, read_feed
+
+
+def test_feed_in_the_working_directory(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    feed = ChangeFeed('feed.jsonl')
+    feed.publish({'code': '201410280LAL', 'country': 'United States', 'league': 'nba', 'season': '2014-2015'},
+                 'crawled')
+    feed.close()
+    assert [entry['seq'] for entry in read_feed('feed.jsonl')] == [1]
+
+
+def test_backfills_are_published(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs('./matches/united_states/nba/2014-2015')
+    match = {'code': '201410280LAL', 'country': 'United States', 'league': 'nba', 'season': '2014-2015',
+             'home': {'players': {'Jordan Clarkson': {}}}, 'away': {'players': {}}}
+    with open('./matches/united_states/nba/2014-2015/201410280LAL.json', 'w') as f:
+        json.dump(match, f)
+    feed = ChangeFeed('./changes/feed.jsonl')
+    monkeypatch.setattr(base, 'MATCH_LISTENERS', [feed.apply])
+
+    stage = EnrichmentStage('united_states', 'nba', '2014-2015', workers=1)
+    stage.pending.add('Jordan Clarkson', 'Los Angeles Lakers', '201410280LAL', 'home')
+    monkeypatch.setattr(stage, '_resolve', lambda name: {'college': 'Missouri'})
+    stage.run()
+    feed.close()
+
+    [entry] = read_feed('./changes/feed.jsonl')
+    assert (entry['code'], entry['event'], entry['country']) == ('201410280LAL', 'enriched', 'united_states')
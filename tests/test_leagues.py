@@ -0,0 +1,52 @@
+import os
+
+import pytest
+
+from derived import DERIVED_STATS, derive_match
+from leagues import SpecBRefMatch
+
+# box score laid out as the european pages of basketball reference: a basic stats
+# table per team, reserves separator row, did not play reasons, 40 minute games
+EURO = os.path.join(os.path.dirname(__file__), 'fixtures', 'euro')
+
+
+def _parse(code='2014-10-04-fc-barcelona'):
+    with open(os.path.join(EURO, code + '.html'), 'r') as f:
+        html = f.read()
+    match = SpecBRefMatch('spain', 'acb', '2014-2015', code, 'Season')
+    match.parse(html)
+    return match.match_
+
+
+def test_euro_box_score():
+    match = _parse()
+    assert match['away']['name'] == 'Real Madrid'
+    assert match['home']['name'] == 'FC Barcelona'
+    assert match['date'] == '2014-10-04'
+    assert match['stadium'] == 'Palau Blaugrana'
+    assert match['home']['scores'] == {'1': '25', '2': '25', '3': '25', '4': '25', 'T': '100'}
+    assert match['home']['totals']['PTS'] == 100
+    assert match['away']['totals']['+/-'] == -5
+
+    players = match['away']['players']
+    assert 'Reserves' not in players and len(players) == 9
+    assert players['Sergio Llull']['MP'] == pytest.approx(27 + 14 / 60)
+    assert players['Marcus Slaughter'] == {'MP': 0.0}
+    for team in ['home', 'away']:
+        lines = [line for line in match[team]['players'].values() if line['MP']]
+        assert sum(line['PTS'] for line in lines) == match[team]['totals']['PTS']
+
+
+def test_euro_box_score_derives_every_stat():
+    match = _parse()
+    llull = match['away']['players']['Sergio Llull']
+    for stat, _, _, _ in DERIVED_STATS:
+        assert stat in llull and stat in match['away']['totals']
+    assert llull['2PA'] == llull['FGA'] - llull['3PA']
+    assert llull['DRB'] == llull['TRB'] - llull['ORB']
+    assert 'FG%' not in match['away']['players']['Marcus Slaughter']
+
+    # rederiving gives the same stats
+    stored = {team: dict(match[team]['totals']) for team in ['home', 'away']}
+    derive_match(match)
+    assert stored == {team: match[team]['totals'] for team in ['home', 'away']}
@@ -0,0 +1,138 @@
+from array import array
+
+import numpy as np
+import pytest
+
+from constants import PBP_COLUMNS, PBP_EVENT_TYPES
+from lineups import LineupEngine, lineup_hash
+from pbp import EventStore
+
+AWAY = ['a1', 'a2', 'a3', 'a4', 'a5', 'a6']
+HOME = ['h1', 'h2', 'h3', 'h4', 'h5', 'h6']
+
+# period, clock, team, type, player, player2, points
+EVENTS = [
+    (1, 7200, -1, 'period_start', None, None, 0),
+    (1, 7000, 0, 'made_shot', 'a1', 'a2', 2),
+    (1, 6800, 1, 'made_shot', 'h1', None, 3),
+    (1, 6700, 0, 'missed_shot', 'a3', None, 0),
+    (1, 6690, 1, 'defensive_rebound', 'h2', None, 0),
+    (1, 6600, 0, 'turnover', 'a4', None, 0),
+    (1, 6500, 0, 'foul', 'a5', None, 0),
+    (1, 6400, 1, 'made_free_throw', 'h3', None, 1),
+    (1, 6400, 1, 'missed_free_throw', 'h3', None, 0),
+    (1, 6390, 0, 'defensive_rebound', 'a1', None, 0),
+    (1, 6300, 1, 'foul', 'h4', None, 0),
+    (1, 6200, 1, 'turnover', 'h5', None, 0),
+    (1, 6000, 0, 'substitution', 'a6', 'a1', 0),
+    (1, 5000, 0, 'made_shot', 'a6', None, 2),
+    (1, 0, -1, 'period_end', None, None, 0),
+    # a1 is back for the second period, without a substitution row
+    (2, 7200, -1, 'period_start', None, None, 0),
+    (2, 7000, 0, 'made_shot', 'a1', 'a2', 3),
+    (2, 6900, 1, 'made_shot', 'h1', 'h2', 2),
+    (2, 6800, 0, 'missed_shot', 'a3', None, 0),
+    (2, 6790, 1, 'defensive_rebound', 'h3', None, 0),
+    (2, 6700, 1, 'turnover', 'h4', 'a4', 0),
+    (2, 6600, 0, 'foul', 'a5', 'h5', 0),
+    (2, 3600, 1, 'substitution', 'h6', 'h5', 0),
+    (2, 3000, 1, 'made_shot', 'h6', None, 2),
+    (2, 0, -1, 'period_end', None, None, 0),
+]
+
+
+class FakePlayByPlay:
+
+    def __init__(self, code, store, events):
+        self.code = code
+        self.columns = {name: array(typecode) for name, typecode in PBP_COLUMNS}
+        away = home = 0
+        for period, clock, team, event_type, player, player2, points in events:
+            away += points if team == 0 else 0
+            home += points if team == 1 else 0
+            ids = [store.player_id(code, code.upper()) if code else -1 for code in (player, player2)]
+            for name, value in zip(['period', 'clock', 'team', 'type', 'player', 'player2', 'points',
+                                    'away_score', 'home_score'],
+                                   [period, clock, team, PBP_EVENT_TYPES.index(event_type)] + ids +
+                                   [points, away, home]):
+                self.columns[name].append(value)
+
+    def __len__(self):
+        return len(self.columns['type'])
+
+
+def _engine(games=1):
+    store = EventStore('united_states', 'nba', '2014-2015')
+    for i in range(games):
+        store.add(FakePlayByPlay('20141028{0}LAL'.format(i), store, EVENTS))
+    return store, LineupEngine.build(store)
+
+
+def test_substitutions_and_stints():
+    store, engine = _engine()
+    starters, bench = AWAY[:5], AWAY[1:]
+    home_starters, home_bench = HOME[:5], HOME[:4] + ['h6']
+    assert len(engine) == 4
+
+    # a1 to a5 start both periods, a6 replaces a1 in the first one
+    assert engine.lineup(starters)['MP'] == pytest.approx(14)
+    assert engine.lineup(starters)['stints'] == 2
+    assert engine.lineup(bench)['MP'] == pytest.approx(10)
+    assert engine.lineup(home_starters)['MP'] == pytest.approx(18)
+    assert engine.lineup(home_bench)['MP'] == pytest.approx(6)
+
+    # stints end at substitutions and at the end of every period
+    assert engine.stints == [
+        ('201410280LAL', 1, 7200, 6000, 0, lineup_hash(starters)),
+        ('201410280LAL', 1, 6000, 0, 0, lineup_hash(bench)),
+        ('201410280LAL', 1, 7200, 0, 1, lineup_hash(home_starters)),
+        ('201410280LAL', 2, 7200, 3600, 1, lineup_hash(home_starters)),
+        ('201410280LAL', 2, 7200, 0, 0, lineup_hash(starters)),
+        ('201410280LAL', 2, 3600, 0, 1, lineup_hash(home_bench)),
+    ]
+    assert sorted(engine.lineup(bench)['players']) == ['A2', 'A3', 'A4', 'A5', 'A6']
+
+
+def test_points_for_and_against():
+    _, engine = _engine()
+    points = {tuple(players): (engine.lineup(players)['PTS'], engine.lineup(players)['OPP_PTS'])
+              for players in [AWAY[:5], AWAY[1:], HOME[:5], HOME[:4] + ['h6']]}
+    assert points == {
+        tuple(AWAY[:5]): (5, 8),
+        tuple(AWAY[1:]): (2, 0),
+        tuple(HOME[:5]): (6, 7),
+        tuple(HOME[:4] + ['h6']): (2, 0),
+    }
+    ratings = engine.ratings()
+    assert np.allclose(ratings['ORtg'], 100 * ratings['PTS'] / ratings['POS'], equal_nan=True)
+    assert np.allclose(ratings['NRtg'], ratings['ORtg'] - ratings['DRtg'], equal_nan=True)
+
+
+def test_on_off():
+    _, engine = _engine()
+    on_off = engine.on_off('a1')
+    assert (on_off['on']['PTS'], on_off['on']['OPP_PTS']) == (5, 8)
+    assert (on_off['off']['PTS'], on_off['off']['OPP_PTS']) == (2, 0)
+    assert on_off['on']['MP'] == pytest.approx(14)
+    assert on_off['on']['ORtg'] == pytest.approx(engine.lineup(AWAY[:5])['ORtg'])
+
+    # players on court for the whole game have no off court minutes
+    on_off = engine.on_off('h1')
+    assert on_off['on']['MP'] == pytest.approx(24)
+    assert on_off['off']['MP'] == 0
+    assert np.isnan(on_off['off']['ORtg'])
+
+
+def test_games_add_up_and_replace():
+    store, engine = _engine(games=2)
+    assert engine.lineup(AWAY[:5])['MP'] == pytest.approx(28)
+    assert engine.lineup(AWAY[:5])['stints'] == 4
+    assert len(engine.stints) == 12
+    assert engine.on_off('a1')['on']['PTS'] == 10
+
+    # adding a game again replaces its contribution
+    engine.add_game(store, '201410280LAL')
+    assert engine.lineup(AWAY[:5])['MP'] == pytest.approx(28)
+    assert len(engine.stints) == 12
+    assert [lineup['players'] for lineup in engine.top(1, min_possessions=0)] == \
+        [engine.lineup(AWAY[1:])['players']]
@@ -0,0 +1,74 @@
+import os
+import datetime
+import threading
+
+import pytest
+
+import live
+from nba import NbaBRefSeason
+from replay import ReplayServer, ReplayConfig, PageStore
+
+CODE = '201410280LAL'
+BOXSCORE = os.path.join(os.path.dirname(__file__), 'fixtures', 'boxscores', CODE + '.html')
+
+
+class FakeSchedule:
+
+    def games_on(self, date):
+        return [{'code': CODE, 'post_season': False, 'played': False}]
+
+
+@pytest.fixture
+def host(tmp_path):
+    with open(BOXSCORE, 'r') as f:
+        html = f.read()
+    # the same page twice, a change of scripts only, then Wesley Johnson's minutes
+    snapshots = [html, html, html.replace('<body class="bbr">', '<body class="bbr"><script>var t=1;</script>'),
+                 html.replace('13:51', '14:51')]
+    os.makedirs(str(tmp_path / 'replay' / 'boxscores'))
+    for i, snapshot in enumerate(snapshots, 1):
+        with open(str(tmp_path / 'replay' / 'boxscores' / '{0}.html.{1}'.format(CODE, i)), 'w') as f:
+            f.write(snapshot)
+    server = ReplayServer(('127.0.0.1', 0), PageStore(str(tmp_path / 'replay')), ReplayConfig())
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield 'http://127.0.0.1:{0}'.format(server.server_address[1])
+    server.shutdown()
+    server.server_close()
+
+
+def test_only_changed_lines_are_emitted(host, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    class LiveSeason(NbaBRefSeason):
+
+        def _match(self, code, match_type):
+            match = super()._match(code, match_type)
+            match.uri_base = host + '/boxscores/{0}.html'
+            return match
+
+    emitted = []
+    monkeypatch.setattr(live, 'refresh_month', lambda league, season, date: FakeSchedule())
+    monkeypatch.setattr(live, 'LIVE_LISTENERS', [lambda code, diff: emitted.append(diff)])
+    poller = live.LivePoller(LiveSeason, 'united_states', 'nba', '2014-2015', datetime.date(2014, 10, 28),
+                             workers=1, min_interval=30, max_interval=60)
+    poller._refresh_schedule()
+    game = poller.games[CODE]
+    parses = []
+    parse = game.match.parse
+    monkeypatch.setattr(game.match, 'parse', lambda html: parses.append(html) or parse(html))
+
+    statuses = []
+    for _ in range(5):
+        game, status, html, etag = poller._fetch(game)
+        statuses.append(status)
+        poller._update(game, status, html, etag)
+
+    assert statuses == [200, 304, 200, 200, 304]
+    # unchanged and script only snapshots aren't parsed
+    assert len(parses) == 2
+    assert len(emitted) == 2
+    assert list(emitted[1]) == [('away', 'Wesley Johnson')]
+    assert emitted[1][('away', 'Wesley Johnson')]['MP'] == pytest.approx(14 + 51 / 60, abs=0.01)
+    assert len(open(poller.path).readlines()) == 2
+    # the box score stopped changing, so the schedule is checked early
+    assert poller._schedule_at <= poller._refreshed_at + 30
@@ -0,0 +1,72 @@
+import threading
+import time
+
+import memory
+from memory import ByteBudget
+
+
+def _waiter(budget, n, acquired):
+    def run():
+        budget.acquire(n)
+        acquired.set()
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
+
+
+def test_acquire_blocks_until_release():
+    budget = ByteBudget(100)
+    budget.acquire(60)
+    acquired = threading.Event()
+    thread = _waiter(budget, 50, acquired)
+    assert not acquired.wait(0.2)
+    assert budget.used == 60
+
+    budget.release(60)
+    assert acquired.wait(1)
+    thread.join(1)
+    assert budget.used == 50
+
+
+def test_reservation_bigger_than_the_limit_passes_alone():
+    budget = ByteBudget(100)
+    budget.acquire(500)
+    assert budget.used == 500
+    acquired = threading.Event()
+    _waiter(budget, 1, acquired)
+    assert not acquired.wait(0.2)
+    budget.release(500)
+    assert acquired.wait(1)
+
+
+def test_resize_wakes_waiters_and_grows_reservations():
+    budget = ByteBudget(100)
+    acquired = threading.Event()
+    with budget.reserve() as got:
+        assert budget.used == memory.PAGE_ESTIMATE
+        _waiter(budget, 90, acquired)
+        # the page turned out smaller than reserved, which makes room
+        got('x' * 10)
+        assert acquired.wait(1)
+        assert budget.used == 100
+    assert budget.used == 90
+    assert budget.largest == memory.PAGE_ESTIMATE
+
+    budget.release(90)
+    with budget.reserve() as got:
+        got('x' * (memory.PAGE_ESTIMATE + 1))
+    assert budget.used == 0
+    assert budget.largest == memory.PAGE_ESTIMATE + 1
+
+
+def test_released_on_error():
+    budget = ByteBudget(100)
+    try:
+        with budget.reserve():
+            raise ValueError()
+    except ValueError:
+        pass
+    assert budget.used == 0
+    started = time.time()
+    budget.acquire(100)
+    assert time.time() - started < 0.1
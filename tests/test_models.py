@@ -0,0 +1,101 @@
+import gc
+import json
+import random
+import tracemalloc
+
+import models
+from models import Match
+from constants import STATS_SCHEMA
+
+
+def _team(name, rnd):
+    players = {}
+    for i in range(13):
+        stats = {stat: round(rnd.random() * 30, 3) for stat in STATS_SCHEMA}
+        if i == 12:
+            stats = {stat: None for stat in STATS_SCHEMA[:20]}
+            stats['MP'] = 0.0
+        stats.update({
+            'name': '{0} Player {1}'.format(name, i),
+            'number': str(i),
+            'position': 'PG',
+            'height': 1.98,
+            'weight': 95.3,
+            'birth_date': '1990-01-0{0}'.format(i % 9 + 1),
+            'experience': 3,
+            'college': 'Duke',
+        })
+        players['{0} Player {1}'.format(name, i)] = stats
+    totals = {stat: round(rnd.random() * 100, 1) for stat in STATS_SCHEMA}
+    # an int and a stat out of the schema, as left by some leagues
+    totals['PTS'] = 105
+    totals['Pace'] = 98.2
+    return {'players': players, 'totals': totals, 'name': name,
+            'scores': {'1': '25', '2': '30', '3': '22', '4': '28', 'T': '105'}}
+
+
+def _match(i, rnd):
+    return {
+        'code': '2015010{0:04d}GSW'.format(i),
+        'home': _team('Home{0}'.format(i % 30), rnd),
+        'away': _team('Away{0}'.format(i % 29), rnd),
+        'type': 'Season',
+        'league': 'nba',
+        'season': '2014-2015',
+        'country': 'United States',
+        'date': '2015-01-01',
+        'time': '19:30:00',
+        'stadium': 'Oracle Arena',
+        'derived': {'version': {'GmSc': 1}},
+    }
+
+
+def test_round_trip_is_lossless():
+    rnd = random.Random(0)
+    for i in range(20):
+        d = json.loads(json.dumps(_match(i, rnd)))
+        # key order included, so the json written back is the same
+        assert json.dumps(Match.from_json(d).to_json()) == json.dumps(d)
+
+
+def test_nan_stats_are_kept():
+    d = _match(0, random.Random(0))
+    d['home']['totals']['FG%'] = float('nan')
+    assert json.dumps(Match.from_json(d).to_json()) == json.dumps(d)
+
+
+def test_compact_matches_are_smaller():
+    rnd = random.Random(1)
+    dumps = [json.dumps(_match(i, rnd)) for i in range(100)]
+
+    gc.collect()
+    tracemalloc.start()
+    plain = [json.loads(dump) for dump in dumps]
+    plain_size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del plain
+
+    # names are interned once for the whole process, which may grow the interned
+    # strings table while measuring
+    [Match.from_json(json.loads(dump)) for dump in dumps]
+    gc.collect()
+    tracemalloc.start()
+    shared = {}
+    compact = [Match.from_json(json.loads(dump), shared) for dump in dumps]
+    compact_size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    # about 4x with box score lines as wide as the schema
+    assert compact_size * 3.5 < plain_size
+    assert len(compact) == 100
+
+
+def test_bios_are_shared_within_a_load_only():
+    shared = {}
+    first = Match.from_json(_match(0, random.Random(2)), shared)
+    second = Match.from_json(_match(0, random.Random(2)), shared)
+    other = Match.from_json(_match(0, random.Random(2)))
+    # lines of the same player share their bio among the matches loaded together
+    assert first.home.players[0].bio is second.home.players[0].bio
+    assert first.home.players[0].bio is not other.home.players[0].bio
+    assert not hasattr(models, '_BIOS')
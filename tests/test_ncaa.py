@@ -0,0 +1,34 @@
+import time
+
+import ncaa
+from ncaa import NcaaBRefSeason
+
+
+class _Schedule:
+    status_code = 200
+    headers = {}
+    text = '<table id="schedule"><tbody></tbody></table>'
+
+    def raise_for_status(self):
+        pass
+
+
+def test_discovery_stops_at_deadline(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    timeouts = []
+
+    def slow_get(url, timeout=None):
+        timeouts.append(timeout)
+        time.sleep(0.1)
+        return _Schedule()
+
+    monkeypatch.setattr(ncaa.requests, 'get', slow_get)
+    season = NcaaBRefSeason('united_states', 'ncaa', '2014-2015', discovery_workers=10)
+    started = time.time()
+    jobs = season.season_jobs(deadline=started + 0.35)
+    # about 4 rounds of 10 schools instead of every school
+    assert time.time() - started < 1.0
+    assert jobs == []
+    assert 0 < len(timeouts) < len(set(ncaa.COLLEGES_PATHS.values()))
+    assert all(0 < timeout <= 0.35 for timeout in timeouts)
+    assert season.deadline_ is None
@@ -0,0 +1,70 @@
+import os
+from array import array
+
+from constants import PBP_COLUMNS, PBP_EVENT_TYPES
+from pbp import EventStore, PlayByPlay
+
+# play-by-play laid out as basketball reference pages: quarter anchors, repeated
+# headers, full width rows, a commented out copy of the table and a nested table
+PBP = os.path.join(os.path.dirname(__file__), 'fixtures', 'pbp')
+
+
+class FakePlayByPlay:
+
+    def __init__(self, code, events):
+        self.code = code
+        self.columns = {name: array(typecode, [events[0]] * events[1]) for name, typecode in PBP_COLUMNS}
+
+    def __len__(self):
+        return len(self.columns['type'])
+
+
+def test_replaced_matches_are_dropped_on_save(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    store = EventStore('united_states', 'nba', '2014-2015')
+    store.add(FakePlayByPlay('201410280LAL', (1, 3)))
+    store.add(FakePlayByPlay('201410280SAS', (2, 4)))
+    store.add(FakePlayByPlay('201410280LAL', (3, 2)))
+    assert len(store) == 2
+    assert store.codes == ['201410280SAS', '201410280LAL']
+    assert list(store.game('201410280LAL')['type']) == [3, 3]
+    assert list(store.game('201410280SAS')['type']) == [2] * 4
+
+    store.save()
+    assert len(store.columns['type']) == 6
+    loaded = EventStore.load('united_states', 'nba', '2014-2015')
+    assert loaded.codes == ['201410280SAS', '201410280LAL']
+    assert list(loaded.offsets) == [0, 4, 6]
+    assert list(loaded.game('201410280LAL')['period']) == [3, 3]
+
+
+def test_parse_page(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    store = EventStore('united_states', 'nba', '2014-2015')
+    pbp = PlayByPlay('201410280LAL', store.player_id)
+    with open(os.path.join(PBP, '201410280LAL.html'), 'r') as f:
+        pbp.parse(f.read())
+    store.add(pbp)
+    events = list(store.events('201410280LAL'))
+
+    assert len(pbp) == len(events) == 19
+    assert [event['period'] for event in events] == [1] * 15 + [2] * 4
+    assert [event['type'] for event in events[:4]] == ['period_start', 'jump_ball', 'made_shot', 'missed_shot']
+    assert set(event['type'] for event in events) == set(PBP_EVENT_TYPES)
+    assert [event['clock'] for event in events[13:18]] == [6305, 0, 7200, 7042, 6900]
+
+    shot = events[2]
+    assert (shot['team'], shot['player'], shot['player2'], shot['points']) == (1, 'K. Bryant', 'J. Lin', 2)
+    assert (events[0]['team'], events[0]['player']) == (-1, None)
+    assert [(event['player'], event['player2']) for event in events if event['type'] == 'substitution'] == \
+        [('N. Young', 'K. Bryant')]
+    free_throws = [event['points'] for event in events if 'free_throw' in event['type']]
+    assert free_throws == [1, 0]
+
+    # the score is carried over rows without one, and matches the points scored
+    assert [(event['away_score'], event['home_score']) for event in events[-4:]] == [(4, 2), (4, 4), (4, 4), (4, 4)]
+    for team, column in [(0, 'away_score'), (1, 'home_score')]:
+        assert sum(event['points'] for event in events if event['team'] == team) == events[-1][column]
+    # the shot whose cell holds a nested table isn't lost
+    assert [event['player'] for event in events if event['type'] == 'made_shot'] == ['K. Bryant', 'T. Ariza', 'N. Young']
+    assert store.players[store.player_id('youngni01', 'N. Young')] == ['youngni01', 'N. Young']
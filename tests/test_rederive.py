@@ -0,0 +1,28 @@
+import os
+import json
+
+import base
+from derived import versions
+from rederive import rederive
+
+RAW = {'MP': 30.0, 'FG': 8, 'FGA': 17, '3P': 2, '3PA': 5, 'FT': 4, 'FTA': 5, 'ORB': 2, 'DRB': 5, 'TRB': 7,
+       'AST': 4, 'STL': 1, 'BLK': 1, 'TOV': 2, 'PF': 3, 'PTS': 22}
+
+
+def _match(code, derived):
+    team = {'players': {'Player': dict(RAW)}, 'totals': {k: v * 5 for k, v in RAW.items()}}
+    return {'code': code, 'home': team, 'away': json.loads(json.dumps(team)), 'derived': derived}
+
+
+def test_rederived_matches_are_published(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    path = os.path.join('matches', 'united_states', 'nba', '2014-2015')
+    os.makedirs(path)
+    for code, derived in [('201410280LAL', {}), ('201410280SAS', versions())]:
+        with open(os.path.join(path, code + '.json'), 'w') as f:
+            json.dump(_match(code, derived), f)
+    events = []
+    monkeypatch.setattr(base, 'MATCH_LISTENERS', [lambda match, event: events.append((match['code'], event))])
+
+    rederive([path], processes=1)
+    assert events == [('201410280LAL', 'rederived')]
@@ -0,0 +1,85 @@
+import requests
+
+from retry import CrawlJob, RetryQueue, DeadLetterQueue, classify_error, backoff_delay
+from utils import TransientHTTPException, TimeoutException, ParseException, EnrichmentException, check_response
+
+
+class Response:
+
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError('{0} error'.format(self.status_code), response=self)
+
+
+def _raised(response):
+    try:
+        check_response(response)
+    except Exception as e:
+        return e
+
+
+def test_errors_are_classified():
+    assert classify_error(TimeoutException()) == 'transient'
+    assert classify_error(requests.ConnectionError()) == 'transient'
+    assert classify_error(_raised(Response(429))) == 'transient'
+    assert classify_error(_raised(Response(503))) == 'transient'
+    assert classify_error(_raised(Response(404))) == 'fatal'
+    assert classify_error(requests.HTTPError('no response')) == 'fatal'
+    assert classify_error(ParseException()) == 'parse'
+    assert classify_error(EnrichmentException()) == 'enrichment'
+    assert classify_error(KeyError('x')) == 'fatal'
+
+
+def test_retry_after_is_read_and_bounds_the_backoff():
+    assert _raised(Response(429, {'Retry-After': '30'})).retry_after == 30
+    assert _raised(Response(429, {'Retry-After': 'Wed, 21 Oct 2015 07:28:00 GMT'})).retry_after is None
+    for attempt in range(1, 8):
+        # equal jitter: between half the exponential delay and the whole of it, capped
+        delay = min(120, 2 * 2 ** (attempt - 1))
+        assert delay / 2 <= backoff_delay('transient', attempt) <= delay
+        assert backoff_delay('transient', attempt, retry_after=200) == 200
+
+
+def test_failed_jobs_are_delayed_until_they_run_out_of_attempts():
+    queue = RetryQueue()
+    job = CrawlJob('201410280LAL', 'Season')
+    assert queue.fail(job, TransientHTTPException(503, retry_after=60))
+    assert queue.pop_ready(1) == []
+    assert 59 <= queue.next_delay() <= 60
+    assert not queue.fail(CrawlJob('201410280SAS', 'Season'), KeyError('x'))
+    parse_job = CrawlJob('201410280DAL', 'Season')
+    assert queue.fail(parse_job, ParseException())
+    assert not queue.fail(parse_job, ParseException())
+    assert (parse_job.attempts, parse_job.error_class) == (2, 'parse')
+
+
+def test_jobs_are_ready_by_priority_and_deadline():
+    queue = RetryQueue([CrawlJob('a', 'Season', priority='backfill'),
+                        CrawlJob('b', 'Season', priority='recent', deadline=20),
+                        CrawlJob('c', 'Season', priority='recent', deadline=10),
+                        CrawlJob('d', 'Post-Season', priority='post-season')])
+    assert [job.code for job in queue.pop_ready(2)] == ['c', 'b']
+    assert [job.code for job in queue.pop_ready(5, lambda job: job.priority != 'backfill')] == ['d']
+    assert [job.code for job in queue.drain()] == ['a']
+
+
+def test_dead_letters_survive_a_crashed_replay(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    dead_letters = DeadLetterQueue('united_states', 'nba', '2014-2015')
+    for code in ['201410280LAL', '201410280SAS', '201410280LAL']:
+        job = CrawlJob(code, 'Season', attempts=6)
+        job.error_class, job.last_error = 'transient', 'HTTP 503'
+        dead_letters.add(job, log=False)
+
+    jobs = dead_letters.take()
+    assert [(job.code, job.attempts) for job in jobs] == [('201410280LAL', 0), ('201410280SAS', 0)]
+    # a replay that crashes before finish leaves them to be taken again, with new failures
+    dead_letters.add(CrawlJob('201410290DAL', 'Season'), log=False)
+    assert sorted(job.code for job in DeadLetterQueue('united_states', 'nba', '2014-2015').take()) == [
+        '201410280LAL', '201410280SAS', '201410290DAL']
+    dead_letters.finish()
+    assert dead_letters.take() == []
@@ -0,0 +1,38 @@
+from base import BRefSeason
+
+PAGES = {}
+CRAWLED = []
+
+
+class FakeMatch:
+
+    def __init__(self, country, league, season, code, match_type):
+        self.code = code
+
+    def fetch(self):
+        self.hash_ = PAGES[self.code]
+        return self.hash_
+
+    def crawl(self, html=None, event='crawled'):
+        CRAWLED.append((self.code, event))
+
+
+class FakeSeason(BRefSeason):
+    match_class = FakeMatch
+
+
+def test_unrecorded_matches_are_seeded_without_parsing(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    season = FakeSeason('united_states', 'nba', '2014-2015')
+    PAGES.update({'201410280LAL': 'a', '201410280SAS': 'b'})
+    season.records.set('201410280SAS', 'old')
+    for code in PAGES:
+        season._revalidate_match(code, 'Season')
+    assert CRAWLED == [('201410280SAS', 'revised')]
+    assert season.records.get('201410280LAL') == 'a'
+
+    del CRAWLED[:]
+    PAGES['201410280LAL'] = 'c'
+    for code in PAGES:
+        season._revalidate_match(code, 'Season')
+    assert CRAWLED == [('201410280LAL', 'revised')]
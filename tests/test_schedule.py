@@ -0,0 +1,121 @@
+import datetime
+import time
+import threading
+from multiprocessing.dummy import Pool as ThreadPool
+
+from bs4 import BeautifulSoup
+
+import schedule
+from constants import LEAGUE_SPECS
+
+
+def test_seasons_are_fetched_concurrently_and_once(monkeypatch):
+    loads = []
+    lock = threading.Lock()
+
+    def slow_load(league, season, refresh):
+        with lock:
+            loads.append(season)
+        time.sleep(0.3)
+        return schedule.SeasonSchedule(league, season)
+
+    monkeypatch.setattr(schedule, 'SCHEDULES', {})
+    monkeypatch.setattr(schedule, '_load_schedule', slow_load)
+    seasons = ['2012-2013', '2013-2014', '2014-2015'] * 4
+    pool = ThreadPool(len(seasons))
+    started = time.time()
+    schedules = pool.map(lambda season: schedule.get_schedule('nba', season), seasons)
+    pool.close()
+    # one download per season, all of them at the same time
+    assert sorted(loads) == ['2012-2013', '2013-2014', '2014-2015']
+    assert time.time() - started < 0.6
+    assert all(s is schedule.get_schedule('nba', s.season) for s in schedules)
+
+
+def test_refresh_fetches_again(monkeypatch):
+    monkeypatch.setattr(schedule, 'SCHEDULES', {})
+    monkeypatch.setattr(schedule, '_load_schedule', lambda league, season, refresh: schedule.SeasonSchedule(league, season))
+    first = schedule.get_schedule('nba', '2014-2015')
+    assert schedule.get_schedule('nba', '2014-2015') is first
+    assert schedule.get_schedule('nba', '2014-2015', refresh=True) is not first
+
+
+def _row(html):
+    return BeautifulSoup('<table><tr>{0}</tr></table>'.format(html), 'html.parser').tr
+
+
+def test_nba_played_dates_come_from_the_code():
+    row = _row('<th>Wed, Oct 29, 2014</th><td><a href="/teams/HOU/2015.html">Houston Rockets</a></td>'
+               '<td><a href="/teams/LAL/2015.html">Los Angeles Lakers</a></td>'
+               '<td><a href="/boxscores/201410280LAL.html">Box Score</a></td>')
+    game = schedule._parse_row(row, False, LEAGUE_SPECS['nba'])
+    assert game['code'] == '201410280LAL'
+    assert game['date'] == datetime.date(2014, 10, 28)
+    assert game['played']
+
+
+def test_nba_unplayed_dates_come_from_the_row():
+    row = _row('<th>Tue, Oct 28, 2014</th><td><a href="/teams/HOU/2015.html">Houston Rockets</a></td>'
+               '<td><a href="/teams/LAL/2015.html">Los Angeles Lakers</a></td><td></td>')
+    game = schedule._parse_row(row, False, LEAGUE_SPECS['nba'])
+    assert game['code'] == '201410280LAL'
+    assert game['date'] == datetime.date(2014, 10, 28)
+    assert not game['played']
+
+
+def test_euro_dates_come_from_the_row():
+    row = _row('<td>2014-10-12</td><td><a href="/euro/teams/real-madrid/2015.html">Real Madrid</a></td>'
+               '<td><a href="/euro/teams/barcelona/2015.html">Barcelona</a></td>'
+               '<td><a href="/euro/boxscores/real-madrid-barcelona.html">Box Score</a></td>')
+    game = schedule._parse_row(row, False, LEAGUE_SPECS['acb'])
+    assert game['code'] == 'real-madrid-barcelona'
+    assert game['date'] == datetime.date(2014, 10, 12)
+
+
+def _page(rows, links=()):
+    return '<html><body>{0}<table class="stats_table"><tbody>{1}</tbody></table></body></html>'.format(
+        ''.join('<a href="{0}">month</a>'.format(link) for link in links),
+        ''.join('<tr><th>{0}</th><td><a href="/teams/{1}/2015.html">{1}</a></td>'
+                '<td><a href="/teams/{2}/2015.html">{2}</a></td><td>{3}</td></tr>'.format(
+                    date, away, home, '<a href="/boxscores/{0}.html">Box Score</a>'.format(code) if code else '')
+                for date, away, home, code in rows))
+
+
+def test_refresh_month_fetches_a_single_page(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(schedule, 'SCHEDULES', {})
+    october, november = '/leagues/NBA_2015_games-october.html', '/leagues/NBA_2015_games-november.html'
+    october_rows = [('Tue, Oct 28, 2014', 'HOU', 'LAL', '201410280LAL'),
+                    ('Tue, Oct 28, 2014', 'DAL', 'SAS', '201410280SAS')]
+    pages = {
+        schedule.LEAGUES_TO_PATH['nba'].format('2015'): _page(october_rows, [october, november]),
+        schedule.BREF_HOST + october: _page(october_rows),
+        schedule.BREF_HOST + november: _page([('Sat, Nov 1, 2014', 'DET', 'DEN', None),
+                                              ('Sat, Nov 1, 2014', 'CHI', 'BOS', None)]),
+    }
+    fetched = []
+
+    def fetch(url):
+        fetched.append(url)
+        return BeautifulSoup(pages[url], 'html.parser')
+
+    monkeypatch.setattr(schedule, '_fetch', fetch)
+    season = schedule.get_schedule('nba', '2014-2015')
+    assert len(season) == 4 and len(fetched) == 3
+
+    # the Nuggets played and the Celtics game was moved to the next day
+    pages[schedule.BREF_HOST + november] = _page([('Sat, Nov 1, 2014', 'DET', 'DEN', '201411010DEN'),
+                                                  ('Sun, Nov 2, 2014', 'CHI', 'BOS', None)])
+    del fetched[:]
+    refreshed = schedule.refresh_month('nba', '2014-2015', datetime.date(2014, 11, 1))
+    assert fetched == [schedule.BREF_HOST + november]
+    assert schedule.get_schedule('nba', '2014-2015') is refreshed
+    assert [game['played'] for game in refreshed.games_on(datetime.date(2014, 11, 1))] == [True]
+    assert [game['code'] for game in refreshed.games_on(datetime.date(2014, 11, 2))] == ['201411020BOS']
+    assert refreshed.games_on(datetime.date(2014, 10, 28)) == season.games_on(datetime.date(2014, 10, 28))
+    assert len(refreshed) == 4
+
+    # months without a page have nothing to refresh
+    del fetched[:]
+    assert schedule.refresh_month('nba', '2014-2015', datetime.date(2014, 8, 1)) is refreshed
+    assert fetched == []
@@ -0,0 +1,25 @@
+import datetime
+
+from retry import CrawlJob
+from scheduler import DeadlineMetrics, job_priority
+
+TODAY = datetime.date(2014, 10, 30)
+
+
+def test_job_priorities():
+    assert job_priority('201410300LAL', 'Season', TODAY) == 'live'
+    assert job_priority('201410280LAL', 'Season', TODAY) == 'recent'
+    assert job_priority('201406150SAS', 'Post-Season', TODAY) == 'post-season'
+    assert job_priority('201404010SAS', 'Season', TODAY) == 'backfill'
+    assert job_priority('2014-10-30-14-duke', 'Season', TODAY) == 'live'
+
+
+def test_hit_rate_only_counts_jobs_with_a_deadline():
+    metrics = DeadlineMetrics()
+    metrics.done(CrawlJob('201410300LAL', 'Season', priority='backfill', deadline=float('inf')))
+    metrics.failed(CrawlJob('201404010SAS', 'Season', priority='backfill'))
+    metrics.failed(CrawlJob('201404020SAS', 'Season', priority='backfill'))
+    assert metrics.hit_rate('backfill') == 1.0
+    metrics.failed(CrawlJob('201404030SAS', 'Season', priority='backfill', deadline=0))
+    assert metrics.hit_rate('backfill') == 0.5
+    assert metrics.counts['backfill']['failed'] == 3
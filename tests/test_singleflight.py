@@ -0,0 +1,67 @@
+import threading
+
+import pytest
+
+from singleflight import SingleFlight
+
+WAITERS = 8
+
+
+def _flight(flights, key, func):
+    """
+    runs WAITERS concurrent calls of func under key, once all of them are waiting.
+    returns what every call returned or raised
+    """
+    results = [None] * WAITERS
+    barrier = threading.Barrier(WAITERS)
+
+    def call(i):
+        barrier.wait()
+        try:
+            results[i] = flights.do(key, func)
+        except Exception as e:
+            results[i] = e
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(WAITERS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    return results
+
+
+def _slow(calls, release, result):
+    def func():
+        calls.append(1)
+        release.wait(5)
+        if isinstance(result, Exception):
+            raise result
+        return result
+    return func
+
+
+def test_one_call_for_concurrent_waiters():
+    flights, calls, release = SingleFlight(), [], threading.Event()
+    threading.Timer(0.3, release.set).start()
+    results = _flight(flights, 'page', _slow(calls, release, {'rows': 3}))
+    assert len(calls) == 1
+    assert flights.coalesced == WAITERS - 1
+    assert all(result is results[0] for result in results)
+    assert results[0] == {'rows': 3}
+
+
+def test_error_reaches_every_waiter():
+    flights, calls, release = SingleFlight(), [], threading.Event()
+    error = ValueError('bad page')
+    threading.Timer(0.3, release.set).start()
+    results = _flight(flights, 'page', _slow(calls, release, error))
+    assert len(calls) == 1
+    assert all(result is error for result in results)
+
+
+def test_calls_after_a_flight_run_again():
+    flights = SingleFlight()
+    with pytest.raises(ValueError):
+        flights.do('page', lambda: int('x'))
+    assert flights.do('page', lambda: 1) == 1
+    assert flights.do('other', lambda: 2) == 2
+    assert flights.coalesced == 0
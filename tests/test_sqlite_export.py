@@ -0,0 +1,40 @@
+from sqlite_export import SQLiteExport
+
+
+def _match(code, birth_date=None):
+    player = {'PTS': 10}
+    if birth_date:
+        player['birth_date'] = birth_date
+    return {'code': code, 'country': 'United States', 'league': 'nba', 'season': '2014-2015',
+            'type': 'Season', 'date': '2014-10-28', 'time': '19:30:00', 'stadium': 'Staples Center',
+            'home': {'name': 'Los Angeles Lakers', 'totals': {'PTS': 90}, 'players': {'Jordan Clarkson': player}},
+            'away': {'name': 'Houston Rockets', 'totals': {'PTS': 108}, 'players': {}}}
+
+
+def _players(export):
+    return export.conn.execute('SELECT player_id, name, birth_date FROM players').fetchall()
+
+
+def test_players_get_their_birth_date_once_known(tmp_path):
+    export = SQLiteExport(str(tmp_path / 'basketball.db'))
+    export.upsert([_match('201410280LAL'), _match('201410300LAL')])
+    [(player_id, _, birth_date)] = _players(export)
+    assert birth_date == ''
+
+    export.upsert([_match('201410280LAL', '1992-06-07')])
+    assert _players(export) == [(player_id, 'Jordan Clarkson', '1992-06-07')]
+    # the lines of matches not enriched yet keep pointing to the same player
+    assert export.conn.execute('SELECT DISTINCT player_id FROM player_lines').fetchall() == [(player_id,)]
+
+    export.upsert([_match('201410300LAL', '1992-06-07')])
+    assert _players(export) == [(player_id, 'Jordan Clarkson', '1992-06-07')]
+
+
+def test_rows_without_birth_date_are_dropped_once_unused(tmp_path):
+    export = SQLiteExport(str(tmp_path / 'basketball.db'))
+    export.upsert([_match('201410280LAL', '1992-06-07')])
+    export.upsert([_match('201410300LAL')])
+    assert len(_players(export)) == 2
+
+    export.upsert([_match('201410300LAL', '1992-06-07')])
+    assert [name_birth[1:] for name_birth in _players(export)] == [('Jordan Clarkson', '1992-06-07')]
@@ -0,0 +1,32 @@
+import os
+import json
+
+import pytest
+
+import stream
+from nba import NbaBRefMatch, NbaStreamBRefMatch
+
+# box scores laid out as basketball reference pages: commented line score and four
+# factors, reserves separator rows, did not play reasons and overtimes
+BOXSCORES = os.path.join(os.path.dirname(__file__), 'fixtures', 'boxscores')
+CODES = sorted(filename[:-5] for filename in os.listdir(BOXSCORES) if filename.endswith('.html'))
+
+
+def _parse(match_class, code):
+    with open(os.path.join(BOXSCORES, code + '.html'), 'r') as f:
+        html = f.read()
+    match = match_class('united_states', 'nba', '2014-2015', code, 'Season')
+    match.parse(html)
+    return json.dumps(match.match_)
+
+
+@pytest.mark.parametrize('code', CODES)
+def test_stream_matches_soup(code):
+    assert _parse(NbaStreamBRefMatch, code) == _parse(NbaBRefMatch, code)
+
+
+@pytest.mark.parametrize('code', CODES)
+def test_stream_matches_soup_tag_by_tag(code, monkeypatch):
+    # tables that can't be read with regexes go through the tokenizer
+    monkeypatch.setattr(stream, '_plain_table', lambda html: False)
+    assert _parse(NbaStreamBRefMatch, code) == _parse(NbaBRefMatch, code)
@@ -0,0 +1,83 @@
+import json
+
+from validate import SeasonArrays, check_season, validate_season
+
+
+def _team(pts, opp_pts, players=5):
+    """
+    a consistent team line scoring pts, with players that played the whole game
+    """
+    fg, ft = divmod(pts, 2)
+    line = {'PTS': pts, 'FG': fg, 'FGA': fg + 10, '3P': 0, '3PA': 5, 'FT': ft, 'FTA': ft + 2,
+            'MP': 240, '+/-': pts - opp_pts}
+    shares = [pts // players] * players
+    shares[0] += pts - sum(shares)
+    return {
+        'name': 'team',
+        'totals': line,
+        'players': {'player {0}'.format(i): {'PTS': share, 'MP': 48.0, '+/-': pts - opp_pts,
+                                             'FG': 0, 'FGA': 1}
+                    for i, share in enumerate(shares)},
+        'scores': {'1': str(pts - 3 * (pts // 4)), '2': str(pts // 4), '3': str(pts // 4), '4': str(pts // 4),
+                   'T': str(pts)},
+    }
+
+
+def _match(code, home=100, away=90):
+    return {'code': code, 'home': _team(home, away), 'away': _team(away, home)}
+
+
+def _season(tmp_path, matches):
+    path = tmp_path / 'matches' / 'united_states' / 'nba' / '2014-2015'
+    path.mkdir(parents=True)
+    for match in matches:
+        (path / (match['code'] + '.json')).write_text(json.dumps(match))
+    return path
+
+
+def test_consistent_season_passes(tmp_path):
+    path = _season(tmp_path, [_match('201410280LAL'), _match('201410280SAS', 88, 101)])
+    _, n_matches, report = validate_season(str(path))
+    assert n_matches == 2
+    assert all(not codes for codes in report.values())
+
+
+def test_bad_season(tmp_path):
+    good = _match('201410280LAL')
+
+    points = _match('201410280SAS')
+    points['home']['players']['player 1']['PTS'] += 2
+
+    minutes = _match('201410290DAL')
+    minutes['away']['players']['player 2']['MP'] = 40.0
+    overtime = _match('201410290UTA')
+    overtime['home']['scores']['OT'] = overtime['away']['scores']['OT'] = '0'
+
+    plus_minus = _match('201410300BOS')
+    plus_minus['away']['totals']['+/-'] = 10
+    players_plus_minus = _match('201410300CHI')
+    players_plus_minus['home']['players']['player 0']['+/-'] = 0
+
+    made = _match('201410310DEN')
+    made['away']['players']['player 3'].update({'FG': 3, 'FGA': 2})
+    line_score = _match('201410310MIA')
+    line_score['home']['scores']['1'] = '0'
+
+    unreadable = _match('201411010NYK')
+    del unreadable['home']
+
+    path = _season(tmp_path, [good, points, minutes, overtime, plus_minus, players_plus_minus, made,
+                              line_score, unreadable])
+    arrays = SeasonArrays(str(path))
+    report = check_season('nba', arrays)
+
+    assert report['players_pts'] == ['201410280SAS']
+    assert report['team_pts'] == []
+    # nobody played the overtime
+    assert report['minutes'] == ['201410290DAL', '201410290UTA']
+    assert report['plus_minus'] == ['201410300BOS']
+    assert report['players_plus_minus'] == ['201410300BOS', '201410300CHI']
+    assert report['FG<=FGA'] == ['201410310DEN']
+    assert report['3P<=3PA'] == report['FT<=FTA'] == []
+    assert report['line_score'] == ['201410310MIA']
+    assert report['unreadable'] == ['201411010NYK']
@@ -0,0 +1,93 @@
+import threading
+
+import pytest
+
+import base
+import enrichment
+import wikibatch
+from replay import ReplayServer, ReplayConfig, PageStore
+
+INFOBOX = """{{{{Infobox basketball biography
+| name = {0}
+| height_ft = 6 | height_in = 5
+| weight_lb = 194
+| position = [[Point guard]]
+| birth_date = {{{{birth date and age|{1}|6|7}}}}
+| career_start = 2014
+| team1 = [[{2}]]
+}}}}
+'''{0}''' is a basketball player.
+
+== Career ==
+[[Other page]]"""
+
+PAGES = {
+    'Jordan Clarkson': INFOBOX.format('Jordan Clarkson', 1992, 'Los Angeles Lakers'),
+    'Wesley Johnson': '{{hndis}}\n* [[Wesley Johnson (basketball)]]\n* [[Wesley Johnson (footballer)]]',
+    'Wesley Johnson (basketball)': INFOBOX.format('Wesley Johnson', 1987, 'Los Angeles Lakers'),
+    'Wesley Johnson (footballer)': "'''Wesley Johnson''' is a footballer.",
+    'Ed Davis': '#REDIRECT [[Ed Davis (basketball)]]',
+    'Ed Davis (basketball)': INFOBOX.format('Ed Davis', 1989, 'Los Angeles Lakers'),
+    'JJ Redick': INFOBOX.format('JJ Redick', 1984, 'Los Angeles Clippers'),
+}
+
+
+@pytest.fixture
+def client(tmp_path):
+    (tmp_path / 'wiki').mkdir()
+    for title, text in PAGES.items():
+        (tmp_path / 'wiki' / title).write_text(text)
+    server = ReplayServer(('127.0.0.1', 0), PageStore(str(tmp_path)), ReplayConfig())
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield wikibatch.MediaWikiClient('http://127.0.0.1:{0}/w/api.php'.format(server.server_address[1]))
+    server.shutdown()
+    server.server_close()
+
+
+def test_players_are_resolved_in_batches(client):
+    players = [('Jordan Clarkson', 'Los Angeles Lakers'), ('Wesley Johnson', 'Los Angeles Lakers'),
+               ('Ed Davis', None), ('J. J. Redick', 'Los Angeles Clippers'), ('Nobody Here', None)]
+    infoboxes = client.resolve(players)
+    assert [infobox and infobox['title'] for infobox in infoboxes] == [
+        'Jordan Clarkson', 'Wesley Johnson (basketball)', 'Ed Davis (basketball)', 'JJ Redick', None]
+    assert infoboxes[0]['born'] == '1992-06-07'
+    assert infoboxes[0]['playing_career'] == '2014–present'
+    # titles, disambiguation links, their pages, a search per miss and the pages found
+    assert client.requests == 6
+
+
+def test_threaded_lookups_share_requests(client):
+    names = ['Jordan Clarkson', 'Ed Davis', 'Jordan Clarkson', 'Ed Davis'] * 5
+    threads = [threading.Thread(target=client.lookup, args=(name,)) for name in names]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert client.requests <= 2
+
+
+def test_bad_infoboxes_dont_fail_the_batch(client, monkeypatch):
+    davis = wikibatch.parse_infobox('Ed Davis (basketball)', PAGES['Ed Davis (basketball)'])
+    monkeypatch.setattr(wikibatch, 'CLIENT', client)
+    monkeypatch.setattr(client, 'resolve', lambda players: [{'title': 'Jordan Clarkson'}, davis])
+    monkeypatch.setattr(enrichment.PlayerBasicInfo, '_player_basic_info_from_index', lambda self: None)
+    monkeypatch.setattr(base, 'CACHE_PLAYERS_BASIC_INFO', {})
+    stage = enrichment.EnrichmentStage('united_states', 'nba', '2014-2015')
+    stage.pending.players = {name: {'team': 'Los Angeles Lakers', 'matches': {}}
+                             for name in ['Jordan Clarkson', 'Ed Davis']}
+    infos = stage._resolve_batched(['Jordan Clarkson', 'Ed Davis'])
+    assert infos[0] is None
+    assert infos[1]['birth_date'] == '1989-06-07'
+
+
+def test_configure_closes_the_previous_client(client, monkeypatch):
+    monkeypatch.setattr(wikibatch, 'CLIENT', client)
+    queued = threading.Thread(target=client.lookup, args=('Jordan Clarkson',))
+    queued.start()
+    wikibatch.configure(False)
+    queued.join(1)
+    assert not queued.is_alive()
+    assert not client._thread.is_alive()
+    assert wikibatch.CLIENT is None
+    # a caller still holding the closed client gets its answer without the thread
+    assert client.lookup('Ed Davis')['title'] == 'Ed Davis (basketball)'
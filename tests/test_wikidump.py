@@ -0,0 +1,109 @@
+import bz2
+
+from base import PlayerBasicInfo
+from wikidump import PlayerIndex, iter_pages, parse_infobox
+
+DUMP = """<mediawiki xmlns="http://www.mediawiki.org/xml/export-0.10/">
+  <siteinfo><sitename>Wikipedia</sitename></siteinfo>
+  <page><title>Jordan Clarkson</title><ns>0</ns><revision><text>{0}</text></revision></page>
+  <page><title>Talk:Jordan Clarkson</title><ns>1</ns><revision><text>talk</text></revision></page>
+  <page><title>Wesley Johnson</title><ns>0</ns><revision><text>{1}</text></revision></page>
+</mediawiki>"""
+
+CLARKSON = """{{{{Infobox basketball biography
+| name = Jordan Clarkson
+| career_start = [[2014 NBA draft|2014]]
+| career_end = {0}
+}}}}
+'''Jordan Clarkson''' is a basketball player."""
+
+
+def test_pages_are_read_in_order(tmp_path):
+    path = tmp_path / 'dump.xml'
+    path.write_text(DUMP.format('first', 'second'))
+    assert list(iter_pages(str(path))) == [('Jordan Clarkson', 'first'), ('Wesley Johnson', 'second')]
+
+
+def test_career_years_are_normalized():
+    assert parse_infobox('Jordan Clarkson', CLARKSON.format(''))['playing_career'] == '2014–present'
+    assert parse_infobox('Jordan Clarkson', CLARKSON.format('2019<ref>stats</ref>'))['playing_career'] == '2014–2019'
+    assert parse_infobox('Jordan Clarkson', CLARKSON.format('c. 2020s'))['playing_career'] == '2014–present'
+    assert parse_infobox('Jordan Clarkson', CLARKSON.replace('[[2014 NBA draft|2014]]', 'unknown')
+                         .format(''))['playing_career'] is None
+
+
+def test_unreadable_careers_have_no_experience():
+    player = PlayerBasicInfo('Jordan Clarkson', None, 'Los Angeles Lakers')
+    assert player._get_experience('2014–2019') == 5
+    assert player._get_experience('2014-15–2019') is None
+    assert player._get_experience('2014') is None
+
+
+INDEX_DUMP = """<mediawiki xmlns="http://www.mediawiki.org/xml/export-0.10/">
+  <page><title>Tony Parker</title><ns>0</ns><revision><text>{{Infobox basketball biography
+| name = Tony Parker
+| height_ft = 6 | height_in = 2
+| weight_lb = 185
+| position = [[Point guard]]
+| birth_date = {{birth date and age|1982|5|17}}
+| career_start = 2001
+| team1 = [[San Antonio Spurs]]
+}}</text></revision></page>
+  <page><title>Marcus Williams (basketball, born 1986)</title><ns>0</ns><revision><text>{{Infobox basketball biography
+| height_m = 1.91
+| weight_kg = 93
+| position = [[Point guard]]
+| birth_date = {{birth date and age|df=yes|1986|12|3}}
+| team1 = [[New Jersey Nets]]
+}}</text></revision></page>
+  <page><title>Marcus Williams (basketball, born 1985)</title><ns>0</ns><revision><text>{{Infobox basketball biography
+| name = Marcus Williams
+| height_cm = 201
+| weight_lbs = 205
+| position = [[Small forward]] / [[Power forward]]
+| birth_date = {{birth date and age|1985|11|18}}
+| team1 = [[Seattle SuperSonics]]
+| team2 = [[San Antonio Spurs]]
+}}</text></revision></page>
+  <page><title>José Calderón</title><ns>0</ns><revision><text>{{Infobox basketball biography
+| height_ft = 6 | height_in = 3
+| birth_date = {{birth date|1981|9|28}}
+}}</text></revision></page>
+  <page><title>San Antonio Spurs</title><ns>0</ns><revision><text>{{Infobox basketball club}}</text></revision></page>
+</mediawiki>"""
+
+
+def test_index_round_trip(tmp_path):
+    dump = tmp_path / 'dump.xml.bz2'
+    with bz2.open(str(dump), 'wt', encoding='utf-8') as f:
+        f.write(INDEX_DUMP)
+    index = PlayerIndex(str(tmp_path / 'players.db'))
+    index.build(str(dump), batch=2)
+
+    parker = index.lookup('Tony Parker')
+    assert parker['height'] == 1.88
+    assert parker['weight'] == 83.9
+    assert parker['born'] == '1982-05-17'
+    assert parker['position'] == 'Point guard'
+    assert parker['playing_career'] == '2001–present'
+
+    # players with the same name: the youngest, unless the other one played for the team
+    youngest = index.lookup('Marcus Williams')
+    assert youngest['title'] == 'Marcus Williams (basketball, born 1986)'
+    assert youngest['name'] == 'Marcus Williams'
+    assert (youngest['height'], youngest['weight'], youngest['born']) == (1.91, 93, '1986-12-03')
+    sonic = index.lookup('marcus williams', 'Seattle SuperSonics')
+    assert sonic['title'] == 'Marcus Williams (basketball, born 1985)'
+    assert (sonic['height'], sonic['weight'], sonic['born']) == (2.01, 93.0, '1985-11-18')
+    assert sonic['position'] == 'Small forward / Power forward'
+    assert index.lookup('Marcus Williams', 'Los Angeles Lakers')['born'] == '1986-12-03'
+
+    calderon = index.lookup('Jose Calderon')
+    assert (calderon['height'], calderon['born'], calderon['weight']) == (1.91, '1981-09-28', None)
+    assert index.lookup('Tim Duncan') is None
+    assert index.lookup('San Antonio Spurs') is None
+
+    # building again replaces the index
+    index.build(str(dump))
+    assert index.conn.execute('SELECT COUNT(*) FROM players').fetchone()[0] == 4
+    index.close()
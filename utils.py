@@ -2,11 +2,13 @@ import datetime
 import signal
 from functools import wraps
 import wikipedia
-import requests
 from bs4 import BeautifulSoup
 from Levenshtein import ratio
 
-from constants import MONTHS
+from constants import MONTHS, WIKIPEDIA_API_URL
+from memory import release_tree, low_memory
+
+wikipedia.wikipedia.API_URL = WIKIPEDIA_API_URL
 
 
 class NoTeamException(Exception):
@@ -17,6 +19,25 @@ class TimeoutException(Exception):
     pass
 
 
+class TransientHTTPException(Exception):
+    """
+    raised when basketball reference answers with an error that is worth retrying
+    (rate limiting or server side failures)
+    """
+    def __init__(self, status_code, retry_after=None):
+        super().__init__('HTTP {0}'.format(status_code))
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class ParseException(Exception):
+    pass
+
+
+class EnrichmentException(Exception):
+    pass
+
+
 class Wikipedia:
     """
     Clean API for accessing information in a wikipedia page
@@ -47,7 +68,14 @@ class Wikipedia:
 
     @property
     def summary(self):
-        return self.page.summary
+        return self.page.summary if self.page is not None else None
+
+    def release(self):
+        """
+        drops the page and its parse tree, keeping the infobox
+        """
+        release_tree(self.soup)
+        self.soup = self.page = None
 
     def __getattr__(self, name):
         """
@@ -87,12 +115,18 @@ class WikipediaPlayer(Wikipedia):
                     continue
                 self.soup = BeautifulSoup(wiki_player.html())
                 if team not in str(self.soup):
+                    if low_memory():
+                        release_tree(self.soup)
                     continue
                 self._gen_table()
                 yob = int(self.born[1:5])
                 if best_yob is None or self.birth > best_yob:
+                    if low_memory() and best_candidate is not None:
+                        release_tree(best_candidate)
                     best_yob = yob
                     best_candidate = self.soup
+                elif low_memory():
+                    release_tree(self.soup)
         self.soup = best_candidate
 
 
@@ -142,6 +176,18 @@ def timeout(func):
     return wrapper
 
 
+def check_response(rv):
+    """
+    raises TransientHTTPException for responses worth retrying and HTTPError
+    for any other failed response
+    """
+    if rv.status_code == 429 or rv.status_code >= 500:
+        retry_after = rv.headers.get('Retry-After')
+        retry_after = float(retry_after) if retry_after and retry_after.isdigit() else None
+        raise TransientHTTPException(rv.status_code, retry_after)
+    rv.raise_for_status()
+
+
 def convert_12_to_24(time):
     formatted_time = datetime.datetime.strptime(time, '%I:%M %p')
     formatted_time = datetime.time(formatted_time.hour, formatted_time.minute)
@@ -212,29 +258,11 @@ def get_bucket(prob):
 
 def get_dates(season, info):
     """
-    returns list of dates in which matches were played in the season
+    returns list of dates in which matches were played in the season,
+    see schedule.get_dates
     """
-    url = 'http://www.basketball-reference.com/leagues/NBA_{0}_games.html'.format(season.split('-')[-1])
-    rv = requests.get(url)
-    soup = BeautifulSoup(rv.text)
-    seasons = soup.find_all('table', {'class': 'sortable  stats_table'})
-    if len(seasons) == 2:
-        reg_season, post_season = seasons
-    else:
-        reg_season, post_season = seasons[0], None
-    dates = set()
-    for table in [reg_season, post_season]:
-        if table:
-            rows = table.tbody.find_all('tr')
-            for row in rows:
-                match = row.find('a', href=True, text='Box Score')
-                if match:
-                    match_code = match['href'].split('/')[2].split('.')[0]
-                    date = match_code[:-4]
-                    if info == 'money_lines':
-                        date = "-".join([date[:4], date[4:6], date[6:]])
-                    dates.add(date)
-    return sorted(list(dates))
+    import schedule
+    return schedule.get_dates(season, info)
 
 
 def convert_odds(odds):
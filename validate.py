@@ -0,0 +1,195 @@
+import os
+import json
+import glob
+import time
+import logging, logging.config
+from multiprocessing import Pool, cpu_count
+from argparse import ArgumentParser
+
+import numpy as np
+
+from constants import REGULATION_MINUTES, OVERTIME_MINUTES
+
+with open('logging.json', 'r') as f:
+    logging.config.dictConfig(json.load(f))
+logger = logging.getLogger('stringer-bell')
+
+# stats read from every team and player line
+CHECKED_STATS = ['MP', 'PTS', 'FG', 'FGA', '3P', '3PA', 'FT', 'FTA', '+/-']
+_COL = {stat: i for i, stat in enumerate(CHECKED_STATS)}
+# line score periods that aren't overtimes
+PERIODS = {'1', '2', '3', '4', 'T'}
+# allowed difference between the minutes played by a team's players and the game length
+MINUTES_TOLERANCE = 1.0
+
+
+def _line(stats):
+    values = []
+    for stat in CHECKED_STATS:
+        value = stats.get(stat)
+        values.append(value if isinstance(value, (int, float)) else np.nan)
+    return values
+
+
+def _score(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+class SeasonArrays:
+    """
+    team and player lines of every match of a season as arrays, two team lines per
+    match (home first) and player lines pointing to their team line
+    """
+    def __init__(self, path):
+        self.codes = []
+        self.unreadable = []
+        teams, players, owners, overtimes, scores = [], [], [], [], []
+        for filename in sorted(os.listdir(path)):
+            if not filename.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(path, filename), 'r') as f:
+                    match = json.load(f)
+                lines = [match[team] for team in ['home', 'away']]
+                rows = [_line(line['totals']) for line in lines]
+            except (ValueError, KeyError, TypeError):
+                self.unreadable.append(filename[:-len('.json')])
+                continue
+            self.codes.append(match.get('code', filename[:-len('.json')]))
+            for line, row in zip(lines, rows):
+                owner = len(teams)
+                teams.append(row)
+                for stats in line.get('players', {}).values():
+                    players.append(_line(stats))
+                    owners.append(owner)
+                line_score = line.get('scores', {})
+                overtimes.append(sum(1 for period in line_score if period not in PERIODS))
+                scores.append([sum(_score(v) for p, v in line_score.items() if p != 'T')
+                               if line_score else np.nan, _score(line_score.get('T'))])
+
+        width = len(CHECKED_STATS)
+        self.teams = np.array(teams, dtype=float).reshape(-1, width)
+        self.players = np.array(players, dtype=float).reshape(-1, width)
+        self.owners = np.array(owners, dtype=int)
+        self.overtimes = np.array(overtimes, dtype=int)
+        self.scores = np.array(scores, dtype=float).reshape(-1, 2)
+
+    def player_sum(self, stat):
+        """
+        sum of a stat over the players of every team line, and whether any player had it.
+        players that didn't play count as zero
+        """
+        values = self.players[:, _COL[stat]]
+        known = ~np.isnan(values)
+        total = np.bincount(self.owners, weights=np.where(known, values, 0), minlength=len(self.teams))
+        counted = np.bincount(self.owners, weights=known, minlength=len(self.teams))
+        return total, counted > 0
+
+    def team(self, stat):
+        return self.teams[:, _COL[stat]]
+
+
+def _codes(arrays, bad_lines):
+    """
+    codes of the matches with any offending team line
+    """
+    return sorted({arrays.codes[i // 2] for i in np.flatnonzero(bad_lines)})
+
+
+def check_season(league, arrays):
+    """
+    runs every check over a season, returns {check: offending match codes}
+    """
+    report = {}
+    pts = arrays.team('PTS')
+
+    players_pts, known = arrays.player_sum('PTS')
+    report['players_pts'] = _codes(arrays, known & (players_pts != pts))
+
+    # comparisons with a missing stat are false, except !=
+    made_pts = 2 * arrays.team('FG') + arrays.team('3P') + arrays.team('FT')
+    report['team_pts'] = _codes(arrays, ~np.isnan(made_pts) & (made_pts != pts))
+
+    for made, attempted in [('FG', 'FGA'), ('3P', '3PA'), ('FT', 'FTA')]:
+        bad = arrays.team(made) > arrays.team(attempted)
+        bad_players = arrays.players[:, _COL[made]] > arrays.players[:, _COL[attempted]]
+        bad[arrays.owners[bad_players]] = True
+        report['{0}<={1}'.format(made, attempted)] = _codes(arrays, bad)
+
+    minutes, known = arrays.player_sum('MP')
+    expected = REGULATION_MINUTES.get(league, REGULATION_MINUTES['default']) + \
+        OVERTIME_MINUTES * arrays.overtimes
+    report['minutes'] = _codes(arrays, known & (np.abs(minutes - expected) > MINUTES_TOLERANCE))
+
+    home, away = arrays.teams[0::2], arrays.teams[1::2]
+    diff = home[:, _COL['PTS']] - away[:, _COL['PTS']]
+    bad = ~np.isnan(diff) & ((home[:, _COL['+/-']] != diff) | (away[:, _COL['+/-']] != -diff))
+    report['plus_minus'] = _codes(arrays, np.repeat(bad, 2))
+    # every point is on the floor with five players of each team
+    players_pm, known = arrays.player_sum('+/-')
+    report['players_plus_minus'] = _codes(arrays, known & (players_pm != 5 * arrays.team('+/-')))
+
+    known = ~np.isnan(arrays.scores[:, 1])
+    report['line_score'] = _codes(arrays, known & ((arrays.scores[:, 0] != arrays.scores[:, 1]) |
+                                                   (arrays.scores[:, 1] != pts)))
+    report['unreadable'] = arrays.unreadable
+    return report
+
+
+def validate_season(path):
+    """
+    validates the stored matches of ./matches/<country>/<league>/<season>
+    """
+    league = os.path.basename(os.path.dirname(path))
+    arrays = SeasonArrays(path)
+    return path, len(arrays.codes), check_season(league, arrays)
+
+
+def find_seasons(root='./matches', leagues=None, seasons=None):
+    paths = []
+    for path in sorted(glob.glob(os.path.join(root, '*', '*', '*'))):
+        league, season = path.split(os.sep)[-2:]
+        if os.path.isdir(path) and (not leagues or league in leagues) and (not seasons or season in seasons):
+            paths.append(path)
+    return paths
+
+
+def validate(paths, processes=None):
+    """
+    validates every season in its own process. returns {season path: {check: codes}}
+    only with the failing checks, and the number of matches validated
+    """
+    report, n_matches = {}, 0
+    with Pool(processes or cpu_count()) as pool:
+        for path, n, checks in pool.imap_unordered(validate_season, paths):
+            n_matches += n
+            failed = {check: codes for check, codes in checks.items() if codes}
+            if failed:
+                report[path] = failed
+    return report, n_matches
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('--root', default='./matches')
+    parser.add_argument('--leagues', nargs='+')
+    parser.add_argument('--seasons', nargs='+')
+    parser.add_argument('--processes', type=int)
+    parser.add_argument('--output', help='json file where the full report is written')
+    args = parser.parse_args()
+
+    start = time.time()
+    paths = find_seasons(args.root, args.leagues, args.seasons)
+    report, n_matches = validate(paths, args.processes)
+    logger.info('Validated {0} matches of {1} seasons in {2:.1f}s'.format(n_matches, len(paths),
+                                                                         time.time() - start))
+    for path in sorted(report):
+        for check, codes in sorted(report[path].items()):
+            logger.info('{0} {1}: {2} matches {3}{4}'.format(path, check, len(codes), ' '.join(codes[:5]),
+                                                            ' ...' if len(codes) > 5 else ''))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
@@ -0,0 +1,247 @@
+import re
+import json
+import time
+import threading
+import logging, logging.config
+
+import requests
+
+from constants import WIKIPEDIA_API_URL, USER_AGENTS
+from utils import check_response
+from wikidump import parse_infobox, best_entry
+
+with open('logging.json', 'r') as f:
+    logging.config.dictConfig(json.load(f))
+logger = logging.getLogger('stringer-bell')
+
+# most titles the api takes in a request
+BATCH_SIZE = 50
+# pages a search for a player not found by title looks at
+SEARCH_LIMIT = 5
+
+# MediaWikiClient used by base.PlayerBasicInfo instead of a wikipedia page per player, None when off
+CLIENT = None
+
+
+class _Lookup:
+
+    def __init__(self, name, team):
+        self.name = name
+        self.team = team
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class MediaWikiClient:
+    """
+    looks players up in the mediawiki api in batches of BATCH_SIZE titles per request,
+    asking only for the wikitext of the lead section, where the infobox is.
+    disambiguation pages are followed with batched requests for their links as well.
+    lookups from several threads arriving within max_wait seconds are sent together.
+    names with no page of their own are searched for, and the pages found fetched in
+    batches too
+    """
+    def __init__(self, api_url=WIKIPEDIA_API_URL, batch_size=BATCH_SIZE, max_wait=0.2):
+        self.api_url = api_url
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        # round trips to the api
+        self.requests = 0
+        self._requests_lock = threading.Lock()
+        self._pending = []
+        self._closed = False
+        self._cond = threading.Condition()
+        self._session = requests.Session()
+        self._session.headers['User-Agent'] = USER_AGENTS[0]
+        self._thread = threading.Thread(target=self._dispatch, daemon=True)
+        self._thread.start()
+
+    def lookup(self, name, team=None):
+        """
+        infobox fields of a player, as wikidump.parse_infobox, or None if there is no
+        page with a basketball infobox for the name. waits for the batch it goes in
+        """
+        lookup = _Lookup(name, team)
+        with self._cond:
+            if self._closed:
+                # callers still holding a closed client resolve the player on their own
+                return self.resolve([(name, team)])[0]
+            self._pending.append(lookup)
+            self._cond.notify()
+        lookup.done.wait()
+        if lookup.error is not None:
+            raise lookup.error
+        return lookup.result
+
+    def _dispatch(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+                deadline = time.time() + self.max_wait
+                while len(self._pending) < self.batch_size and time.time() < deadline and not self._closed:
+                    self._cond.wait(deadline - time.time())
+                lookups, self._pending = self._pending, []
+            try:
+                results = self.resolve([(lookup.name, lookup.team) for lookup in lookups])
+            except Exception as e:
+                logger.warning('Wikipedia batch of {0} players failed: {1!r}'.format(len(lookups), e))
+                for lookup in lookups:
+                    lookup.error = e
+                    lookup.done.set()
+                continue
+            for lookup, result in zip(lookups, results):
+                lookup.result = result
+                lookup.done.set()
+
+    def resolve(self, players):
+        """
+        infobox fields of every (name, team) in players, or None for the ones not found
+        """
+        names = list(dict.fromkeys(name for name, _ in players))
+        pages = self._pages(names)
+
+        entries, ambiguous = {}, []
+        for name in names:
+            page = pages.get(name)
+            if page is None:
+                continue
+            if 'disambiguation' in page.get('pageprops', {}):
+                ambiguous.append(name)
+            else:
+                entries[name] = [parse_infobox(page['title'], _content(page))]
+
+        if ambiguous:
+            links = self._links([pages[name]['title'] for name in ambiguous])
+            options = {name: [title for title in links.get(pages[name]['title'], [])
+                              if 'disambiguation' not in title] for name in ambiguous}
+            candidates = self._pages(list(dict.fromkeys(title for titles in options.values() for title in titles)))
+            for name in ambiguous:
+                entries[name] = [parse_infobox(candidates[title]['title'], _content(candidates[title]))
+                                 for title in options[name] if title in candidates]
+
+        misses = [name for name in names if not any(entries.get(name, []))]
+        if misses:
+            entries.update(self._search(misses))
+
+        return [best_entry([entry for entry in entries.get(name, []) if entry], team) for name, team in players]
+
+    def _search(self, names):
+        """
+        infoboxes of the pages a full text search finds for every name, keeping only
+        the ones of players with that name. the api searches one text per request,
+        but the pages found for all names are fetched together
+        """
+        found = {}
+        for name in names:
+            rv = self._get({'action': 'query', 'format': 'json', 'formatversion': 2, 'list': 'search',
+                            'srsearch': '{0} basketball'.format(name), 'srlimit': SEARCH_LIMIT,
+                            'srnamespace': 0, 'srprop': ''})
+            found[name] = [result['title'] for result in rv.json().get('query', {}).get('search', [])]
+        pages = self._pages(list(dict.fromkeys(title for titles in found.values() for title in titles)))
+        entries = {}
+        for name, titles in found.items():
+            infoboxes = [parse_infobox(pages[title]['title'], _content(pages[title]))
+                         for title in titles if title in pages]
+            entries[name] = [infobox for infobox in infoboxes
+                             if infobox and _same_name(infobox['name'], name)]
+        return entries
+
+    def _pages(self, titles):
+        """
+        pages of titles with the wikitext of their lead section, by the title asked for.
+        missing pages are left out
+        """
+        pages = {}
+        for i in range(0, len(titles), self.batch_size):
+            batch = titles[i:i + self.batch_size]
+            found, aliases = self._query(batch, {'prop': 'revisions|pageprops', 'rvprop': 'content',
+                                                 'rvslots': 'main', 'rvsection': 0,
+                                                 'ppprop': 'disambiguation', 'redirects': 1})
+            for title in batch:
+                page = found.get(aliases.get(title, title))
+                if page is not None and not page.get('missing'):
+                    pages[title] = page
+        return pages
+
+    def _links(self, titles):
+        """
+        titles of the articles linked from every page
+        """
+        links = {}
+        for i in range(0, len(titles), self.batch_size):
+            found, _ = self._query(titles[i:i + self.batch_size], {'prop': 'links', 'plnamespace': 0,
+                                                                   'pllimit': 'max'})
+            for title, page in found.items():
+                links[title] = [link['title'] for link in page.get('links', [])]
+        return links
+
+    def _query(self, titles, params):
+        """
+        runs a query over titles following its continuations. returns the pages by
+        title and the title every asked title was normalized or redirected to
+        """
+        params = dict(params, action='query', format='json', formatversion=2, titles='|'.join(titles))
+        pages, aliases = {}, {}
+        while True:
+            data = self._get(params).json()
+            query = data.get('query', {})
+            for alias in query.get('normalized', []) + query.get('redirects', []):
+                aliases[alias['from']] = alias['to']
+            for page in query.get('pages', []):
+                merged = pages.setdefault(page['title'], page)
+                if merged is not page:
+                    for key in ['revisions', 'links']:
+                        if key in page:
+                            merged[key] = merged.get(key, []) + page[key]
+            if 'continue' not in data:
+                break
+            params.update(data['continue'])
+        # redirects apply after normalization
+        for title in titles:
+            target = aliases.get(title, title)
+            aliases[title] = aliases.get(target, target)
+        return pages, aliases
+
+    def _get(self, params):
+        rv = self._session.get(self.api_url, params=params)
+        with self._requests_lock:
+            self.requests += 1
+        check_response(rv)
+        return rv
+
+    def close(self):
+        """
+        stops the dispatch thread once the lookups already queued are answered
+        """
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+        self._session.close()
+
+
+def _same_name(a, b):
+    """
+    whether two spellings are of the same name, as 'J. J. Redick' and 'JJ Redick'
+    """
+    return re.sub(r'[\W_]', '', a.lower()) == re.sub(r'[\W_]', '', b.lower())
+
+
+def _content(page):
+    revisions = page.get('revisions') or [{}]
+    return revisions[0].get('slots', {}).get('main', {}).get('content', '')
+
+
+def configure(enabled, api_url=WIKIPEDIA_API_URL):
+    """
+    makes PlayerBasicInfo look players up with batched api requests, or with a
+    wikipedia page per player when not enabled
+    """
+    global CLIENT
+    if CLIENT is not None:
+        CLIENT.close()
+    CLIENT = MediaWikiClient(api_url) if enabled else None
@@ -0,0 +1,304 @@
+import os
+import re
+import bz2
+import json
+import sqlite3
+import threading
+import unicodedata
+import logging, logging.config
+from xml.etree.ElementTree import iterparse
+from argparse import ArgumentParser
+
+with open('logging.json', 'r') as f:
+    logging.config.dictConfig(json.load(f))
+logger = logging.getLogger('stringer-bell')
+
+INFOBOX_RE = re.compile(r'\{\{\s*Infobox basketball biography', re.I)
+COMMENT_RE = re.compile(r'<!--.*?-->', re.S)
+REF_RE = re.compile(r'<ref[^>/]*/>|<ref[^>]*>.*?</ref>', re.S | re.I)
+BR_RE = re.compile(r'<br\s*/?>', re.I)
+TAG_RE = re.compile(r'<[^>]+>')
+LINK_RE = re.compile(r'\[\[(?:[^|\]]*\|)?([^\]]*)\]\]')
+TEMPLATE_RE = re.compile(r'\{\{[^{}]*\}\}')
+TITLE_SUFFIX_RE = re.compile(r'\s*\([^)]*\)$')
+TEAM_FIELD_RE = re.compile(r'^(team\d+|college|highschool)$')
+DATE_ARGS_RE = re.compile(r'^\d{1,4}$')
+YEAR_RE = re.compile(r'\b(\d{4})\b')
+
+FIELDS = ['name', 'height', 'weight', 'position', 'born', 'playing_career']
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS players (
+    player_id INTEGER PRIMARY KEY, title TEXT, name TEXT, height REAL, weight REAL,
+    position TEXT, born TEXT, playing_career TEXT, teams TEXT
+);
+CREATE TABLE IF NOT EXISTS names (key TEXT, player_id INTEGER REFERENCES players);
+CREATE INDEX IF NOT EXISTS names_key ON names (key);
+"""
+
+# PlayerIndex used by base.PlayerBasicInfo before going to wikipedia, None when there is none
+INDEX = None
+
+
+def name_key(name):
+    """
+    name without accents, punctuation, case or a disambiguation suffix
+    """
+    name = TITLE_SUFFIX_RE.sub('', name)
+    name = unicodedata.normalize('NFKD', name).encode('ascii', 'ignore').decode('ascii')
+    return ' '.join(re.sub(r'[^a-z0-9 ]', '', name.lower().replace('-', ' ')).split())
+
+
+def _template(text, start):
+    """
+    text of the template starting at start, up to its matching braces
+    """
+    depth, i = 0, start
+    while i < len(text) - 1:
+        pair = text[i:i + 2]
+        if pair == '{{':
+            depth += 1
+            i += 2
+        elif pair == '}}':
+            depth -= 1
+            i += 2
+            if depth == 0:
+                return text[start:i]
+        else:
+            i += 1
+    return text[start:]
+
+
+def _params(template):
+    """
+    named parameters of a template, splitting only on the pipes outside of nested
+    templates and links
+    """
+    body = template[2:-2]
+    params, parts, current, depth = {}, [], [], 0
+    i = 0
+    while i < len(body):
+        pair = body[i:i + 2]
+        if pair in ('{{', '[['):
+            depth += 1
+            current.append(pair)
+            i += 2
+        elif pair in ('}}', ']]'):
+            depth -= 1
+            current.append(pair)
+            i += 2
+        else:
+            if body[i] == '|' and depth == 0:
+                parts.append(''.join(current))
+                current = []
+            else:
+                current.append(body[i])
+            i += 1
+    parts.append(''.join(current))
+    for part in parts[1:]:
+        if '=' in part:
+            key, value = part.split('=', 1)
+            params[key.strip().lower()] = value.strip()
+    return params
+
+
+def _clean(value):
+    value = BR_RE.sub(' / ', value)
+    value = TAG_RE.sub('', value)
+    value = LINK_RE.sub(r'\1', value)
+    while TEMPLATE_RE.search(value):
+        value = TEMPLATE_RE.sub('', value)
+    return ' '.join(value.replace("'''", '').replace("''", '').split()).strip(' /,')
+
+
+def _number(value):
+    try:
+        return float(_clean(value).replace(',', ''))
+    except ValueError:
+        return None
+
+
+def _born(value):
+    """
+    yyyy-mm-dd from a {{birth date and age|1984|12|30}} like template
+    """
+    match = re.search(r'\{\{\s*birth[ _]date[^{}]*\}\}', value, re.I)
+    if not match:
+        return None
+    args = [arg.strip() for arg in match.group(0)[2:-2].split('|')[1:]]
+    numbers = [arg for arg in args if DATE_ARGS_RE.match(arg)][:3]
+    if len(numbers) < 3:
+        return None
+    return '{0:04d}-{1:02d}-{2:02d}'.format(*map(int, numbers))
+
+
+def parse_infobox(title, text):
+    """
+    fields of the basketball infobox of a page's wikitext, in the units and formats
+    base.PlayerBasicInfo uses: meters, kilograms, 'yyyy-mm-dd' and 'start–end'. None
+    if the page has none
+    """
+    text = REF_RE.sub('', COMMENT_RE.sub('', text))
+    found = INFOBOX_RE.search(text)
+    if not found:
+        return None
+    params = _params(_template(text, found.start()))
+
+    height = None
+    if params.get('height_ft'):
+        feet, inches = _number(params['height_ft']), _number(params.get('height_in') or '0')
+        if feet is not None:
+            height = round(feet * 0.3048 + (inches or 0) * 0.0254, 2)
+    elif params.get('height_m'):
+        height = _number(params['height_m'])
+    elif params.get('height_cm'):
+        centimeters = _number(params['height_cm'])
+        height = centimeters / 100 if centimeters else None
+    weight = None
+    if params.get('weight_lb') or params.get('weight_lbs'):
+        pounds = _number(params.get('weight_lb') or params.get('weight_lbs'))
+        weight = round(pounds * 0.45359237, 1) if pounds else None
+    elif params.get('weight_kg'):
+        weight = _number(params['weight_kg'])
+
+    # career years are kept as 4 digit years, whatever the infobox wrote around them
+    playing_career = None
+    start = YEAR_RE.search(_clean(params.get('career_start', '')))
+    end = YEAR_RE.search(_clean(params.get('career_end', '')))
+    if start:
+        playing_career = '{0}–{1}'.format(start.group(1), end.group(1) if end else 'present')
+
+    positions = [position.strip() for position in re.split(r'[/,]', _clean(params.get('position', '')))]
+    teams = sorted({_clean(value) for key, value in params.items() if TEAM_FIELD_RE.match(key) and value})
+    return {
+        'title': title,
+        'name': _clean(params.get('name', '')) or TITLE_SUFFIX_RE.sub('', title),
+        'height': height,
+        'weight': weight,
+        'position': ' / '.join(position for position in positions if position) or None,
+        'born': _born(params.get('birth_date', '')),
+        'playing_career': playing_career,
+        'teams': ' | '.join(teams),
+    }
+
+
+def best_entry(entries, team=None):
+    """
+    the infobox among the ones of players with the same name that most likely is the
+    player's: the ones who played for team come first, then the youngest, as
+    WikipediaPlayer does. None if there are none
+    """
+    if not entries:
+        return None
+    return max(entries, key=lambda entry: (bool(team) and team.lower() in (entry['teams'] or '').lower(),
+                                           entry['born'] or ''))
+
+
+def iter_pages(dump):
+    """
+    (title, wikitext) of every article of a pages-articles xml dump, bz2 or plain
+    """
+    opener = bz2.open if dump.endswith('.bz2') else open
+    with opener(dump, 'rb') as f:
+        root, title, ns = None, None, None
+        for event, elem in iterparse(f, events=('start', 'end')):
+            if root is None:
+                root = elem
+            if event == 'start':
+                continue
+            tag = elem.tag.rsplit('}', 1)[-1]
+            if tag == 'title':
+                title = elem.text
+            elif tag == 'ns':
+                ns = elem.text
+            elif tag == 'text' and ns == '0' and elem.text and title:
+                yield title, elem.text
+            elif tag == 'page':
+                # read pages are dropped from the root too, or their empty elements
+                # pile up in it over the whole dump
+                root.clear()
+
+
+class PlayerIndex:
+    """
+    basketball players infoboxes from a wikipedia dump, keyed by page title and
+    infobox name
+    """
+    def __init__(self, path='./wikipedia/players.db'):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def build(self, dump, batch=1000):
+        """
+        indexes every page of the dump with a basketball infobox
+        """
+        columns = ['title', 'name', 'height', 'weight', 'position', 'born', 'playing_career', 'teams']
+        rows, n_pages = [], 0
+        with self.conn:
+            self.conn.execute('DELETE FROM names')
+            self.conn.execute('DELETE FROM players')
+        for title, text in iter_pages(dump):
+            n_pages += 1
+            if not INFOBOX_RE.search(text):
+                continue
+            player = parse_infobox(title, text)
+            if player is None:
+                continue
+            rows.append([player[column] for column in columns])
+            if len(rows) >= batch:
+                self._insert(columns, rows)
+                rows = []
+        self._insert(columns, rows)
+        n_players = self.conn.execute('SELECT COUNT(*) FROM players').fetchone()[0]
+        logger.info('Indexed {0} players out of {1} pages'.format(n_players, n_pages))
+
+    def _insert(self, columns, rows):
+        with self._lock, self.conn:
+            for row in rows:
+                cursor = self.conn.execute('INSERT INTO players ({0}) VALUES ({1})'.format(
+                                           ', '.join(columns), ', '.join('?' * len(columns))), row)
+                keys = {name_key(row[0]), name_key(row[1])}
+                self.conn.executemany('INSERT INTO names VALUES (?, ?)',
+                                      [(key, cursor.lastrowid) for key in keys if key])
+
+    def lookup(self, name, team=None):
+        """
+        infobox fields of the player, or None
+        """
+        with self._lock:
+            rows = self.conn.execute(
+                'SELECT DISTINCT p.title, p.name, p.height, p.weight, p.position, p.born, p.playing_career, p.teams '
+                'FROM names n JOIN players p ON p.player_id = n.player_id WHERE n.key = ?',
+                (name_key(name),)).fetchall()
+        return best_entry([dict(zip(['title'] + FIELDS + ['teams'], row)) for row in rows], team)
+
+    def close(self):
+        self.conn.close()
+
+
+def configure(path):
+    """
+    makes PlayerBasicInfo resolve players from the index at path before wikipedia,
+    or only from wikipedia when path is None
+    """
+    global INDEX
+    if INDEX is not None:
+        INDEX.close()
+    INDEX = PlayerIndex(path) if path else None
+
+
+def lookup(name, team=None):
+    return INDEX.lookup(name, team) if INDEX is not None else None
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('dump', help='enwiki pages-articles xml dump, bz2 or plain')
+    parser.add_argument('--index', default='./wikipedia/players.db')
+    args = parser.parse_args()
+    index = PlayerIndex(args.index)
+    index.build(args.dump)
+    index.close()